@@ -2,15 +2,26 @@
 import streamlit as st
 import pandas as pd
 import json
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import time
 import requests
-import base64
 import numpy as np
 import random
-from io import StringIO
 import ast
-import re
+
+import arquivo_pedidos
+import cashback_pedidos
+import clientes_cashback
+import cliente_github
+import fila_commits
+import formato_colunar
+import github_dados
+import leitura_csv
+import log_segmentado
+import mesclagem_csv
+import modelo_pedidos
+import motor_cupons
+import usos_cupons
 
 # --- Configurações de Dados ---
 SHEET_NAME_CATALOGO = "produtos_estoque"
@@ -18,6 +29,12 @@ SHEET_NAME_PEDIDOS = "pedidos"
 SHEET_NAME_PROMOCOES = "promocoes"
 SHEET_NAME_CLIENTES_CASH = "clientes_cash"
 SHEET_NAME_CUPONS = "cupons" 
+PASTA_SEGMENTOS_PEDIDOS = "pedidos"  # Segmentos diários gravados pelo catálogo (pedidos/AAAA-MM-DD.csv)
+PEDIDOS_POR_PAGINA_HISTORICO = 20  # Pedidos concluídos exibidos por página do histórico
+# Coluna que identifica cada linha, usada para mesclar gravações concorrentes
+CHAVES_PLANILHAS = {SHEET_NAME_CATALOGO: 'ID', SHEET_NAME_PEDIDOS: 'ID_PEDIDO', SHEET_NAME_CLIENTES_CASH: 'CONTATO', SHEET_NAME_CUPONS: 'CODIGO'}
+# Colunas em que a alteração local é somada (e não sobrescrita) na mesclagem
+COLUNAS_ACUMULATIVAS = {SHEET_NAME_CLIENTES_CASH: ('CASHBACK_DISPONIVEL', 'GASTO_ACUMULADO'), SHEET_NAME_CUPONS: ('USOS_ATUAIS',)}
 CASHBACK_LANCAMENTOS_CSV = "lancamentos.csv"
 BONUS_INDICACAO_PERCENTUAL = 0.03
 CASHBACK_INDICADO_PRIMEIRA_COMPRA = 0.05
@@ -28,6 +45,29 @@ PEDIDOS_BRANCH = "main"
 
 if 'data_version' not in st.session_state:
     st.session_state['data_version'] = 0
+if 'modo_lote' not in st.session_state:
+    st.session_state['modo_lote'] = False
+if 'fila_commits' not in st.session_state:
+    st.session_state['fila_commits'] = fila_commits.nova_fila()
+if 'alteracoes_pendentes' not in st.session_state:
+    st.session_state['alteracoes_pendentes'] = {}
+if 'versoes_lidas' not in st.session_state:
+    st.session_state['versoes_lidas'] = {}
+if 'pagina_historico' not in st.session_state:
+    st.session_state['pagina_historico'] = 1
+
+
+def _id_da_sessao():
+    """Identificador curto da sessão do Streamlit (para a contabilidade de chamadas à API)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx().session_id[:8]
+    except Exception:
+        return "?"
+
+
+# As chamadas à API do GitHub feitas nesta execução são atribuídas a esta sessão (ver cliente_github.consumo)
+cliente_github.definir_sessao(f"admin:{_id_da_sessao()}")
 
 try:
     GITHUB_TOKEN = st.secrets["github"]["token"]
@@ -38,91 +78,286 @@ except KeyError:
     st.error("Erro de configuração: As chaves do GitHub precisam estar no secrets.toml."); st.stop()
 
 # --- Funções Base do GitHub ---
+OPCOES_CSV_ADMIN = {'quotechar': '"', 'escapechar': "\\", 'doublequote': True}
+
+
+def _reparar_pedido_antigo(linha):
+    """Pedidos do formato antigo têm um campo vazio a mais antes do STATUS."""
+    return linha.replace(',"","PENDENTE",', ',"PENDENTE",')
+
+
+# Esquema de leitura de cada planilha (ver leitura_csv)
+ESQUEMAS_ADMIN = {
+    # O pedidos.csv (com o itens_json de cada pedido) é a maior planilha: lida pelo pyarrow.
+    # O ID_PEDIDO é lido como texto: os IDs antigos são números, os novos têm um sufixo aleatório
+    SHEET_NAME_PEDIDOS: leitura_csv.Esquema(
+        tipos={'ID_PEDIDO': str, 'DATA_HORA': str},
+        motor='pyarrow',
+        decimais={'VALOR_TOTAL': 0.0, 'VALOR_DESCONTO': 0.0},
+        padroes={'VALOR_TOTAL': 0.0, 'VALOR_DESCONTO': 0.0},
+        opcoes=OPCOES_CSV_ADMIN,
+        reparar_linha=_reparar_pedido_antigo,
+    ),
+    SHEET_NAME_CATALOGO: leitura_csv.Esquema(inteiros={'ID': 0}, opcoes=OPCOES_CSV_ADMIN),
+    # O CONTATO é sempre lido como texto (lido como número, perderia zeros e formatação)
+    SHEET_NAME_CLIENTES_CASH: leitura_csv.Esquema(tipos={'CONTATO': str}, opcoes=OPCOES_CSV_ADMIN),
+}
+ESQUEMA_ADMIN_PADRAO = leitura_csv.Esquema(opcoes=OPCOES_CSV_ADMIN)
+
+
+def _ler_csv_admin(content, sheet_name):
+    """Converte o conteúdo bruto do CSV de uma planilha no DataFrame usado pelo painel."""
+    return leitura_csv.ler_csv(content, ESQUEMAS_ADMIN.get(sheet_name, ESQUEMA_ADMIN_PADRAO))
+
+def _formato_admin(sheet_name):
+    """Chave dos DataFrames do admin no armazém (e na cópia colunar): muda com a forma de leitura."""
+    return f"admin:{sheet_name}:v{leitura_csv.VERSAO}"
+
 @st.cache_data(ttl=5)
 def fetch_github_data_v2(sheet_name, version_control):
     csv_filename = f"{sheet_name}.csv"
     repo_to_use, branch_to_use = (PEDIDOS_REPO_FULL, PEDIDOS_BRANCH) if sheet_name in [SHEET_NAME_PEDIDOS, SHEET_NAME_CLIENTES_CASH, SHEET_NAME_CUPONS] else (REPO_NAME_FULL, BRANCH)
-    api_url = f"https://api.github.com/repos/{repo_to_use}/contents/{csv_filename}?ref={branch_to_use}"
     try:
-        response = requests.get(api_url, headers=HEADERS)
-        if response.status_code != 200:
-            return pd.DataFrame()
-        content = base64.b64decode(response.json()["content"]).decode("utf-8")
-        if not content.strip(): return pd.DataFrame()
-        
-        if sheet_name == SHEET_NAME_PEDIDOS:
-            content = content.replace(',"","PENDENTE",', ',"PENDENTE",')
-
-        # --- INÍCIO DA CORREÇÃO ---
-        # Define o tipo de dado para garantir que o CONTATO seja sempre lido como string
-        dtype_config = {}
-        if sheet_name == SHEET_NAME_CLIENTES_CASH:
-            # O nome da coluna será 'CONTATO' antes da padronização para maiúsculas
-            dtype_config['CONTATO'] = str 
-        # --- FIM DA CORREÇÃO ---
-
-        df = pd.read_csv(
-            StringIO(content),
-            sep=",",
-            engine="python",
-            on_bad_lines="warn",
-            quotechar='"',
-            escapechar="\\",
-            doublequote=True,
-            # Aplica a configuração de tipo
-            dtype=dtype_config 
-         )
-        
-        df.columns = df.columns.str.strip().str.upper().str.replace(' ', '_')
-
+        # Leitura condicional (ETag) pelo armazém compartilhado: se o arquivo não mudou, não há download nem parse.
+        # Se houver uma cópia colunar gerada do CSV atual, ela é lida no lugar dele.
+        df = formato_colunar.obter_dataframe(
+            repo_to_use, branch_to_use, csv_filename, GITHUB_TOKEN,
+            _formato_admin(sheet_name), lambda content: _ler_csv_admin(content, sheet_name)
+        )
+        df = df if df is not None else pd.DataFrame()
         if sheet_name == SHEET_NAME_PEDIDOS:
-            for col in ['VALOR_TOTAL', 'VALOR_DESCONTO']:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-                else:
-                    df[col] = 0.0
-        
-        if sheet_name == SHEET_NAME_CATALOGO and "ID" in df.columns:
-            df["ID"] = pd.to_numeric(df["ID"], errors="coerce").fillna(0).astype(int)
-
+            sha_base = df.attrs.get('sha')
+            # Novos pedidos chegam em segmentos diários; junta-os ao pedidos.csv (que prevalece em caso de repetição)
+            df_segmentos = log_segmentado.ler_segmentos(
+                repo_to_use, branch_to_use, GITHUB_TOKEN, PASTA_SEGMENTOS_PEDIDOS,
+                _formato_admin(sheet_name), lambda content: _ler_csv_admin(content, sheet_name)
+            )
+            rejeitadas = [dict(r, arquivo=csv_filename) for r in df.attrs.get('linhas_rejeitadas', [])]
+            rejeitadas += df_segmentos.attrs.get('linhas_rejeitadas', [])
+            df = log_segmentado.mesclar_com_base(df, df_segmentos, 'ID_PEDIDO')
+            df.attrs['sha'] = sha_base
+            if rejeitadas: df.attrs['linhas_rejeitadas'] = rejeitadas
         return df
+    except requests.exceptions.HTTPError:
+        return pd.DataFrame()
     except Exception as e:
         st.error(f"Erro ao carregar dados de '{csv_filename}': {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=60)
+def fetch_historico_pedidos(inicio, fim, version_control):
+    """Pedidos arquivados (arquivo_pedidos) feitos entre 'inicio' e 'fim'; só as partições desses meses são lidas."""
+    try:
+        return arquivo_pedidos.ler_historico(
+            PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, GITHUB_TOKEN, inicio, fim,
+            _formato_admin(SHEET_NAME_PEDIDOS), lambda content: _ler_csv_admin(content, SHEET_NAME_PEDIDOS)
+        )
+    except requests.exceptions.HTTPError as e:
+        st.error(f"Erro ao carregar o histórico de pedidos: {e}")
+        return pd.DataFrame()
+
 def carregar_dados(sheet_name):
-    return fetch_github_data_v2(sheet_name, st.session_state['data_version'])
+    # No modo lote, as alterações ainda não enviadas prevalecem sobre o que está no GitHub
+    pendentes = st.session_state['alteracoes_pendentes']
+    if sheet_name in pendentes:
+        return pendentes[sheet_name].copy()
+    df = fetch_github_data_v2(sheet_name, st.session_state['data_version'])
+    # Guarda a versão lida: é a "base" da mesclagem se o arquivo mudar antes da gravação
+    st.session_state['versoes_lidas'][sheet_name] = df
+    return df.copy()
+
+def avisar_linhas_rejeitadas(df, sheet_name):
+    """Mostra as linhas do CSV que não puderam ser lidas (elas se perdem se a planilha for regravada)."""
+    rejeitadas = df.attrs.get('linhas_rejeitadas')
+    if not rejeitadas: return
+    st.warning(f"{len(rejeitadas)} linha(s) de '{sheet_name}.csv' não puderam ser lidas e serão descartadas se a planilha for regravada.")
+    with st.expander("Ver linhas ignoradas"):
+        st.dataframe(pd.DataFrame(rejeitadas), use_container_width=True, hide_index=True)
+
+def repo_e_branch(sheet_name):
+    return (PEDIDOS_REPO_FULL, PEDIDOS_BRANCH) if sheet_name in [SHEET_NAME_PEDIDOS, SHEET_NAME_CLIENTES_CASH, SHEET_NAME_CUPONS] else (REPO_NAME_FULL, BRANCH)
+
+def mesclar_com_versao_atual(df_local, sheet_name):
+    """
+    Relê a planilha no GitHub e reaplica sobre ela as alterações de 'df_local' em relação
+    à versão lida antes (mesclagem de três vias pela coluna-chave da planilha).
+    Retorna (df_mesclado, sha da versão atual).
+    """
+    fetch_github_data_v2.clear()
+    df_remoto = fetch_github_data_v2(sheet_name, st.session_state['data_version'])
+    df_base = st.session_state['versoes_lidas'].get(sheet_name)
+    df_mesclado = mesclagem_csv.mesclar_tres_vias(
+        df_base, df_local, df_remoto, CHAVES_PLANILHAS[sheet_name], COLUNAS_ACUMULATIVAS.get(sheet_name, ())
+    )
+    st.session_state['versoes_lidas'][sheet_name] = df_remoto
+    return df_mesclado, df_remoto.attrs.get('sha')
 
-def write_csv_to_github(df, sheet_name, commit_message):
+def _rebase_arquivo_da_fila(repo, branch, caminho, arquivo):
+    """Rebase usado pela fila de commits quando um arquivo foi alterado por outro commit."""
+    if caminho[:-len('.csv')] not in CHAVES_PLANILHAS:
+        raise fila_commits.ConflitoDeVersao([caminho])  # sem coluna-chave não há como mesclar
+    try:
+        df_mesclado, sha = mesclar_com_versao_atual(arquivo['dados'], caminho[:-len('.csv')])
+    except mesclagem_csv.ConflitoDeMesclagem:
+        raise fila_commits.ConflitoDeVersao([caminho])
+    return df_mesclado.fillna('').to_csv(index=False, sep=','), sha
+
+def write_csv_to_github(df, sheet_name, commit_message, fila=None):
+    """
+    Grava a planilha no GitHub. Com 'fila' (ou com o modo lote ligado), a alteração
+    é apenas enfileirada e enviada depois, junto com as demais, em um único commit.
+    Se o arquivo mudou desde a leitura (409/422), as alterações são mescladas na
+    versão atual e a gravação é refeita, com backoff. CSVs grandes demais para a Contents
+    API passam por uma fila avulsa. A cópia colunar da planilha (formato_colunar) só é
+    gravada pela fila: numa gravação simples pela Contents API (uma única chamada), ela
+    fica desatualizada e a leitura volta ao CSV até a próxima gravação pela fila.
+    """
     csv_filename = f"{sheet_name}.csv"
-    repo_to_write, branch_to_write = (PEDIDOS_REPO_FULL, PEDIDOS_BRANCH) if sheet_name in [SHEET_NAME_PEDIDOS, SHEET_NAME_CLIENTES_CASH, SHEET_NAME_CUPONS] else (REPO_NAME_FULL, BRANCH)
-    api_url = f"https://api.github.com/repos/{repo_to_write}/contents/{csv_filename}"
-    response = requests.get(api_url, headers=HEADERS)
-    sha = response.json().get('sha') if response.status_code == 200 else None
-    
+    repo_to_write, branch_to_write = repo_e_branch(sheet_name)
+    # SHA da versão sobre a qual a alteração foi feita
+    df_base = st.session_state['versoes_lidas'].get(sheet_name)
+    sha = df_base.attrs.get('sha') if df_base is not None else github_dados.obter_sha(repo_to_write, branch_to_write, csv_filename)
+
+    if fila is None and st.session_state['modo_lote']:
+        fila = st.session_state['fila_commits']
+        st.session_state['alteracoes_pendentes'][sheet_name] = df.copy()
     csv_content = df.fillna('').to_csv(index=False, sep=',')
-    content_base64 = base64.b64encode(csv_content.encode('utf-8')).decode('utf-8')
-    payload = {"message": commit_message, "content": content_base64, "branch": branch_to_write}
-    if sha: payload["sha"] = sha 
-    put_response = requests.put(api_url, headers=HEADERS, json=payload)
-    if put_response.status_code in [200, 201]:
+    avulsa = fila is None and len(csv_content) > github_dados.LIMITE_CONTEUDO_EMBUTIDO
+    if avulsa:
+        fila = fila_commits.nova_fila()
+    if fila is not None:
+        derivar = formato_colunar.derivador(csv_filename, _formato_admin(sheet_name), lambda content: _ler_csv_admin(content, sheet_name))
+        fila_commits.enfileirar(fila, repo_to_write, branch_to_write, csv_filename, csv_content, commit_message, sha, dados=df, derivar=derivar)
+        return enviar_fila(fila) if avulsa else True
+
+    if sha is None:
+        _, sha = github_dados.obter_conteudo(repo_to_write, branch_to_write, csv_filename, GITHUB_TOKEN)
+    gravado, put_response = False, None
+    for tentativa in range(mesclagem_csv.TENTATIVAS_ESCRITA):
+        csv_content = df.fillna('').to_csv(index=False, sep=',')
+        try:
+            put_response = github_dados.salvar_arquivo(repo_to_write, branch_to_write, csv_filename, GITHUB_TOKEN, csv_content, commit_message, sha)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            put_response = None
+        if put_response is not None and put_response.status_code in [200, 201]:
+            gravado = True; break
+        if put_response is None or put_response.status_code >= 500:
+            # Sem resposta conclusiva, a gravação pode ter sido aplicada: mesclá-la de novo somaria duas
+            # vezes as colunas acumulativas (ex.: o cashback do cliente)
+            if github_dados.gravacao_aplicada(repo_to_write, branch_to_write, csv_filename, GITHUB_TOKEN, csv_content):
+                gravado = True; break
+            mesclagem_csv.esperar_nova_tentativa(tentativa)
+            continue
+        if put_response.status_code not in [409, 422] or sheet_name not in CHAVES_PLANILHAS:
+            break
+        # Conflito: alguém gravou o arquivo depois da nossa leitura
+        mesclagem_csv.esperar_nova_tentativa(tentativa)
+        try:
+            df, sha = mesclar_com_versao_atual(df, sheet_name)
+        except mesclagem_csv.ConflitoDeMesclagem as e:
+            st.error(f"Falha no Commit: a planilha mudou no GitHub e a alteração não pôde ser mesclada ({e}). Recarregue e refaça."); return False
+    if gravado:
         fetch_github_data_v2.clear(); return True
+    elif put_response is None:
+        st.error("Falha no Commit: o GitHub não respondeu."); return False
     else:
         st.error(f"Falha no Commit: {put_response.json().get('message', 'Erro')}"); return False
 
-def parse_json_from_string(json_string):
-    import json, ast
-    if pd.isna(json_string) or not isinstance(json_string, str) or not json_string.strip():
-        return {}
-    s = str(json_string).strip().replace('\\"', '"').replace('""', '"')
-    if s.startswith('"') and s.endswith('"'):
-        s = s[1:-1].strip()
-    for _ in range(3):
-        try:
-            data = json.loads(s)
-            return data if not isinstance(data, str) else ast.literal_eval(data)
-        except: pass
-    return {}
+def enviar_fila(fila):
+    """Envia as alterações enfileiradas (um commit por repositório) e limpa o cache de leitura."""
+    try:
+        gravados = fila_commits.descarregar(fila, GITHUB_TOKEN, rebase=_rebase_arquivo_da_fila)
+    except (fila_commits.ConflitoDeVersao, requests.exceptions.RequestException) as e:
+        st.error(f"Falha no Commit: {e}"); return False
+    if gravados:
+        fetch_github_data_v2.clear()
+    return True
+
+def enviar_alteracoes_pendentes():
+    """Envia a fila do modo lote da sessão."""
+    if enviar_fila(st.session_state['fila_commits']):
+        st.session_state['alteracoes_pendentes'] = {}
+        return True
+    return False
+
+def compactar_pedidos():
+    """
+    Incorpora ao pedidos.csv os segmentos diários de dias já encerrados e os remove.
+    O segmento do dia atual é mantido, pois continua recebendo pedidos do catálogo.
+    """
+    segmentos = log_segmentado.segmentos_encerrados(
+        log_segmentado.listar_segmentos(PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, GITHUB_TOKEN, PASTA_SEGMENTOS_PEDIDOS)
+    )
+    if not segmentos:
+        return 0
+    fetch_github_data_v2.clear()
+    df = carregar_dados(SHEET_NAME_PEDIDOS)
+    # Grava o pedidos.csv e remove os segmentos incorporados em um único commit
+    fila = fila_commits.nova_fila()
+    write_csv_to_github(df, SHEET_NAME_PEDIDOS, f"Compactar {len(segmentos)} segmento(s) de pedidos", fila=fila)
+    # Com o SHA listado como base, um registro anexado depois da listagem faz o commit falhar
+    # (ConflitoDeVersao) em vez de ser apagado junto com o segmento
+    for segmento in segmentos:
+        fila_commits.enfileirar(fila, PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, segmento["path"], None, f"Compactação: remove {segmento['name']}",
+                                sha_base=segmento["sha"])
+    return len(segmentos) if enviar_fila(fila) else 0
+
+def arquivar_pedidos():
+    """
+    Move para as partições mensais (arquivo_pedidos) os pedidos concluídos há mais de
+    arquivo_pedidos.DIAS_RECENTES dias, tirando-os do pedidos.csv. Os segmentos diários
+    encerrados são incorporados no mesmo commit (um pedido arquivado que continuasse em
+    um segmento voltaria a aparecer). Retorna a quantidade de pedidos arquivados.
+    """
+    segmentos = log_segmentado.segmentos_encerrados(
+        log_segmentado.listar_segmentos(PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, GITHUB_TOKEN, PASTA_SEGMENTOS_PEDIDOS)
+    )
+    fetch_github_data_v2.clear()
+    df_ativos, por_mes = arquivo_pedidos.separar_arquivaveis(carregar_dados(SHEET_NAME_PEDIDOS))
+    if not por_mes:
+        return 0
+    particoes = {p['path']: p['sha'] for p in arquivo_pedidos.listar_particoes(PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, GITHUB_TOKEN)}
+    fila = fila_commits.nova_fila()
+    total = 0
+    for mes, df_mes in por_mes.items():
+        caminho = arquivo_pedidos.caminho_particao(mes)
+        sha = particoes.get(caminho)
+        df_particao = github_dados.obter_dataframe(
+            PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, caminho, GITHUB_TOKEN, _formato_admin(SHEET_NAME_PEDIDOS),
+            lambda content: _ler_csv_admin(content, SHEET_NAME_PEDIDOS), sha_esperado=sha
+        ) if sha else None
+        df_particao = arquivo_pedidos.incorporar(df_particao, df_mes)
+        fila_commits.enfileirar(fila, PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, caminho, df_particao.fillna('').to_csv(index=False, sep=','),
+                                f"Arquivar {len(df_mes)} pedido(s) de {mes}", sha)
+        total += len(df_mes)
+    write_csv_to_github(df_ativos, SHEET_NAME_PEDIDOS, f"Arquivar {total} pedido(s) concluído(s)", fila=fila)
+    for segmento in segmentos:
+        fila_commits.enfileirar(fila, PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, segmento["path"], None, f"Arquivamento: remove {segmento['name']}",
+                                sha_base=segmento["sha"])
+    if not enviar_fila(fila):
+        return 0
+    fetch_historico_pedidos.clear()
+    return total
+
+def consolidar_usos_cupons():
+    """
+    Soma ao USOS_ATUAIS do cupons.csv os usos registrados no checkout em segmentos de dias
+    já encerrados ('cupons_usos/') e remove esses segmentos, tudo em um único commit.
+    """
+    segmentos = log_segmentado.segmentos_encerrados(
+        log_segmentado.listar_segmentos(PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, GITHUB_TOKEN, usos_cupons.PASTA_USOS)
+    )
+    if not segmentos:
+        return 0
+    fetch_github_data_v2.clear()
+    df, total = usos_cupons.consolidar(carregar_dados(SHEET_NAME_CUPONS), segmentos, PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, GITHUB_TOKEN)
+    fila = fila_commits.nova_fila()
+    if total:
+        write_csv_to_github(df, SHEET_NAME_CUPONS, f"Consolidar {total} uso(s) de cupons", fila=fila)
+    for segmento in segmentos:
+        fila_commits.enfileirar(fila, PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, segmento["path"], None, f"Consolidação: remove {segmento['name']}",
+                                sha_base=segmento["sha"])
+    return len(segmentos) if enviar_fila(fila) else 0
 
 def adicionar_produto(nome, preco, desc_curta, desc_longa, link_imagem, disponivel, cashback):
     df = carregar_dados(SHEET_NAME_CATALOGO).copy()
@@ -146,51 +381,47 @@ def excluir_produto(id_prod):
     df = df[df['ID'] != int(id_prod)]
     return write_csv_to_github(df, SHEET_NAME_CATALOGO, f"Excluir produto ID: {id_prod}")
 
+def cupons_cadastrados(df):
+    """Códigos já cadastrados, pelo mesmo motor de cupons usado no checkout do catálogo."""
+    versao = None if SHEET_NAME_CUPONS in st.session_state['alteracoes_pendentes'] else df.attrs.get('sha')
+    try:
+        return motor_cupons.compilar_cupons(df, versao)
+    except ValueError:
+        # Planilha com colunas faltando: ainda assim não deixa repetir um código
+        return set(df['CODIGO'].map(motor_cupons.normalizar_codigo)) if 'CODIGO' in df.columns else set()
+
 def criar_cupom(codigo, tipo, valor, validade, val_min, limite):
     df = carregar_dados(SHEET_NAME_CUPONS)
-    if not df.empty and codigo.upper() in df['CODIGO'].str.upper().tolist():
+    if not df.empty and motor_cupons.normalizar_codigo(codigo) in cupons_cadastrados(df):
         st.error(f"O cupom '{codigo}' já existe!")
         return False
     nova_linha = {'CODIGO': codigo.upper(), 'TIPO_DESCONTO': tipo, 'VALOR': valor, 'DATA_VALIDADE': str(validade) if validade else '', 'VALOR_MINIMO_PEDIDO': val_min, 'LIMITE_USOS': limite, 'USOS_ATUAIS': 0, 'STATUS': 'ATIVO'}
     df = pd.concat([df, pd.DataFrame([nova_linha])], ignore_index=True)
     return write_csv_to_github(df, SHEET_NAME_CUPONS, f"Criar cupom: {codigo.upper()}")
 
-def lancar_venda_cashback(nome, contato, cashback, valor_pago):
+def lancar_venda_cashback(nome, contato, cashback, valor_pago, fila=None):
     df = carregar_dados(SHEET_NAME_CLIENTES_CASH)
-    contato_limpo = re.sub(r'\D', '', str(contato))
-    df['CONTATO_LIMPO'] = df['CONTATO'].astype(str).str.replace(r'\D', '', regex=True)
-    idx = df[df['CONTATO_LIMPO'] == contato_limpo].index
-    if idx.empty:
+    # Índice contato -> cliente reaproveitado por versão do arquivo (não vale para alterações ainda não enviadas)
+    versao = None if SHEET_NAME_CLIENTES_CASH in st.session_state['alteracoes_pendentes'] else df.attrs.get('sha')
+    posicao = clientes_cashback.posicao_do_cliente(df, contato, versao)
+    if posicao is None:
         novo = {'NOME': nome, 'CONTATO': contato, 'CASHBACK_DISPONIVEL': cashback, 'GASTO_ACUMULADO': valor_pago, 'NIVEL_ATUAL': 'Prata', 'PRIMEIRA_COMPRA_FEITA': 'TRUE'}
-        df = pd.concat([df.drop(columns=['CONTATO_LIMPO']), pd.DataFrame([novo])], ignore_index=True)
+        df = pd.concat([df, pd.DataFrame([novo])], ignore_index=True)
     else:
-        df.loc[idx[0], 'CASHBACK_DISPONIVEL'] += cashback
-        df.loc[idx[0], 'GASTO_ACUMULADO'] += valor_pago
-        df.loc[idx[0], 'PRIMEIRA_COMPRA_FEITA'] = 'TRUE'
-        df = df.drop(columns=['CONTATO_LIMPO'])
-    return write_csv_to_github(df, SHEET_NAME_CLIENTES_CASH, f"Cashback: {nome}")
-
-def extract_customer_cashback(json_data):
-    data = parse_json_from_string(json_data)
-    return data.get("cliente_saldo_cashback", 0.0)
-
-def calcular_cashback_a_creditar(pedido_json, df_catalogo, desconto):
-    data = parse_json_from_string(pedido_json)
-    itens = data.get('itens', [])
-    subtotal = sum(float(i.get('preco', 0)) * int(i.get('quantidade', 0)) for i in itens)
-    if subtotal == 0: return 0.0
-    cashback_total = 0.0
-    for item in itens:
-        produto_catalogo = df_catalogo[df_catalogo['ID'] == int(item.get('id', -1))]
-        if not produto_catalogo.empty:
-            cashback_percent = float(str(produto_catalogo.iloc[0].get('CASHBACKPERCENT', '0')).replace(',', '.'))
-            if cashback_percent > 0:
-                subtotal_item = float(item.get('preco', 0)) * int(item.get('quantidade', 0))
-                proporcao_item = subtotal_item / subtotal if subtotal > 0 else 0
-                desconto_item = desconto * proporcao_item
-                valor_final_item = subtotal_item - desconto_item
-                cashback_total += valor_final_item * (cashback_percent / 100)
-    return round(cashback_total, 2)
+        idx = df.index[posicao]
+        df.loc[idx, 'CASHBACK_DISPONIVEL'] += cashback
+        df.loc[idx, 'GASTO_ACUMULADO'] += valor_pago
+        df.loc[idx, 'PRIMEIRA_COMPRA_FEITA'] = 'TRUE'
+    return write_csv_to_github(df, SHEET_NAME_CLIENTES_CASH, f"Cashback: {nome}", fila=fila)
+
+def catalogo_por_id(df_catalogo):
+    """Catálogo indexado pelo ID (foto e percentual de cashback), reaproveitado por versão do arquivo."""
+    versao = None if SHEET_NAME_CATALOGO in st.session_state['alteracoes_pendentes'] else df_catalogo.attrs.get('sha')
+    return cashback_pedidos.catalogo_por_id(df_catalogo, versao)
+
+def calcular_cashback_a_creditar(pedido, df_catalogo):
+    """Cashback do pedido (modelo_pedidos.Pedido): o desconto é repartido entre os itens pelo valor de cada um."""
+    return float(cashback_pedidos.calcular_lote([pedido], catalogo_por_id(df_catalogo)).iloc[0])
 
 def atualizar_status_pedido(id_pedido, novo_status, df_catalogo):
     df = carregar_dados(SHEET_NAME_PEDIDOS)
@@ -198,27 +429,36 @@ def atualizar_status_pedido(id_pedido, novo_status, df_catalogo):
     idx = df[df['ID_PEDIDO'] == str(id_pedido)].index
     if not idx.empty:
         idx = idx[0]
+        # Cashback do cliente e status do pedido vão no mesmo commit (no modo lote, para a fila da sessão)
+        fila = None if st.session_state['modo_lote'] else fila_commits.nova_fila()
         if novo_status == 'Finalizado' and df.loc[idx, 'STATUS'] != 'Finalizado':
             pedido = df.loc[idx]
-            json_data = parse_json_from_string(pedido.get('ITENS_JSON'))
-            desconto_val = json_data.get('desconto_cupom', pedido.get('VALOR_DESCONTO', 0.0))
-            desconto = pd.to_numeric(desconto_val, errors='coerce')
-            if pd.isna(desconto): desconto = 0.0
             valor_pago = pd.to_numeric(pedido.get('VALOR_TOTAL', 0.0), errors='coerce')
-            cashback = calcular_cashback_a_creditar(pedido.get('ITENS_JSON'), df_catalogo, desconto)
+            cashback = calcular_cashback_a_creditar(modelo_pedidos.pedido_da_linha(pedido), df_catalogo)
             if cashback > 0:
-                lancar_venda_cashback(pedido.get('NOME_CLIENTE'), pedido.get('CONTATO_CLIENTE'), cashback, valor_pago)
+                lancar_venda_cashback(pedido.get('NOME_CLIENTE'), pedido.get('CONTATO_CLIENTE'), cashback, valor_pago, fila=fila)
             df.loc[idx, 'VALOR_CASHBACK_CREDITADO'] = cashback
         df.loc[idx, 'STATUS'] = novo_status
-        return write_csv_to_github(df, SHEET_NAME_PEDIDOS, f"Status pedido {id_pedido} para {novo_status}")
+        write_csv_to_github(df, SHEET_NAME_PEDIDOS, f"Status pedido {id_pedido} para {novo_status}", fila=fila)
+        gravado = True if fila is None else enviar_fila(fila)
+        if gravado and novo_status in arquivo_pedidos.STATUS_CONCLUIDOS: esquecer_separacao([id_pedido])
+        return gravado
     else:
         st.error(f"Erro: Pedido com ID {id_pedido} não encontrado para atualização.")
         return False
 
+def tabela_consumo(contagens, rotulo):
+    """Contagens de cliente_github.consumo() em tabela, das que mais gastam cota para as que menos gastam."""
+    df = pd.DataFrame(
+        [{rotulo: nome, 'CHAMADAS': c['chamadas'], 'GASTAM_COTA': c['chamadas'] - c['nao_modificadas'],
+          'NAO_MODIFICADAS_304': c['nao_modificadas'], 'ERROS': c['erros']} for nome, c in contagens.items()],
+        columns=[rotulo, 'CHAMADAS', 'GASTAM_COTA', 'NAO_MODIFICADAS_304', 'ERROS'],
+    )
+    return df.sort_values(['GASTAM_COTA', 'CHAMADAS'], ascending=False).reset_index(drop=True)
+
 # --- INÍCIO DA CORREÇÃO ---
-def exibir_itens_pedido(id_pedido, pedido_json, df_catalogo):
-    data = parse_json_from_string(pedido_json)
-    itens = data.get('itens', [])
+def exibir_itens_pedido(id_pedido, pedido, catalogo):
+    itens = pedido.itens
     if not itens:
         st.warning("Nenhum item encontrado no pedido.")
         return 0
@@ -230,18 +470,15 @@ def exibir_itens_pedido(id_pedido, pedido_json, df_catalogo):
     for i, item in enumerate(itens):
         link_img = "https://placehold.co/100x100/e2e8f0/cccccc?text=Sem+Foto"
         
-        prod_id = int(item.get('id', -1))
-        produto_no_catalogo = df_catalogo[df_catalogo['ID'] == prod_id]
-        
         cashback_percent = 0.0
-        if not produto_no_catalogo.empty:
+        if item.id in catalogo.index:
+            produto_no_catalogo = catalogo.loc[item.id]
             # CORREÇÃO: Busca pela coluna 'FOTOURL' (em maiúsculas, pois o código padroniza os nomes)
-            link_imagem_produto = produto_no_catalogo.iloc[0].get('FOTOURL')
+            link_imagem_produto = produto_no_catalogo['FOTOURL']
             if link_imagem_produto and pd.notna(link_imagem_produto):
                 link_img = str(link_imagem_produto)
 
-            cashback_str = str(produto_no_catalogo.iloc[0].get('CASHBACKPERCENT', '0')).replace(',', '.')
-            cashback_percent = float(cashback_str)
+            cashback_percent = produto_no_catalogo['CASHBACK_PERCENTUAL']
 
         col_check, col_img, col_info = st.columns([0.5, 1, 3.5])
         
@@ -252,10 +489,9 @@ def exibir_itens_pedido(id_pedido, pedido_json, df_catalogo):
             st.image(link_img, width=100)
             
         with col_info:
-            sub = float(item.get('preco', 0)) * int(item.get('quantidade', 0))
             info_text = (
-                f"**Produto:** {item.get('nome', 'N/A')}\n\n"
-                f"**Quantidade:** {item.get('quantidade', 0)} | **Subtotal:** R$ {sub:.2f}\n\n"
+                f"**Produto:** {item.nome}\n\n"
+                f"**Quantidade:** {item.quantidade} | **Subtotal:** R$ {item.subtotal:.2f}\n\n"
                 f"**Cashback do produto:** {cashback_percent:.2f}%"
             )
             st.markdown(info_text)
@@ -266,64 +502,139 @@ def exibir_itens_pedido(id_pedido, pedido_json, df_catalogo):
     return 100 if total_itens == 0 else int((itens_sep / total_itens) * 100)
 # --- FIM DA CORREÇÃO ---
 
+@st.fragment
+def card_pedido_pendente(pedido, modelo, cashback, catalogo, df_catalogo):
+    """
+    Card de um pedido pendente. Como fragmento, marcar um item como separado reexecuta só
+    este card (e não a página inteira, com nova leitura e ordenação de todos os pedidos);
+    finalizar ou cancelar o pedido recarrega a página.
+    """
+    id_pedido = pedido.get('ID_PEDIDO')
+    data_hora = pedido['DATA_HORA'].strftime('%d/%m/%Y %H:%M') if pd.notna(pedido['DATA_HORA']) else "Data Indefinida"
+    with st.expander(f"Pedido de **{pedido.get('NOME_CLIENTE','N/A')}** - {data_hora} - Total: R$ {pd.to_numeric(pedido.get('VALOR_TOTAL', 0.0), errors='coerce'):.2f}"):
+        st.markdown(f"**Contato:** {pedido.get('CONTATO_CLIENTE', 'N/A')} | **ID do Pedido:** {id_pedido}")
+        st.metric(label="Saldo Cashback do Cliente", value=f"R$ {modelo.saldo_cashback:.2f}")
+        if cashback > 0: 
+            st.success(f"**💰 Cashback a ser Creditado:** R$ {cashback:.2f}")
+            st.info("Este valor será creditado ao cliente após a finalização deste pedido.")
+        st.markdown("---")
+        progresso = exibir_itens_pedido(id_pedido, modelo, catalogo)
+        st.progress(progresso / 100, f"Progresso de Separação: {progresso}%")
+        c1, c2 = st.columns(2)
+        if c1.button("✅ Finalizar", key=f"fin_{id_pedido}", disabled=progresso!=100, use_container_width=True):
+            if atualizar_status_pedido(id_pedido, "Finalizado", df_catalogo): st.success("Pedido finalizado!"); st.rerun()
+        if c2.button("✖️ Cancelar", key=f"can_{id_pedido}", type="secondary", use_container_width=True):
+            if atualizar_status_pedido(id_pedido, "Cancelado", df_catalogo): st.warning("Pedido cancelado!"); st.rerun()
+
+def esquecer_separacao(ids_pedidos):
+    """Remove da sessão o progresso de separação (pedido_{id}_itens e os checkboxes) dos pedidos informados."""
+    ids = {str(id_pedido) for id_pedido in ids_pedidos}
+    if not ids: return
+    for chave in list(st.session_state.keys()):
+        if chave.startswith('pedido_') and chave.endswith('_itens'):
+            id_pedido = chave[len('pedido_'):-len('_itens')]
+        elif chave.startswith('c_'):
+            id_pedido = chave[len('c_'):].rsplit('_', 1)[0]
+        else:
+            continue
+        if id_pedido in ids:
+            del st.session_state[chave]
+
 st.set_page_config(page_title="Admin Doce&Bella", layout="wide")
 st.title("⭐ Painel de Administração | Doce&Bella")
-tab_pedidos, tab_produtos, tab_promocoes, tab_cupons = st.tabs(["Pedidos", "Produtos", "🔥 Promoções", "🎟️ Cupons"])
+col_lote, col_enviar = st.columns([3, 1])
+col_lote.toggle("Modo lote (agrupa as alterações em um único commit)", key='modo_lote')
+qtd_pendentes = fila_commits.tamanho(st.session_state['fila_commits'])
+if qtd_pendentes:
+    if col_enviar.button(f"💾 Enviar {qtd_pendentes} alteração(ões)", type="primary", use_container_width=True):
+        if enviar_alteracoes_pendentes(): st.success("Alterações enviadas!"); st.rerun()
+tab_pedidos, tab_produtos, tab_promocoes, tab_cupons, tab_desempenho = st.tabs(["Pedidos", "Produtos", "🔥 Promoções", "🎟️ Cupons", "📊 Desempenho"])
 
 with tab_pedidos:
     st.header("📋 Pedidos Recebidos")
-    if st.button("Recarregar Pedidos"): st.session_state['data_version'] += 1; st.rerun()
+    col_recarregar, col_compactar, col_arquivar = st.columns(3)
+    if col_recarregar.button("Recarregar Pedidos"): st.session_state['data_version'] += 1; st.rerun()
+    if col_compactar.button("🗜️ Compactar Pedidos", help="Incorpora ao pedidos.csv os segmentos diários de dias anteriores."):
+        qtd = compactar_pedidos()
+        if qtd: st.success(f"{qtd} segmento(s) compactado(s).")
+        else: st.info("Nenhum segmento para compactar.")
+    if col_arquivar.button("🗄️ Arquivar Concluídos", help=f"Move para o arquivo mensal os pedidos finalizados ou cancelados há mais de {arquivo_pedidos.DIAS_RECENTES} dias."):
+        qtd = arquivar_pedidos()
+        if qtd: st.success(f"{qtd} pedido(s) arquivado(s).")
+        else: st.info("Nenhum pedido para arquivar.")
     df_pedidos = carregar_dados(SHEET_NAME_PEDIDOS)
+    avisar_linhas_rejeitadas(df_pedidos, SHEET_NAME_PEDIDOS)
     df_catalogo = carregar_dados(SHEET_NAME_CATALOGO)
     df_pedidos = df_pedidos.fillna("")
-    if df_pedidos.empty: st.info("Nenhum pedido encontrado.")
+    if df_pedidos.empty:
+        # Sem pedidos no pedidos.csv, o histórico (arquivo mensal) continua disponível
+        st.info("Nenhum pedido ativo encontrado.")
+        df_pedidos = pd.DataFrame(columns=['ID_PEDIDO', 'DATA_HORA', 'NOME_CLIENTE', 'VALOR_TOTAL', 'STATUS'])
+    df_pedidos['DATA_HORA'] = pd.to_datetime(df_pedidos['DATA_HORA'], errors='coerce')
+    df_pedidos.sort_values(by="DATA_HORA", ascending=False, inplace=True)
+    st.header("⏳ Pedidos Pendentes")
+    pendentes = df_pedidos[~df_pedidos.get('STATUS', pd.Series(dtype=str)).fillna('').isin(['Finalizado', 'Cancelado'])]
+    if pendentes.empty: st.info("Nenhum pedido pendente.")
     else:
-        df_pedidos['DATA_HORA'] = pd.to_datetime(df_pedidos['DATA_HORA'], errors='coerce')
-        df_pedidos.sort_values(by="DATA_HORA", ascending=False, inplace=True)
-        st.header("⏳ Pedidos Pendentes")
-        pendentes = df_pedidos[~df_pedidos.get('STATUS', pd.Series(dtype=str)).fillna('').isin(['Finalizado', 'Cancelado'])]
-        if pendentes.empty: st.info("Nenhum pedido pendente.")
-        else:
-            for _, pedido in pendentes.iterrows():
-                id_pedido = pedido.get('ID_PEDIDO')
-                data_hora = pedido['DATA_HORA'].strftime('%d/%m/%Y %H:%M') if pd.notna(pedido['DATA_HORA']) else "Data Indefinida"
-                with st.expander(f"Pedido de **{pedido.get('NOME_CLIENTE','N/A')}** - {data_hora} - Total: R$ {pd.to_numeric(pedido.get('VALOR_TOTAL', 0.0), errors='coerce'):.2f}"):
-                    st.markdown(f"**Contato:** {pedido.get('CONTATO_CLIENTE', 'N/A')} | **ID do Pedido:** {id_pedido}")
-                    json_data = parse_json_from_string(pedido.get('ITENS_JSON'))
+        # Cada ITENS_JSON é interpretado uma vez por versão do pedido (e não a cada uso, a cada rerun)
+        modelos = modelo_pedidos.pedidos_por_id(pendentes)
+        catalogo = catalogo_por_id(df_catalogo)
+        # Cashback de todos os pendentes de uma vez, com o catálogo indexado pelo ID
+        cashbacks = cashback_pedidos.calcular_lote(modelos.values(), catalogo)
+        for _, pedido in pendentes.iterrows():
+            modelo = modelos[str(pedido.get('ID_PEDIDO'))]
+            card_pedido_pendente(pedido, modelo, cashbacks[modelo.id_pedido], catalogo, df_catalogo)
                     
-                    desconto_val = json_data.get('desconto_cupom', pedido.get('VALOR_DESCONTO', 0.0))
-                    desconto = pd.to_numeric(desconto_val, errors='coerce')
-                    if pd.isna(desconto): desconto = 0.0
-
-                    saldo_cashback = extract_customer_cashback(pedido.get('ITENS_JSON'))
-                    st.metric(label="Saldo Cashback do Cliente", value=f"R$ {saldo_cashback:.2f}")
-                    cashback = calcular_cashback_a_creditar(pedido.get('ITENS_JSON'), df_catalogo, desconto)
-                    if cashback > 0: 
-                        st.success(f"**💰 Cashback a ser Creditado:** R$ {cashback:.2f}")
-                        st.info("Este valor será creditado ao cliente após a finalização deste pedido.")
-                    st.markdown("---")
-                    progresso = exibir_itens_pedido(id_pedido, pedido.get('ITENS_JSON'), df_catalogo)
-                    st.progress(progresso / 100, f"Progresso de Separação: {progresso}%")
-                    c1, c2 = st.columns(2)
-                    if c1.button("✅ Finalizar", key=f"fin_{id_pedido}", disabled=progresso!=100, use_container_width=True):
-                        if atualizar_status_pedido(id_pedido, "Finalizado", df_catalogo): st.success("Pedido finalizado!"); st.rerun()
-                    if c2.button("✖️ Cancelar", key=f"can_{id_pedido}", type="secondary", use_container_width=True):
-                        if atualizar_status_pedido(id_pedido, "Cancelado", df_catalogo): st.warning("Pedido cancelado!"); st.rerun()
-                        
-        st.header("✅ Pedidos Finalizados e Cancelados")
-        concluidos = df_pedidos[df_pedidos.get('STATUS', pd.Series(dtype=str)).isin(['Finalizado', 'Cancelado'])]
-        if concluidos.empty: st.info("Nenhum pedido finalizado ou cancelado.")
-        else:
-             for _, pedido in concluidos.iterrows():
-                data_hora = pedido['DATA_HORA'].strftime('%d/%m/%Y %H:%M') if pd.notna(pedido['DATA_HORA']) else "Data Indefinida"
-                cor = "green" if pedido.get('STATUS') == 'Finalizado' else "red"
-                with st.expander(f":{cor}[{pedido.get('STATUS')}] Pedido de **{pedido.get('NOME_CLIENTE','N/A')}** - {data_hora} - Total: R$ {pd.to_numeric(pedido.get('VALOR_TOTAL', 0.0), errors='coerce'):.2f}"):
-                     st.write(f"ID do Pedido: {pedido.get('ID_PEDIDO')}")
-                     if pedido.get('STATUS') == 'Finalizado': st.info(f"Cashback creditado: R$ {pd.to_numeric(pedido.get('VALOR_CASHBACK_CREDITADO', 0.0), errors='coerce'):.2f}")
+    # Pedidos concluídos (também por outra sessão) não precisam mais do progresso de separação
+    if 'STATUS' in df_pedidos and 'ID_PEDIDO' in df_pedidos:
+        esquecer_separacao(df_pedidos.loc[df_pedidos['STATUS'].isin(arquivo_pedidos.STATUS_CONCLUIDOS), 'ID_PEDIDO'])
+
+    st.header("✅ Pedidos Finalizados e Cancelados")
+    col_periodo, col_pagina = st.columns([3, 1])
+    periodo = col_periodo.date_input("Período", value=(date.today() - timedelta(days=arquivo_pedidos.DIAS_RECENTES), date.today()), key="periodo_historico")
+    inicio, fim = (periodo[0], periodo[-1]) if isinstance(periodo, (tuple, list)) and periodo else (periodo, periodo)
+    concluidos = df_pedidos[df_pedidos.get('STATUS', pd.Series(dtype=str)).isin(arquivo_pedidos.STATUS_CONCLUIDOS)]
+    # Os concluídos recentes ainda estão no pedidos.csv; os demais vêm só das partições mensais do período
+    historico = pd.concat(
+        [arquivo_pedidos.filtrar_periodo(concluidos, inicio, fim), fetch_historico_pedidos(inicio, fim, st.session_state['data_version'])],
+        ignore_index=True,
+    )
+    if not historico.empty:
+        historico = historico.drop_duplicates(subset=['ID_PEDIDO'], keep='first').sort_values('DATA_HORA', ascending=False)
+        historico = historico.fillna({col: "" for col in historico.columns if col != 'DATA_HORA'})
+    if historico.empty: st.info("Nenhum pedido finalizado ou cancelado no período.")
+    else:
+         paginas = -(-len(historico) // PEDIDOS_POR_PAGINA_HISTORICO)
+         # Período mais curto que o anterior: a página escolhida pode não existir mais
+         if st.session_state.get('pagina_historico', 1) > paginas: st.session_state['pagina_historico'] = paginas
+         pagina = col_pagina.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, key="pagina_historico")
+         st.caption(f"{len(historico)} pedido(s) no período.")
+         for _, pedido in historico.iloc[(pagina - 1) * PEDIDOS_POR_PAGINA_HISTORICO:pagina * PEDIDOS_POR_PAGINA_HISTORICO].iterrows():
+            data_hora = pedido['DATA_HORA'].strftime('%d/%m/%Y %H:%M') if pd.notna(pedido['DATA_HORA']) else "Data Indefinida"
+            cor = "green" if pedido.get('STATUS') == 'Finalizado' else "red"
+            with st.expander(f":{cor}[{pedido.get('STATUS')}] Pedido de **{pedido.get('NOME_CLIENTE','N/A')}** - {data_hora} - Total: R$ {pd.to_numeric(pedido.get('VALOR_TOTAL', 0.0), errors='coerce'):.2f}"):
+                 st.write(f"ID do Pedido: {pedido.get('ID_PEDIDO')}")
+                 if pedido.get('STATUS') == 'Finalizado': st.info(f"Cashback creditado: R$ {pd.to_numeric(pedido.get('VALOR_CASHBACK_CREDITADO', 0.0), errors='coerce'):.2f}")
+
+    with st.expander("🔁 Reconciliar cashback creditado"):
+        st.caption("Recalcula de uma vez o cashback de todos os pedidos finalizados do pedidos.csv (os arquivados não entram), com os percentuais atuais do catálogo, e lista os que divergem do VALOR_CASHBACK_CREDITADO gravado. A correção altera só o pedido, não o saldo do cliente.")
+        if st.button("Recalcular", key="recalcular_cashback"):
+            st.session_state['reconciliacao_cashback'] = cashback_pedidos.reconciliar(df_pedidos, catalogo_por_id(df_catalogo))
+        reconciliacao = st.session_state.get('reconciliacao_cashback')
+        if reconciliacao is not None:
+            if reconciliacao.empty: st.success("Nenhuma divergência encontrada.")
+            else:
+                st.dataframe(reconciliacao, use_container_width=True, hide_index=True)
+                if st.button(f"💾 Gravar {len(reconciliacao)} valor(es) recalculado(s)", key="gravar_reconciliacao"):
+                    df_corrigido = cashback_pedidos.aplicar_reconciliacao(carregar_dados(SHEET_NAME_PEDIDOS), reconciliacao)
+                    if write_csv_to_github(df_corrigido, SHEET_NAME_PEDIDOS, f"Reconciliar cashback de {len(reconciliacao)} pedido(s)"):
+                        del st.session_state['reconciliacao_cashback']
+                        st.success("Cashback reconciliado!"); st.rerun()
 
 with tab_produtos:
     st.header("🛍️ Gerenciamento de Produtos")
     df_prods = carregar_dados(SHEET_NAME_CATALOGO)
+    avisar_linhas_rejeitadas(df_prods, SHEET_NAME_CATALOGO)
     with st.expander("➕ Adicionar Novo Produto"):
         with st.form("form_novo_produto", clear_on_submit=True):
             nome = st.text_input("Nome")
@@ -389,7 +700,35 @@ with tab_cupons:
                     if criar_cupom(codigo, tipo, valor, None if sem_val else validade, val_min, 0 if uso_ilim else limite):
                         st.success("Cupom criado!"); st.rerun()
     st.subheader("📝 Cupons Cadastrados")
+    if st.button("🗜️ Consolidar Usos", help="Soma ao USOS_ATUAIS os usos registrados no checkout em dias anteriores."):
+        qtd = consolidar_usos_cupons()
+        if qtd: st.success(f"{qtd} segmento(s) de usos consolidado(s).")
+        else: st.info("Nenhum segmento de usos para consolidar.")
     df_cupons = carregar_dados(SHEET_NAME_CUPONS)
-    if not df_cupons.empty: st.dataframe(df_cupons, use_container_width=True)
-
+    avisar_linhas_rejeitadas(df_cupons, SHEET_NAME_CUPONS)
+    if not df_cupons.empty:
+        # Usos registrados no checkout que ainda não foram consolidados no USOS_ATUAIS
+        usos_registrados = usos_cupons.contar_usos(PEDIDOS_REPO_FULL, PEDIDOS_BRANCH, GITHUB_TOKEN)
+        if 'CODIGO' in df_cupons.columns:
+            df_cupons['USOS_REGISTRADOS'] = df_cupons['CODIGO'].map(motor_cupons.normalizar_codigo).map(usos_registrados).fillna(0).astype(int)
+        st.dataframe(df_cupons, use_container_width=True)
 
+with tab_desempenho:
+    st.header("📊 Consumo da API do GitHub")
+    cota = cliente_github.cota()
+    c1, c2, c3 = st.columns(3)
+    if cota['restantes'] is None:
+        c1.metric("Cota restante", "—")
+    else:
+        c1.metric("Cota restante", f"{cota['restantes']} / {cota['limite'] or '?'}")
+    c2.metric("Renova às", datetime.fromtimestamp(cota['reinicia_em']).strftime('%H:%M:%S') if cota['reinicia_em'] else "—")
+    c3.metric("Fator dos TTLs", f"{cliente_github.fator_ttl():.1f}x", help="Intervalos de revalidação são multiplicados por este fator quando a cota está baixa.")
+    consumo = cliente_github.consumo()
+    st.caption(f"Chamadas feitas por este processo desde {datetime.fromtimestamp(consumo['desde']).strftime('%d/%m/%Y %H:%M:%S')}. Respostas 304 (não modificado) não gastam cota.")
+    if st.button("Zerar contadores"): cliente_github.zerar_consumo(); st.rerun()
+    st.subheader("Por planilha")
+    st.dataframe(tabela_consumo(consumo['arquivo'], 'ARQUIVO'), use_container_width=True, hide_index=True)
+    st.subheader("Por função")
+    st.dataframe(tabela_consumo(consumo['funcao'], 'FUNCAO'), use_container_width=True, hide_index=True)
+    st.subheader("Por sessão")
+    st.dataframe(tabela_consumo(consumo['sessao'], 'SESSAO'), use_container_width=True, hide_index=True)
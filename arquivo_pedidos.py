@@ -0,0 +1,95 @@
+# arquivo_pedidos.py
+"""
+Arquivo mensal dos pedidos concluídos.
+
+O 'pedidos.csv' acumulava todos os pedidos que a loja já recebeu, e o admin lia,
+convertia e ordenava o histórico inteiro a cada carga para mostrar os pedidos
+pendentes. Aqui os pedidos finalizados ou cancelados há mais de DIAS_RECENTES
+dias saem do 'pedidos.csv' e vão para partições mensais
+('pedidos_arquivo/AAAA-MM.csv', pelo mês do pedido). O 'pedidos.csv' fica só
+com os pendentes e os recentes; o histórico é consultado por período, lendo
+apenas as partições dos meses pedidos.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import github_dados
+
+PASTA_ARQUIVO = "pedidos_arquivo"
+DIAS_RECENTES = 30
+STATUS_CONCLUIDOS = ('Finalizado', 'Cancelado')
+
+
+def caminho_particao(mes):
+    """Caminho da partição do mês 'AAAA-MM'."""
+    return f"{PASTA_ARQUIVO}/{mes}.csv"
+
+
+def separar_arquivaveis(df_pedidos, hoje=None, dias=DIAS_RECENTES):
+    """
+    Divide 'df_pedidos' em (pedidos que ficam no 'pedidos.csv', {mês 'AAAA-MM': pedidos a
+    arquivar}). São arquivados os concluídos feitos há mais de 'dias' dias; pedidos sem
+    data válida nunca são arquivados.
+    """
+    if df_pedidos is None or df_pedidos.empty or 'STATUS' not in df_pedidos.columns or 'DATA_HORA' not in df_pedidos.columns:
+        return df_pedidos, {}
+    datas = pd.to_datetime(df_pedidos['DATA_HORA'], errors='coerce')
+    limite = pd.Timestamp((hoje or datetime.now()) - timedelta(days=dias))
+    arquivar = df_pedidos['STATUS'].isin(STATUS_CONCLUIDOS) & (datas < limite)
+    meses = datas[arquivar].dt.strftime('%Y-%m')
+    por_mes = {mes: df_pedidos[arquivar][meses == mes].reset_index(drop=True) for mes in sorted(meses.unique())}
+    return df_pedidos[~arquivar].reset_index(drop=True), por_mes
+
+
+def incorporar(df_particao, df_novos, chave='ID_PEDIDO'):
+    """Partição com 'df_novos' acrescentados; um pedido que já estava nela é substituído pela versão nova."""
+    if df_particao is None or df_particao.empty:
+        return df_novos.reset_index(drop=True)
+    mantidos = df_particao[~df_particao[chave].astype(str).isin(set(df_novos[chave].astype(str)))]
+    return pd.concat([mantidos, df_novos], ignore_index=True)
+
+
+def listar_particoes(repo, branch, token):
+    """Partições existentes, em ordem cronológica (dicts com 'name', 'path' e 'sha')."""
+    itens = github_dados.listar_diretorio(repo, branch, PASTA_ARQUIVO, token)
+    return sorted((i for i in itens if i["name"].endswith(".csv")), key=lambda i: i["name"])
+
+
+def particoes_do_periodo(particoes, inicio, fim):
+    """Partições dos meses entre as datas 'inicio' e 'fim' (inclusive)."""
+    primeiro, ultimo = inicio.strftime('%Y-%m'), fim.strftime('%Y-%m')
+    return [p for p in particoes if primeiro <= p["name"][:-len(".csv")] <= ultimo]
+
+
+def ler_historico(repo, branch, token, inicio, fim, formato, parser):
+    """
+    Pedidos arquivados feitos entre as datas 'inicio' e 'fim' (inclusive), do mais recente
+    para o mais antigo, com DATA_HORA já convertida. Só as partições desses meses são
+    lidas (ao mesmo tempo); as que não mudaram vêm da memória.
+    """
+    particoes = particoes_do_periodo(listar_particoes(repo, branch, token), inicio, fim)
+    leituras = github_dados.em_paralelo([
+        lambda particao=particao: github_dados.obter_dataframe(
+            repo, branch, particao["path"], token, formato, parser, sha_esperado=particao["sha"]
+        )
+        for particao in particoes
+    ])
+    dfs = []
+    for df, erro in leituras:
+        if erro is not None:
+            raise erro
+        if df is not None and not df.empty:
+            dfs.append(df)
+    if not dfs:
+        return pd.DataFrame()
+    return filtrar_periodo(pd.concat(dfs, ignore_index=True), inicio, fim)
+
+
+def filtrar_periodo(df_pedidos, inicio, fim):
+    """Pedidos feitos entre as datas 'inicio' e 'fim' (inclusive), do mais recente para o mais antigo."""
+    if df_pedidos is None or df_pedidos.empty:
+        return pd.DataFrame()
+    datas = pd.to_datetime(df_pedidos['DATA_HORA'], errors='coerce')
+    no_periodo = (datas >= pd.Timestamp(inicio)) & (datas < pd.Timestamp(fim) + pd.Timedelta(days=1))
+    return df_pedidos[no_periodo].assign(DATA_HORA=datas[no_periodo]).sort_values('DATA_HORA', ascending=False).reset_index(drop=True)
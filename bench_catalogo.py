@@ -0,0 +1,80 @@
+# bench_catalogo.py
+"""
+Micro-benchmark da montagem do catálogo (sem acesso ao GitHub).
+
+Gera planilhas sintéticas de produtos, promoções e vídeos e mede o tempo de
+catalogo_preparado.montar_catalogo (conversões, condição de pagamento e join)
+e de catalogo_preparado.preparar_catalogo (índice de busca, ordenações,
+partições e HTML dos cards) para catálogos de 1 mil, 10 mil e 100 mil linhas.
+
+Uso: python bench_catalogo.py [tamanho ...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import catalogo_preparado
+
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000]
+REPETICOES = 3
+
+PALAVRAS = ["batom", "base", "máscara", "cílios", "sérum", "hidratante", "matte", "vegano", "kit", "pó"]
+CATEGORIAS = ["Maquiagem", "Skincare", "Cabelos", "Perfumaria", "Acessórios"]
+
+
+def gerar_planilhas(n, semente=0):
+    """Planilhas no formato lido do GitHub: textos, preços com vírgula decimal etc."""
+    rng = np.random.default_rng(semente)
+    ids = np.arange(1, n + 1)
+    precos = rng.uniform(5, 500, n).round(2)
+    palavras = np.array(PALAVRAS, dtype=object)
+    df_produtos = pd.DataFrame({
+        "ID": ids.astype(str),
+        "NOME": palavras[rng.integers(0, len(PALAVRAS), n)] + " " + palavras[rng.integers(0, len(PALAVRAS), n)] + " " + ids.astype(str),
+        "PRECOVISTA": pd.Series(precos).map(lambda v: f"{v:.2f}".replace(".", ",")),
+        "PRECOCARTAO": pd.Series(precos * 1.1).map(lambda v: f"{v:.2f}".replace(".", ",")),
+        "MARCA": "Marca",
+        "DESCRICAOLONGA": "Produto " + palavras[rng.integers(0, len(PALAVRAS), n)],
+        "CATEGORIA": np.array(CATEGORIAS, dtype=object)[rng.integers(0, len(CATEGORIAS), n)],
+        "DETALHESGRADE": np.where(rng.random(n) < 0.5, "{'Cor': 'Nude', 'Volume': '30ml'}", ""),
+        "FOTOURL": "https://exemplo.com/foto.jpg",
+        "QUANTIDADE": rng.integers(0, 50, n).astype(str),
+        "CASHBACKPERCENT": rng.choice(["0", "5", "2,5"], n),
+        "DISPONIVEL": np.where(rng.random(n) < 0.95, "Sim", "Não"),
+    })
+    em_promocao = rng.choice(ids, max(1, n // 10), replace=False)
+    df_promocoes = pd.DataFrame({
+        "ID_PRODUTO": pd.array(em_promocao, dtype="Int64"),
+        "PRECO_PROMOCIONAL": precos[em_promocao - 1] * 0.8,
+    })
+    com_video = rng.choice(ids, max(1, n // 20), replace=False)
+    df_videos = pd.DataFrame({
+        "ID_PRODUTO": com_video.astype(str),
+        "YOUTUBE_URL": "https://youtube.com/watch?v=x",
+    })
+    return df_produtos, df_promocoes, df_videos
+
+
+def medir(funcao, *args):
+    """Menor tempo (s) entre REPETICOES execuções e o resultado da última."""
+    melhor, resultado = float("inf"), None
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main(tamanhos):
+    print(f"{'linhas':>8} | {'montar_catalogo':>16} | {'preparar_catalogo':>18} | {'total':>8}")
+    for n in tamanhos:
+        df_produtos, df_promocoes, df_videos = gerar_planilhas(n)
+        t_montar, (df_final, _) = medir(catalogo_preparado.montar_catalogo, df_produtos, df_promocoes, df_videos)
+        t_preparar, _ = medir(catalogo_preparado.preparar_catalogo, df_final)
+        print(f"{n:>8} | {t_montar * 1000:>13.1f} ms | {t_preparar * 1000:>15.1f} ms | {(t_montar + t_preparar):>6.2f} s")
+
+
+if __name__ == "__main__":
+    main([int(t) for t in sys.argv[1:]] or TAMANHOS_PADRAO)
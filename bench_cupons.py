@@ -0,0 +1,84 @@
+# bench_cupons.py
+"""
+Micro-benchmark do motor de cupons (sem acesso ao GitHub).
+
+Gera uma planilha sintética de cupons e um lote de carrinhos (código, subtotal)
+e mede a compilação da planilha e a validação em lote com
+motor_cupons.validar_lote, comparando com o filtro por DataFrame que o
+checkout fazia a cada aplicação de cupom.
+
+Uso: python bench_cupons.py [cupons] [carrinhos]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import motor_cupons
+
+CUPONS_PADRAO = 5_000
+CARRINHOS_PADRAO = 100_000
+CARRINHOS_DATAFRAME = 2_000  # o filtro por DataFrame é lento demais para o lote inteiro
+
+
+def gerar_cupons(n, semente=0):
+    rng = np.random.default_rng(semente)
+    hoje = pd.Timestamp.now().normalize()
+    return pd.DataFrame({
+        "CODIGO": [f"CUPOM{i}" for i in range(n)],
+        "TIPO_DESCONTO": rng.choice(["PERCENTUAL", "FIXO"], n),
+        "VALOR": rng.choice(["5", "10", "12,5", "20"], n),
+        "DATA_VALIDADE": np.where(
+            rng.random(n) < 0.2, "", (hoje + pd.to_timedelta(rng.integers(-30, 60, n), unit="D")).strftime("%Y-%m-%d")
+        ),
+        "VALOR_MINIMO_PEDIDO": rng.choice(["0", "50", "100"], n),
+        "LIMITE_USOS": rng.choice([0, 10, 100], n),
+        "USOS_ATUAIS": rng.integers(0, 120, n),
+        "STATUS": np.where(rng.random(n) < 0.9, "ATIVO", "INATIVO"),
+    })
+
+
+def gerar_carrinhos(n, n_cupons, semente=1):
+    rng = np.random.default_rng(semente)
+    codigos = [f"cupom{i}" if i < n_cupons else "INEXISTENTE" for i in rng.integers(0, int(n_cupons * 1.1), n)]
+    return list(zip(codigos, rng.uniform(10, 500, n).round(2)))
+
+
+def validar_por_dataframe(df, carrinhos):
+    """Filtro linha a linha pelo código, como o checkout fazia antes do motor de cupons."""
+    df = df.assign(CODIGO=df["CODIGO"].str.upper())
+    resultados = []
+    for codigo, subtotal in carrinhos:
+        encontrado = df[df["CODIGO"] == codigo.upper()]
+        resultados.append(not encontrado.empty and subtotal >= float(encontrado.iloc[0]["VALOR_MINIMO_PEDIDO"]))
+    return resultados
+
+
+def main(n_cupons, n_carrinhos):
+    df = gerar_cupons(n_cupons)
+    carrinhos = gerar_carrinhos(n_carrinhos, n_cupons)
+
+    inicio = time.perf_counter()
+    cupons = motor_cupons.compilar_cupons(df)
+    t_compilar = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    validacoes = motor_cupons.validar_lote(cupons, carrinhos)
+    t_lote = time.perf_counter() - inicio
+
+    amostra = carrinhos[:CARRINHOS_DATAFRAME]
+    inicio = time.perf_counter()
+    validar_por_dataframe(df, amostra)
+    t_dataframe = time.perf_counter() - inicio
+
+    validos = sum(v.valido for v in validacoes)
+    print(f"cupons: {n_cupons}  carrinhos: {n_carrinhos}  válidos: {validos}")
+    print(f"compilação:          {t_compilar * 1000:10.1f} ms")
+    print(f"motor (por carrinho): {t_lote / n_carrinhos * 1e6:9.2f} µs  ({n_carrinhos / t_lote:,.0f} carrinhos/s)")
+    print(f"DataFrame (por carrinho): {t_dataframe / len(amostra) * 1e6:5.0f} µs  (amostra de {len(amostra)})")
+
+
+if __name__ == "__main__":
+    argumentos = [int(a) for a in sys.argv[1:3]]
+    main(*(argumentos + [CUPONS_PADRAO, CARRINHOS_PADRAO][len(argumentos):]))
@@ -0,0 +1,88 @@
+# bench_leitura_csv.py
+"""
+Micro-benchmark da leitura do 'pedidos.csv' (sem acesso ao GitHub).
+
+Gera um 'pedidos.csv' sintético, com o 'itens_json' de cada pedido e algumas
+linhas do formato antigo, e compara a leitura de leitura_csv com o esquema de
+pedidos do admin (pelo pyarrow e pelo leitor em C) com a que o admin fazia
+(replace no conteúdo + engine="python").
+
+Uso: python bench_leitura_csv.py [pedidos]
+"""
+import dataclasses
+import json
+import sys
+import time
+import warnings
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+import leitura_csv
+
+PEDIDOS_PADRAO = 20_000
+FRACAO_FORMATO_ANTIGO = 0.01
+CABECALHO = "ID_PEDIDO,DATA_HORA,NOME_CLIENTE,CONTATO_CLIENTE,ITENS_PEDIDO,VALOR_TOTAL,LINKIMAGEM,STATUS,itens_json"
+
+# O mesmo esquema de pedidos do admin_app (ESQUEMAS_ADMIN)
+ESQUEMA_PEDIDOS = leitura_csv.Esquema(
+    tipos={"DATA_HORA": str},
+    motor="pyarrow",
+    decimais={"VALOR_TOTAL": 0.0, "VALOR_DESCONTO": 0.0},
+    padroes={"VALOR_TOTAL": 0.0, "VALOR_DESCONTO": 0.0},
+    opcoes={"quotechar": '"', "escapechar": "\\", "doublequote": True},
+    reparar_linha=lambda linha: linha.replace(',"","PENDENTE",', ',"PENDENTE",'),
+)
+
+
+def gerar_pedidos(n, semente=0):
+    rng = np.random.default_rng(semente)
+    linhas = [CABECALHO]
+    for i in range(n):
+        itens = [
+            {"id": int(p), "nome": f"Produto {p}", "preco": 19.9, "quantidade": int(q), "imagem": f"https://i.ibb.co/{p}.jpg"}
+            for p, q in zip(rng.integers(1, 500, rng.integers(1, 8)), rng.integers(1, 4, 8))
+        ]
+        itens_json = json.dumps({"itens": itens, "subtotal": 99.5, "cupom": None}).replace('"', '""')
+        resumo = "; ".join(f"{item['quantidade']}x {item['nome']}" for item in itens)
+        link = "" if rng.random() < FRACAO_FORMATO_ANTIGO else "https://i.ibb.co/x.jpg"
+        # O formato antigo tinha um campo vazio a mais antes do STATUS
+        extra = '"",' if not link else ""
+        linhas.append(
+            f'"{i}","2024-05-01 10:00:00","Cliente {i}","4199{i:07d}","{resumo}","{rng.uniform(10, 500):.2f}",'
+            f'"{link}",{extra}"PENDENTE","{itens_json}"'
+        )
+    return "\n".join(linhas)
+
+
+def ler_como_antes(conteudo):
+    conteudo = conteudo.replace(',"","PENDENTE",', ',"PENDENTE",')
+    df = pd.read_csv(StringIO(conteudo), sep=",", engine="python", on_bad_lines="warn",
+                     quotechar='"', escapechar="\\", doublequote=True)
+    df.columns = df.columns.str.strip().str.upper().str.replace(' ', '_')
+    for col in ["VALOR_TOTAL", "VALOR_DESCONTO"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0) if col in df.columns else 0.0
+    return df
+
+
+def main(n):
+    conteudo = gerar_pedidos(n)
+    warnings.simplefilter("ignore")
+
+    inicio = time.perf_counter()
+    antes = ler_como_antes(conteudo)
+    t_antes = time.perf_counter() - inicio
+
+    print(f"pedidos: {n}  ({len(conteudo) / 1e6:.1f} MB)")
+    print(f"engine='python':          {t_antes * 1000:8.1f} ms")
+    for motor in ("pyarrow", "c"):
+        esquema = dataclasses.replace(ESQUEMA_PEDIDOS, motor=motor)
+        inicio = time.perf_counter()
+        df = leitura_csv.ler_csv(conteudo, esquema)
+        t_esquema = time.perf_counter() - inicio
+        print(f"leitura_csv ({motor + '):':9}  {t_esquema * 1000:8.1f} ms  ({t_antes / t_esquema:.1f}x)  mesmo resultado: {df.equals(antes)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else PEDIDOS_PADRAO)
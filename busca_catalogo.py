@@ -0,0 +1,94 @@
+# busca_catalogo.py
+"""
+Índice de busca do catálogo, construído uma vez por versão do catálogo.
+
+A barra de busca aplicava um lambda por linha em todo o catálogo a cada rerun.
+Aqui os textos de NOME e DESCRICAOLONGA são normalizados (minúsculas, sem
+acentos) uma única vez e indexados por trigramas e por prefixos curtos das
+palavras. Uma busca consulta só as listas dos termos digitados e confere o
+texto apenas dos candidatos, então o tempo não cresce com o tamanho do catálogo.
+"""
+import re
+import unicodedata
+
+# Campos pesquisados e o peso de cada um na relevância (nome vale mais que descrição)
+CAMPOS_BUSCA = {"NOME": 2, "DESCRICAOLONGA": 1}
+TAMANHO_NGRAMA = 3
+
+
+def normalizar_texto(texto):
+    """Minúsculas e sem acentos ('Máscara' -> 'mascara')."""
+    if texto is None or texto != texto:  # None ou NaN
+        return ""
+    decomposto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    """Termos (palavras) do texto já normalizado."""
+    return re.findall(r"\w+", normalizar_texto(texto))
+
+
+def _ngramas(termo):
+    return {termo[i:i + TAMANHO_NGRAMA] for i in range(len(termo) - TAMANHO_NGRAMA + 1)}
+
+
+def construir_indice(df):
+    """
+    Monta o índice para as linhas de 'df' (as posições retornadas na busca são
+    posições de linha, para uso com df.iloc).
+    """
+    indice = {"textos": {}, "ngramas": {}, "prefixos": {}}
+    for campo in CAMPOS_BUSCA:
+        valores = df[campo].tolist() if campo in df.columns else [""] * len(df)
+        textos = [normalizar_texto(v) for v in valores]
+        ngramas, prefixos = {}, {}
+        for posicao, texto in enumerate(textos):
+            for termo in set(re.findall(r"\w+", texto)):
+                for ngrama in _ngramas(termo):
+                    ngramas.setdefault(ngrama, set()).add(posicao)
+                for tamanho in range(1, TAMANHO_NGRAMA):
+                    prefixos.setdefault(termo[:tamanho], set()).add(posicao)
+        indice["textos"][campo] = textos
+        indice["ngramas"][campo] = ngramas
+        indice["prefixos"][campo] = prefixos
+    return indice
+
+
+def _posicoes_do_termo(indice, campo, termo):
+    """Linhas em que 'termo' aparece no campo (trecho de palavra; termos curtos casam pelo início da palavra)."""
+    if len(termo) < TAMANHO_NGRAMA:
+        return indice["prefixos"][campo].get(termo, set())
+
+    ngramas = indice["ngramas"][campo]
+    listas = sorted((ngramas.get(g, set()) for g in _ngramas(termo)), key=len)
+    candidatos = set(listas[0]).intersection(*listas[1:]) if listas else set()
+    textos = indice["textos"][campo]
+    return {p for p in candidatos if termo in textos[p]}
+
+
+def buscar(indice, consulta):
+    """
+    Retorna [(posição, relevância)] das linhas que contêm todos os termos da consulta
+    (em qualquer dos campos), da mais para a menos relevante. A relevância soma,
+    para cada termo, o peso do campo mais importante em que ele foi encontrado.
+    """
+    termos = tokenizar(consulta)
+    if not termos:
+        return []
+
+    pontuacao = None
+    for termo in termos:
+        pontos_termo = {}
+        for campo, peso in CAMPOS_BUSCA.items():
+            for posicao in _posicoes_do_termo(indice, campo, termo):
+                if pontos_termo.get(posicao, 0) < peso:
+                    pontos_termo[posicao] = peso
+        if pontuacao is None:
+            pontuacao = pontos_termo
+        else:
+            pontuacao = {p: pontuacao[p] + pontos_termo[p] for p in pontuacao.keys() & pontos_termo.keys()}
+        if not pontuacao:
+            return []
+
+    return sorted(pontuacao.items(), key=lambda item: (-item[1], item[0]))
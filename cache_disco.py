@@ -0,0 +1,112 @@
+# cache_disco.py
+"""
+Cópia em disco do armazém de 'github_dados', para partidas a frio.
+
+Um processo novo (reinício do container, novo worker do Streamlit) começa com
+o armazém vazio e precisaria baixar todas as planilhas do GitHub, uma após a
+outra, antes de exibir a primeira página. Aqui cada arquivo lido é guardado em
+disco (conteúdo, SHA e ETag) e cada DataFrame processado é guardado em Parquet,
+identificado pelo SHA do blob. Na partida, 'github_dados' serve essa cópia na
+hora e a revalida com o GitHub em segundo plano.
+
+O cache é só uma otimização: qualquer falha de leitura ou gravação é ignorada
+e a leitura segue pelo caminho normal (API). Um DataFrame que o Parquet não
+consegue guardar não vai para o disco: é processado de novo a partir do conteúdo.
+
+O cache é opcional e fica desligado por padrão: as planilhas (inclusive nomes e
+contatos de clientes e pedidos) são gravadas como estão, sem criptografia. Para
+ligá-lo, GITHUB_CACHE_DIR deve apontar para um diretório privado, fora da pasta
+do app; o diretório é criado acessível só ao usuário do processo.
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+DIRETORIO = os.environ.get("GITHUB_CACHE_DIR", "")
+
+
+def _prefixo(chave):
+    """Nome de arquivo estável para (repo, branch, caminho)."""
+    return os.path.join(DIRETORIO, hashlib.sha1("\0".join(chave).encode("utf-8")).hexdigest())
+
+
+def _slug(formato):
+    return "".join(c if c.isalnum() else "_" for c in formato)
+
+
+def _gravar(caminho, escrever):
+    """Grava em um arquivo temporário e troca de uma vez (leitores nunca veem um arquivo pela metade)."""
+    os.makedirs(DIRETORIO, mode=0o700, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=DIRETORIO, suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            escrever(arquivo)
+        os.replace(temporario, caminho)
+    except Exception:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def carregar_entrada(chave):
+    """{'etag', 'sha', 'conteudo'} guardado para o arquivo, ou None."""
+    if not DIRETORIO:
+        return None
+    try:
+        with open(_prefixo(chave) + ".json", encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        return {"etag": dados["etag"], "sha": dados["sha"], "conteudo": dados["conteudo"]}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def salvar_entrada(chave, entrada):
+    """Guarda conteúdo/SHA/ETag do arquivo e apaga os DataFrames de versões anteriores."""
+    if not DIRETORIO:
+        return
+    prefixo = _prefixo(chave)
+    dados = json.dumps({"etag": entrada["etag"], "sha": entrada["sha"], "conteudo": entrada["conteudo"]}).encode("utf-8")
+    try:
+        _gravar(prefixo + ".json", lambda arquivo: arquivo.write(dados))
+        for antigo in glob.glob(prefixo + "-*"):
+            if not os.path.basename(antigo).startswith(os.path.basename(prefixo) + f"-{entrada['sha']}-"):
+                os.remove(antigo)
+    except OSError:
+        pass
+
+
+def remover_entrada(chave):
+    if not DIRETORIO:
+        return
+    prefixo = _prefixo(chave)
+    for caminho in glob.glob(prefixo + ".json") + glob.glob(prefixo + "-*"):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+def carregar_df(chave, sha, formato):
+    """DataFrame já processado desta versão do arquivo, ou None."""
+    if not DIRETORIO:
+        return None
+    base = f"{_prefixo(chave)}-{sha}-{_slug(formato)}"
+    try:
+        return pd.read_parquet(base + ".parquet") if os.path.exists(base + ".parquet") else None
+    except Exception:
+        return None
+
+
+def salvar_df(chave, sha, formato, df):
+    """Guarda o DataFrame em Parquet; se o Parquet não suportar as colunas (ou não houver pyarrow), não guarda."""
+    if not DIRETORIO:
+        return
+    base = f"{_prefixo(chave)}-{sha}-{_slug(formato)}"
+    try:
+        _gravar(base + ".parquet", lambda arquivo: df.to_parquet(arquivo, index=True))
+    except Exception:
+        pass
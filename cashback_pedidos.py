@@ -0,0 +1,119 @@
+# cashback_pedidos.py
+"""
+Cálculo do cashback dos pedidos em lote.
+
+O admin calculava o cashback pedido a pedido: para cada item, uma varredura do
+catálogo inteiro atrás do produto e a conversão do CASHBACKPERCENT (texto com
+vírgula) para número. Aqui o catálogo é indexado pelo ID uma única vez por
+versão, os itens de todos os pedidos viram uma única tabela e o cashback de
+todos eles sai de algumas operações sobre colunas: o desconto do pedido é
+repartido entre os itens proporcionalmente ao valor de cada um, e cada item
+rende o percentual do seu produto sobre o valor que sobrou.
+
+O mesmo cálculo serve para a reconciliação: recalcular o cashback dos pedidos
+já finalizados e comparar com o VALOR_CASHBACK_CREDITADO gravado.
+"""
+import threading
+
+import pandas as pd
+
+import conversoes
+import modelo_pedidos
+
+# Quantas versões do catálogo indexado manter em memória
+MAX_VERSOES = 4
+
+# Diferença a partir da qual um cashback creditado é considerado divergente na reconciliação
+TOLERANCIA = 0.005
+
+_CATALOGOS = {}  # (versão, linhas) -> DataFrame indexado pelo ID
+_TRAVA_CATALOGOS = threading.Lock()
+
+
+def _indexar(df_catalogo):
+    if df_catalogo is None or df_catalogo.empty or 'ID' not in df_catalogo.columns:
+        return pd.DataFrame({'FOTOURL': pd.Series(dtype=object), 'CASHBACK_PERCENTUAL': pd.Series(dtype=float)})
+    # Produto repetido no catálogo: vale a primeira linha
+    df = df_catalogo[~df_catalogo['ID'].duplicated(keep='first')]
+    return pd.DataFrame({
+        'FOTOURL': df['FOTOURL'] if 'FOTOURL' in df.columns else None,
+        'CASHBACK_PERCENTUAL': conversoes.converter_numerico(df['CASHBACKPERCENT'], 0.0) if 'CASHBACKPERCENT' in df.columns else 0.0,
+    }, index=df.index).set_axis(df['ID'].to_numpy())
+
+
+def catalogo_por_id(df_catalogo, versao=None):
+    """
+    Catálogo indexado pelo ID do produto, com FOTOURL e CASHBACK_PERCENTUAL (número; 0
+    se vazio ou inválido). Com 'versao' (ex.: o SHA do arquivo), é montado uma vez e
+    reaproveitado enquanto a versão não mudar.
+    """
+    if versao is None:
+        return _indexar(df_catalogo)
+    chave = (versao, len(df_catalogo))
+    catalogo = _CATALOGOS.get(chave)
+    if catalogo is None:
+        catalogo = _indexar(df_catalogo)
+        with _TRAVA_CATALOGOS:
+            _CATALOGOS[chave] = catalogo
+            while len(_CATALOGOS) > MAX_VERSOES:
+                _CATALOGOS.pop(next(iter(_CATALOGOS)))
+    return catalogo
+
+
+def tabela_de_itens(pedidos):
+    """Itens de todos os pedidos (modelo_pedidos.Pedido) em uma tabela, um item por linha."""
+    linhas = [
+        (pedido.id_pedido, item.id, item.subtotal, pedido.subtotal, pedido.desconto)
+        for pedido in pedidos for item in pedido.itens
+    ]
+    return pd.DataFrame(linhas, columns=['ID_PEDIDO', 'ID_PRODUTO', 'SUBTOTAL_ITEM', 'SUBTOTAL_PEDIDO', 'DESCONTO_PEDIDO'])
+
+
+def calcular_lote(pedidos, catalogo):
+    """
+    Cashback de cada pedido (modelo_pedidos.Pedido) segundo o 'catalogo' (catalogo_por_id),
+    em uma Series indexada pelo ID_PEDIDO e arredondada em centavos.
+    """
+    pedidos = list(pedidos)
+    itens = tabela_de_itens(pedidos)
+    percentuais = itens['ID_PRODUTO'].map(catalogo['CASHBACK_PERCENTUAL']).fillna(0.0).astype(float)
+    proporcoes = (itens['SUBTOTAL_ITEM'] / itens['SUBTOTAL_PEDIDO']).where(itens['SUBTOTAL_PEDIDO'] > 0, 0.0)
+    valores_finais = itens['SUBTOTAL_ITEM'] - itens['DESCONTO_PEDIDO'] * proporcoes
+    cashbacks = (valores_finais * percentuais / 100).where(percentuais > 0, 0.0)
+    por_pedido = cashbacks.groupby(itens['ID_PEDIDO'], sort=False).sum()
+    return por_pedido.reindex([pedido.id_pedido for pedido in pedidos], fill_value=0.0).astype(float).round(2)
+
+
+def reconciliar(df_pedidos, catalogo):
+    """
+    Recalcula o cashback dos pedidos finalizados de 'df_pedidos' e compara com o
+    VALOR_CASHBACK_CREDITADO. Retorna um DataFrame (ID_PEDIDO, NOME_CLIENTE, CREDITADO,
+    RECALCULADO, DIFERENCA) só com os pedidos cuja diferença passa de TOLERANCIA.
+    """
+    colunas = ['ID_PEDIDO', 'NOME_CLIENTE', 'CREDITADO', 'RECALCULADO', 'DIFERENCA']
+    if df_pedidos is None or df_pedidos.empty or 'STATUS' not in df_pedidos.columns:
+        return pd.DataFrame(columns=colunas)
+    finalizados = df_pedidos[df_pedidos['STATUS'] == 'Finalizado']
+    finalizados = finalizados[~finalizados['ID_PEDIDO'].astype(str).duplicated(keep='first')]
+    recalculados = calcular_lote(modelo_pedidos.pedidos_por_id(finalizados).values(), catalogo)
+    creditados = (
+        conversoes.converter_numerico(finalizados['VALOR_CASHBACK_CREDITADO'], 0.0)
+        if 'VALOR_CASHBACK_CREDITADO' in finalizados.columns else pd.Series(0.0, index=finalizados.index)
+    )
+    resultado = pd.DataFrame({
+        'ID_PEDIDO': finalizados['ID_PEDIDO'].astype(str).to_numpy(),
+        'NOME_CLIENTE': finalizados['NOME_CLIENTE'].to_numpy() if 'NOME_CLIENTE' in finalizados.columns else '',
+        'CREDITADO': creditados.to_numpy(),
+    })
+    resultado['RECALCULADO'] = resultado['ID_PEDIDO'].map(recalculados).fillna(0.0)
+    resultado['DIFERENCA'] = (resultado['RECALCULADO'] - resultado['CREDITADO']).round(2)
+    return resultado[resultado['DIFERENCA'].abs() > TOLERANCIA].reset_index(drop=True)[colunas]
+
+
+def aplicar_reconciliacao(df_pedidos, reconciliacao):
+    """'df_pedidos' com o VALOR_CASHBACK_CREDITADO dos pedidos de 'reconciliacao' trocado pelo valor recalculado."""
+    recalculados = reconciliacao.set_index('ID_PEDIDO')['RECALCULADO']
+    ids = df_pedidos['ID_PEDIDO'].astype(str)
+    atuais = df_pedidos['VALOR_CASHBACK_CREDITADO'] if 'VALOR_CASHBACK_CREDITADO' in df_pedidos.columns else pd.Series(0.0, index=df_pedidos.index)
+    alterar = ids.isin(recalculados.index) & (df_pedidos['STATUS'] == 'Finalizado')
+    return df_pedidos.assign(VALOR_CASHBACK_CREDITADO=atuais.where(~alterar, ids.map(recalculados)))
@@ -4,14 +4,21 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import json
-import time
 from streamlit_autorefresh import st_autorefresh
 import requests
-import base64
-from io import StringIO
 import os
-import ast
-import pytz
+import uuid
+
+import github_dados
+import busca_catalogo
+import cliente_github
+import catalogo_preparado
+import clientes_cashback
+import conversoes
+import leitura_csv
+import log_segmentado
+import motor_cupons
+import usos_cupons
 
 
 # --- Variáveis de Configuração ---
@@ -19,6 +26,7 @@ GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
 DATA_REPO_NAME = os.environ.get("DATA_REPO_NAME", os.environ.get("REPO_NAME"))
 BRANCH = os.environ.get("BRANCH")
 ESTOQUE_BAIXO_LIMITE = 5 # Define o limite para exibir o alerta de "Últimas Unidades"
+PRODUTOS_POR_PAGINA = int(os.environ.get("PRODUTOS_POR_PAGINA", 24)) # Cards montados por página da grade
 
 # URLs da API
 GITHUB_BASE_API = f"https://api.github.com/repos/{DATA_REPO_NAME}/contents/"
@@ -30,12 +38,18 @@ SHEET_NAME_PEDIDOS_CSV = "pedidos.csv"
 SHEET_NAME_VIDEOS_CSV = "video.csv"
 SHEET_NAME_CLIENTES_CASHBACK_CSV = "clientes_cash.csv"
 SHEET_NAME_CUPONS_CSV = "cupons.csv"
+PASTA_SEGMENTOS_PEDIDOS = "pedidos"  # Segmentos diários de novos pedidos (pedidos/AAAA-MM-DD.csv)
+CABECALHO_PEDIDOS = 'ID_PEDIDO,DATA_HORA,NOME_CLIENTE,CONTATO_CLIENTE,ITENS_PEDIDO,VALOR_TOTAL,LINKIMAGEM,STATUS,itens_json'
 BACKGROUND_IMAGE_URL = 'https://i.ibb.co/x8HNtgxP/Без-na-zvania-3.jpg'
 LOGO_DOCEBELLA_URL = "https://i.ibb.co/S9kT5nS/logo_docebella.png"
 
 # NÚMERO DE TELEFONE PARA O BOTÃO FLUTUANTE DO WHATSAPP
 NUMERO_WHATSAPP = "5541987876191" # SEU DDD + Número
 
+# Chaves dos fragmentos (st.fragment) que uma alteração do carrinho reexecuta, em vez da página inteira
+FRAGMENTO_CARRINHO = "fragmento_carrinho"
+PREFIXO_FRAGMENTO_CARD = "fragmento_card_"
+
 
 # Inicialização do Carrinho de Compras e Estado
 if 'carrinho' not in st.session_state:
@@ -48,119 +62,115 @@ if 'desconto_cupom' not in st.session_state:
     st.session_state.desconto_cupom = 0.0
 if 'cupom_mensagem' not in st.session_state:
     st.session_state.cupom_mensagem = ""
+if 'pagina_catalogo' not in st.session_state:
+    st.session_state.pagina_catalogo = 1
+if 'filtro_grade' not in st.session_state:
+    st.session_state.filtro_grade = None
+if 'cards_renderizados' not in st.session_state:
+    st.session_state.cards_renderizados = set()  # Produtos com card na página exibida
     
-# OTIMIZAÇÃO: Cache do catálogo principal no estado da sessão para evitar re-leitura constante
-if 'df_catalogo_indexado' not in st.session_state:
-    st.session_state.df_catalogo_indexado = None
+# OTIMIZAÇÃO: o catálogo preparado é um instantâneo único do processo (catalogo_preparado.catalogo_compartilhado);
+# a sessão guarda apenas a versão que está exibindo
+if 'versao_catalogo' not in st.session_state:
+    st.session_state.versao_catalogo = None
+
+
+def _id_da_sessao():
+    """Identificador curto da sessão do Streamlit (para a contabilidade de chamadas à API)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx().session_id[:8]
+    except Exception:
+        return "?"
+
+
+# As chamadas à API do GitHub feitas nesta execução são atribuídas a esta sessão (ver cliente_github.consumo)
+cliente_github.definir_sessao(f"catalogo:{_id_da_sessao()}")
 
 
 # --- Funções de Conexão GITHUB ---
+# Esquema de leitura das planilhas que precisam de tipos ou nomes próprios (ver leitura_csv)
+ESQUEMAS_CATALOGO = {
+    SHEET_NAME_CLIENTES_CASHBACK_CSV: leitura_csv.Esquema(
+        tipos={'CONTATO': str, 'TELEFONE': str},
+        renomear={'TELEFONE': 'CONTATO', 'CASHBACK_DISPONÍVEL': 'CASHBACK_DISPONIVEL'},
+    ),
+}
+
+
+def _ler_csv_catalogo(content, file_name):
+    """Converte o conteúdo bruto do CSV em DataFrame com colunas padronizadas."""
+    return leitura_csv.ler_csv(content, ESQUEMAS_CATALOGO.get(file_name))
+
+
 def get_data_from_github(file_name):
     """
     Lê o conteúdo de um CSV do GitHub diretamente via API (sem cache da CDN).
-    Garante que sempre trará a versão mais recente do arquivo.
+    Usa o armazém compartilhado de 'github_dados': a requisição é condicional (ETag)
+    e, se o arquivo não mudou, o DataFrame já processado é reaproveitado.
     """
     api_url = f"{GITHUB_BASE_API}{file_name}?ref={BRANCH}"
 
     try:
-        headers_content = {
-            "Authorization": f"token {GITHUB_TOKEN}",
-        }
-        response = requests.get(api_url, headers=headers_content)
+        df = github_dados.obter_dataframe(
+            DATA_REPO_NAME, BRANCH, file_name, GITHUB_TOKEN,
+            f"catalogo:{file_name}:v{leitura_csv.VERSAO}", lambda content: _ler_csv_catalogo(content, file_name)
+        )
 
-        if response.status_code == 404:
+        if df is None:
             if file_name != SHEET_NAME_CUPONS_CSV:
                 st.error(f"Erro 404: Arquivo '{file_name}' não encontrado no repositório '{DATA_REPO_NAME}' na branch '{BRANCH}'. Verifique o nome do arquivo/branch/repo.")
             return None
 
-        response.raise_for_status()
-
-        try:
-            data = response.json()
-        except requests.exceptions.JSONDecodeError:
-            st.error(f"Erro de JSON ao decodificar a resposta da API do GitHub para '{file_name}'.")
-            st.code(response.text[:500])
-            return None
-
-        if "content" not in data:
-            st.error(f"O campo 'content' não foi encontrado na resposta da API. Verifique se o arquivo {file_name} existe na branch '{BRANCH}'.")
-            st.json(data)
-            return None
-
-        content = base64.b64decode(data["content"]).decode("utf-8")
-        csv_data = StringIO(content)
-        df = pd.read_csv(csv_data, sep=",", encoding="utf-8", engine="python", on_bad_lines="warn")
-        df.columns = [col.strip().upper().replace(' ', '_') for col in df.columns]
         return df
 
     except requests.exceptions.HTTPError as e:
         if e.response.status_code != 404:
             st.error(f"Erro HTTP ao acessar '{file_name}' via API ({e.response.status_code}). URL: {api_url}")
         return None
+    except requests.exceptions.JSONDecodeError:
+        st.error(f"Erro de JSON ao decodificar a resposta da API do GitHub para '{file_name}'.")
+        return None
     except Exception as e:
         st.error(f"Erro ao carregar '{file_name}' via API do GitHub: {e}")
         return None
 
-# catalogo_app.py
-
-import pytz
-
-# === FUNÇÃO DE CUPONS ATUALIZADA COM CORREÇÃO DE FUSO HORÁRIO ===
-@st.cache_data(ttl=30)
+# === CUPONS ===
 def carregar_cupons():
-    """Carrega os cupons do 'cupons.csv' do GitHub, validando com fuso horário do Brasil."""
+    """
+    Cupons do 'cupons.csv' compilados pelo motor_cupons (código -> Cupom, com a expiração
+    já calculada no fuso horário do Brasil). A compilação é refeita só quando o arquivo muda.
+    """
     df = get_data_from_github(SHEET_NAME_CUPONS_CSV)
-    
-    colunas_essenciais = ['CODIGO', 'TIPO_DESCONTO', 'VALOR', 'DATA_VALIDADE', 
-                           'VALOR_MINIMO_PEDIDO', 'LIMITE_USOS', 'USOS_ATUAIS', 'STATUS']
-                           
     if df is None or df.empty:
-        return pd.DataFrame(columns=colunas_essenciais)
-
-    df.rename(columns={'CODIGO': 'NOME_CUPOM', 'VALOR': 'VALOR_DESCONTO'}, inplace=True)
-    colunas_essenciais_renomeadas = ['NOME_CUPOM', 'TIPO_DESCONTO', 'VALOR_DESCONTO', 'DATA_VALIDADE', 
-                                    'VALOR_MINIMO_PEDIDO', 'LIMITE_USOS', 'USOS_ATUAIS', 'STATUS']
+        return {}
+    try:
+        return motor_cupons.compilar_cupons(df, df.attrs.get('sha'))
+    except ValueError as e:
+        st.warning(str(e))
+        return {}
 
-    for col in colunas_essenciais_renomeadas:
-        if col not in df.columns:
-            st.warning(f"A planilha de cupons existe, mas a coluna essencial '{col}' não foi encontrada.")
-            return pd.DataFrame(columns=colunas_essenciais_renomeadas)
-
-    df_ativo = df[df['STATUS'].astype(str).str.strip().str.upper() == 'ATIVO'].copy()
-    if df_ativo.empty:
-        return pd.DataFrame(columns=colunas_essenciais_renomeadas)
-
-    df_ativo['NOME_CUPOM'] = df_ativo['NOME_CUPOM'].astype(str).str.strip().str.upper()
-    df_ativo['TIPO_DESCONTO'] = df_ativo['TIPO_DESCONTO'].astype(str).str.strip().str.upper()
-    df_ativo['VALOR_DESCONTO'] = pd.to_numeric(df_ativo['VALOR_DESCONTO'].astype(str).str.replace(',', '.'), errors='coerce')
-    df_ativo['VALOR_MINIMO_PEDIDO'] = pd.to_numeric(df_ativo['VALOR_MINIMO_PEDIDO'].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
-    df_ativo['LIMITE_USOS'] = pd.to_numeric(df_ativo['LIMITE_USOS'], errors='coerce').fillna(999999)
-    df_ativo['USOS_ATUAIS'] = pd.to_numeric(df_ativo['USOS_ATUAIS'], errors='coerce').fillna(0)
-    
-    # --- Validação da DATA_VALIDADE com FUSO HORÁRIO ---
-    # Converte a coluna para datetime (sem fuso horário inicialmente)
-    df_ativo['DATA_VALIDADE'] = pd.to_datetime(df_ativo['DATA_VALIDADE'], errors='coerce')
-    df_ativo = df_ativo.dropna(subset=['DATA_VALIDADE'])
-    
-    # Define o fuso horário de São Paulo
-    tz_brasil = pytz.timezone('America/Sao_Paulo')
-    
-    # "Avisa" para a coluna de datas que ela deve considerar o fuso horário do Brasil
-    df_ativo['DATA_VALIDADE'] = df_ativo['DATA_VALIDADE'].dt.tz_localize(tz_brasil)
-    
-    # Pega a data e hora de agora no Brasil usando PANDAS e normaliza (zera a hora)
-    hoje_brasil = pd.Timestamp.now(tz=tz_brasil).normalize()
-    
-    # Agora a comparação funciona, pois ambas as datas têm fuso horário
-    df_ativo = df_ativo[df_ativo['DATA_VALIDADE'].dt.normalize() >= hoje_brasil]
-    # --- Fim da Validação de Data ---
+def contar_usos_cupons():
+    """Usos de cupons registrados no checkout e ainda não incorporados ao 'cupons.csv' (ver usos_cupons)."""
+    try:
+        return usos_cupons.contar_usos(DATA_REPO_NAME, BRANCH, GITHUB_TOKEN)
+    except Exception as e:
+        st.warning(f"Não foi possível conferir os usos dos cupons: {e}")
+        return {}
 
-    df_ativo = df_ativo[df_ativo['USOS_ATUAIS'] < df_ativo['LIMITE_USOS']]
 
-    return df_ativo.dropna(subset=['NOME_CUPOM', 'VALOR_DESCONTO']).reset_index(drop=True)
+def reservar_uso_cupom(codigo, id_pedido):
+    """Reserva um uso do cupom para o pedido; False se o cupom se esgotou (ou deixou de valer) nesse meio-tempo."""
+    cupom = carregar_cupons().get(motor_cupons.normalizar_codigo(codigo))
+    if cupom is None:
+        return False
+    try:
+        return usos_cupons.reservar_uso(DATA_REPO_NAME, BRANCH, GITHUB_TOKEN, cupom, id_pedido)
+    except Exception as e:
+        st.error(f"Erro ao registrar o uso do cupom: {e}")
+        return False
 # =======================================
 
-@st.cache_data(ttl=5)
 def carregar_promocoes():
     """Carrega as promoções do 'promocoes.csv' do GitHub."""
     df = get_data_from_github(SHEET_NAME_PROMOCOES_CSV)
@@ -177,227 +187,133 @@ def carregar_promocoes():
     df = df[df['STATUS'].astype(str).str.strip().str.upper() == 'ATIVO'].copy()
     df_essencial = df[colunas_essenciais].copy()
 
-    df_essencial['PRECO_PROMOCIONAL'] = pd.to_numeric(df_essencial['PRECO_PROMOCIONAL'].astype(str).str.replace(',', '.'), errors='coerce')
+    df_essencial['PRECO_PROMOCIONAL'] = conversoes.converter_numerico(df_essencial['PRECO_PROMOCIONAL'])
     df_essencial['ID_PRODUTO'] = pd.to_numeric(df_essencial['ID_PRODUTO'], errors='coerce').astype('Int64')
 
     return df_essencial.dropna(subset=['ID_PRODUTO', 'PRECO_PROMOCIONAL']).reset_index(drop=True)
 
 
-@st.cache_data(ttl=2)
+# Planilhas que compõem o catálogo (clientes e cupons só são lidos quando o cliente chega a usá-los)
+ARQUIVOS_CATALOGO = (SHEET_NAME_CATALOGO_CSV, SHEET_NAME_PROMOCOES_CSV, SHEET_NAME_VIDEOS_CSV)
+
+
+def assinatura_catalogo():
+    """
+    SHAs atuais das planilhas que compõem o catálogo, verificadas ao mesmo tempo. As
+    requisições são condicionais (ETag), então a verificação é barata quando nada mudou.
+    None se não foi possível verificar.
+    """
+    verificacoes = github_dados.em_paralelo([
+        lambda nome=nome: github_dados.obter_conteudo(DATA_REPO_NAME, BRANCH, nome, GITHUB_TOKEN)[1]
+        for nome in ARQUIVOS_CATALOGO
+    ])
+    if any(erro is not None for _, erro in verificacoes):
+        return None
+    return tuple(sha for sha, _ in verificacoes)
+
+
+def assinatura_catalogo_em_memoria():
+    """Os mesmos SHAs, das versões já carregadas no processo (sem chamada à API)."""
+    return tuple(github_dados.obter_sha(DATA_REPO_NAME, BRANCH, nome) for nome in ARQUIVOS_CATALOGO)
+
+
 def carregar_catalogo():
     """
     Carrega o catálogo, aplica promoções e vídeos, e prepara o DataFrame.
-    IMPORTANTE: Retorna o DataFrame com 'ID' como índice para buscas rápidas (indexação).
+    IMPORTANTE: Retorna um CatalogoPreparado: o DataFrame com 'ID' como índice para buscas
+    rápidas (indexação) e as estruturas derivadas dele, como o índice da barra de busca.
+    É chamada por catalogo_preparado.catalogo_compartilhado só quando uma planilha muda.
     """
+    # OTIMIZAÇÃO: baixa as planilhas ao mesmo tempo; as leituras abaixo são atendidas da memória
+    github_dados.pre_carregar([(DATA_REPO_NAME, BRANCH, nome) for nome in ARQUIVOS_CATALOGO], GITHUB_TOKEN)
     df_produtos = get_data_from_github(SHEET_NAME_CATALOGO_CSV)
 
     if df_produtos is None or df_produtos.empty:
         st.warning(f"Catálogo indisponível. Verifique o arquivo '{SHEET_NAME_CATALOGO_CSV}' no GitHub.")
-        return pd.DataFrame()
+        return catalogo_preparado.preparar_catalogo(pd.DataFrame())
 
-    if 'ID' in df_produtos.columns:
-        df_produtos['RECENCIA'] = pd.to_numeric(df_produtos['ID'], errors='coerce')
-        df_produtos['ID'] = pd.to_numeric(df_produtos['ID'], errors='coerce').astype('Int64')
-        df_produtos.dropna(subset=['ID'], inplace=True)
-    else:
-        df_produtos['RECENCIA'] = range(len(df_produtos), 0, -1)
-        
-    # --- NOVO: Lidar com PRECOVISTA e PRECOCARTAO ---
-    colunas_minimas = ['PRECOVISTA', 'ID', 'NOME']
-    for col in colunas_minimas:
-        if col not in df_produtos.columns:
-            st.error(f"Coluna essencial '{col}' não encontrada no '{SHEET_NAME_CATALOGO_CSV}'. O aplicativo não pode continuar.")
-            return pd.DataFrame()
-    
-    # Renomeia PRECOVISTA para PRECO
-    mapa_renomeacao = {'PRECOVISTA': 'PRECO', 'MARCA': 'DESCRICAOCURTA'}
-    df_produtos.rename(columns=mapa_renomeacao, inplace=True)
-    
-    # Garante que PRECOCARTAO existe, senão, copia PRECO
-    if 'PRECOCARTAO' not in df_produtos.columns:
-        df_produtos['PRECOCARTAO'] = df_produtos['PRECO']
-    
-    # Converte colunas de preço para numérico
-    df_produtos['PRECO'] = pd.to_numeric(df_produtos['PRECO'].astype(str).str.replace(',', '.'), errors='coerce').fillna(0.0)
-    df_produtos['PRECOCARTAO'] = pd.to_numeric(df_produtos['PRECOCARTAO'].astype(str).str.replace(',', '.'), errors='coerce').fillna(df_produtos['PRECO'])
-    
-    # Adiciona CONDICAOPAGAMENTO (se não existir, calcula a simulação de 3x no cartão)
-    if 'CONDICAOPAGAMENTO' not in df_produtos.columns:
-        def gerar_condicao_pagamento(row):
-            preco_cartao = row['PRECOCARTAO']
-            if preco_cartao > 0:
-                parcela = preco_cartao / 3
-                return f"3x de R$ {parcela:.2f} no cartão"
-            return 'Preço à vista'
-            
-        df_produtos['CONDICAOPAGAMENTO'] = df_produtos.apply(gerar_condicao_pagamento, axis=1)
-    
-    # --- FIM: Lidar com PRECOVISTA e PRECOCARTAO ---
-
-    coluna_foto_encontrada = None
-    nomes_possiveis_foto = ['FOTOURL', 'LINKIMAGEM', 'FOTO_URL', 'IMAGEM', 'URL_FOTO', 'LINK']
-    for nome in nomes_possiveis_foto:
-        if nome in df_produtos.columns:
-            coluna_foto_encontrada = nome
-            break
-            
-    if coluna_foto_encontrada:
-        df_produtos.rename(columns={coluna_foto_encontrada: 'LINKIMAGEM'}, inplace=True, errors='ignore')
-    else:
-        st.warning("Nenhuma coluna de imagem encontrada (Ex: FOTOURL, IMAGEM). Os produtos serão exibidos sem fotos.")
-        df_produtos['LINKIMAGEM'] = ""
-
-    df_produtos.rename(columns={'MARCA': 'DESCRICAOCURTA'}, inplace=True, errors='ignore')
-
-    if 'DISPONIVEL' not in df_produtos.columns:
-        df_produtos['DISPONIVEL'] = 'SIM'
-    if 'DESCRICAOLONGA' not in df_produtos.columns:
-        df_produtos['DESCRICAOLONGA'] = df_produtos.get('CATEGORIA', '')
-
-    df_produtos = df_produtos[df_produtos['DISPONIVEL'].astype(str).str.strip().str.lower() == 'sim'].copy()
-    
-    # Garante que a coluna de percentual de cashback existe e é numérica
-    if 'CASHBACKPERCENT' not in df_produtos.columns:
-        df_produtos['CASHBACKPERCENT'] = 0.0
-    df_produtos['CASHBACKPERCENT'] = pd.to_numeric(df_produtos['CASHBACKPERCENT'], errors='coerce').fillna(0.0)
-    
-    if 'QUANTIDADE' in df_produtos.columns:
-        df_produtos['QUANTIDADE'] = pd.to_numeric(df_produtos['QUANTIDADE'], errors='coerce').fillna(0)
-    else:
-        df_produtos['QUANTIDADE'] = 999999
-    
-    # Define o índice antes do merge, o que é mais limpo, mas precisamos do ID como coluna
-    # para o merge com promoções/vídeos, então vamos resetar e definir novamente.
-
-    df_promocoes = carregar_promocoes()
-
-    if not df_promocoes.empty:
-        # Usa PRECOCARTAO se estiver na promoção e for o menor preço
-        # Por simplicidade e consistência, a promoção aplica-se ao PRECO_FINAL (preço à vista ou promocional)
-        # O PRECOCARTAO é mantido apenas para a exibição da condição de pagamento
-        df_final = pd.merge(df_produtos.reset_index(), df_promocoes[['ID_PRODUTO', 'PRECO_PROMOCIONAL']], left_on='ID', right_on='ID_PRODUTO', how='left')
-        df_final['PRECO_FINAL'] = df_final['PRECO_PROMOCIONAL'].fillna(df_final['PRECO']) # PRECO_FINAL é o preço à vista ou promocional
-        df_final.drop(columns=['ID_PRODUTO'], inplace=True, errors='ignore')
-    else:
-        df_final = df_produtos.reset_index()
-        df_final['PRECO_FINAL'] = df_final['PRECO']
-        df_final['PRECO_PROMOCIONAL'] = None
-
-    df_videos = get_data_from_github(SHEET_NAME_VIDEOS_CSV)
-
-    if df_videos is not None and not df_videos.empty:
-        if 'ID_PRODUTO' in df_videos.columns and 'YOUTUBE_URL' in df_videos.columns:
-            df_videos['ID_PRODUTO'] = pd.to_numeric(df_videos['ID_PRODUTO'], errors='coerce').astype('Int64')
-            df_final = pd.merge(df_final, df_videos[['ID_PRODUTO', 'YOUTUBE_URL']], left_on='ID', right_on='ID_PRODUTO', how='left')
-            df_final.drop(columns=['ID_PRODUTO_y'], inplace=True, errors='ignore')
-            df_final.rename(columns={'ID_PRODUTO_x': 'ID_PRODUTO'}, inplace=True, errors='ignore')
-        else:
-            st.warning("Arquivo 'video.csv' encontrado, mas as colunas 'ID_PRODUTO' ou 'YOUTUBE_URL' estão faltando.")
+    try:
+        df_final, avisos = catalogo_preparado.montar_catalogo(
+            df_produtos, carregar_promocoes(), get_data_from_github(SHEET_NAME_VIDEOS_CSV), SHEET_NAME_CATALOGO_CSV
+        )
+    except ValueError as e:
+        st.error(str(e))
+        return catalogo_preparado.preparar_catalogo(pd.DataFrame())
+    for aviso in avisos:
+        st.warning(aviso)
 
-    if 'CATEGORIA' not in df_final.columns:
-         df_final['CATEGORIA'] = 'Geral'
-         
-    # Garante que o ID é o índice para buscas rápidas.
-    return df_final.set_index('ID')
+    # Monta, uma vez por versão, o índice de busca e as demais estruturas derivadas.
+    return catalogo_preparado.preparar_catalogo(df_final, ESTOQUE_BAIXO_LIMITE)
 
 
-@st.cache_data(ttl=1) 
 def carregar_clientes_cashback():
-    """Carrega os clientes do cashback, limpa o contato e renomeia as colunas para facilitar."""
+    """
+    Carrega os clientes do cashback (com as colunas já renomeadas na leitura). Só é chamada pela
+    busca do checkout (buscar_cliente_cashback), nunca na navegação. O contato, o saldo e o
+    nível são tratados só no registro encontrado, não na planilha inteira.
+    """
+    # As colunas já chegam renomeadas pelo esquema de leitura (ESQUEMAS_CATALOGO)
     df = get_data_from_github(SHEET_NAME_CLIENTES_CASHBACK_CSV)
     
     if df is None or df.empty:
         return pd.DataFrame(columns=['NOME', 'CONTATO', 'CASHBACK_DISPONIVEL', 'NIVEL_ATUAL'])
         
-    df.rename(columns={
-        'CASHBACK_DISPONIVEL': 'CASHBACK_DISPONIVEL',
-        'NIVEL_ATUAL': 'NIVEL_ATUAL', 
-        'TELEFONE': 'CONTATO',
-        'NOME': 'NOME'
-    }, inplace=True)
-    
-    if 'CASHBACK_DISPONÍVEL' in df.columns:
-        df.rename(columns={'CASHBACK_DISPONÍVEL': 'CASHBACK_DISPONIVEL'}, inplace=True)
-
-    if 'TELEFONE' in df.columns:
-        df.rename(columns={'TELEFONE': 'CONTATO'}, inplace=True)
-    elif 'CONTATO' not in df.columns:
-        if 'TELEFONE' in df.columns: df.rename(columns={'TELEFONE': 'CONTATO'}, inplace=True)
-        
     if 'CONTATO' in df.columns:
-        df['CONTATO'] = df['CONTATO'].astype(str).str.replace(r'\D', '', regex=True).str.strip() 
-        df['CASHBACK_DISPONIVEL'] = pd.to_numeric(df['CASHBACK_DISPONIVEL'], errors='coerce').fillna(0.0)
-        df['NIVEL_ATUAL'] = df['NIVEL_ATUAL'].fillna('Prata')
-    
-        return df[['NOME', 'CONTATO', 'CASHBACK_DISPONIVEL', 'NIVEL_ATUAL']].dropna(subset=['CONTATO'])
+        return df
     else:
         st.error("Erro: A coluna 'Telefone' (ou equivalente) do clientes_cash.csv não foi encontrada para a busca.")
         return pd.DataFrame(columns=['NOME', 'CONTATO', 'CASHBACK_DISPONIVEL', 'NIVEL_ATUAL'])
 
 
-DF_CLIENTES_CASH = carregar_clientes_cashback()
-
-
-def buscar_cliente_cashback(numero_contato, df_clientes_cash):
-    """Busca um cliente pelo número de contato (limpo) e retorna saldo e nível."""
-    contato_limpo = str(numero_contato).replace('(', '').replace(')', '').replace('-', '').replace(' ', '').strip()
-    
+@st.cache_data(ttl=30, show_spinner=False)
+def _buscar_cliente_cashback_por_contato(contato_limpo):
+    """Busca de um contato já normalizado; o resultado fica em cache por contato."""
+    df_clientes_cash = carregar_clientes_cashback()
     if df_clientes_cash.empty:
         return False, None, 0.00, 'NENHUM'
-        
-    cliente = df_clientes_cash[df_clientes_cash['CONTATO'] == contato_limpo]
-    
-    if not cliente.empty:
-        saldo = cliente['CASHBACK_DISPONIVEL'].iloc[0]
-        nome = cliente['NOME'].iloc[0]
-        nivel = cliente['NIVEL_ATUAL'].iloc[0] 
-        return True, nome, saldo, nivel
-    else:
-        return False, None, 0.00, 'NENHUM'
-        
-
-# --- Funções do Aplicativo ---
 
-def salvar_pedido(nome_cliente, contato_cliente, valor_total, itens_json, pedido_data):
-    """Salva o novo pedido no 'pedidos.csv' do GitHub usando a Content API."""
-    file_path = SHEET_NAME_PEDIDOS_CSV
-    api_url = f"{GITHUB_BASE_API}{file_path}"
+    cliente = clientes_cashback.buscar_cliente(df_clientes_cash, contato_limpo, df_clientes_cash.attrs.get('sha'))
 
-    novo_cabecalho = 'ID_PEDIDO,DATA_HORA,NOME_CLIENTE,CONTATO_CLIENTE,ITENS_PEDIDO,VALOR_TOTAL,LINKIMAGEM,STATUS,itens_json'
+    if cliente is not None:
+        saldo = pd.to_numeric(cliente.get('CASHBACK_DISPONIVEL'), errors='coerce')
+        nivel = cliente.get('NIVEL_ATUAL')
+        return True, cliente.get('NOME'), 0.0 if pd.isna(saldo) else float(saldo), 'Prata' if pd.isna(nivel) else nivel
+    else:
+        return False, None, 0.00, 'NENHUM'
 
-    headers_get = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.com.v3+json"
-    }
 
-    try:
-        response_get = requests.get(f"{api_url}?ref={BRANCH}", headers=headers_get)
-        response_get.raise_for_status()
+def buscar_cliente_cashback(numero_contato):
+    """
+    Busca um cliente pelo número de contato e retorna saldo e nível. A planilha de clientes
+    só é carregada quando um contato é digitado no checkout, e cada contato consultado fica
+    em cache; a busca usa o índice contato -> cliente montado uma vez por versão do arquivo.
+    """
+    contato_limpo = clientes_cashback.normalizar_contato(numero_contato)
+    if not contato_limpo:
+        return False, None, 0.00, 'NENHUM'
+    return _buscar_cliente_cashback_por_contato(contato_limpo)
+        
 
-        file_data = response_get.json()
-        current_sha = file_data['sha']
-        content_base64 = file_data.get('content', '')
+# --- Funções do Aplicativo ---
 
-        if not content_base64:
-            current_content = novo_cabecalho
-        else:
-            current_content = base64.b64decode(content_base64).decode('utf-8')
+def novo_id_pedido():
+    """
+    ID do pedido: o instante do checkout em segundos seguido de um sufixo aleatório.
+    Só o instante não basta: dois checkouts no mesmo segundo teriam o mesmo ID, e o admin
+    (que junta os segmentos pelo ID_PEDIDO) mostraria apenas um deles.
+    """
+    return f"{int(datetime.now().timestamp())}-{uuid.uuid4().hex[:6]}"
 
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            st.info(f"Arquivo '{file_path}' não encontrado. Criando um novo.")
-            current_sha = None
-            current_content = novo_cabecalho
-        else:
-            st.error(f"Erro HTTP ao obter o SHA do arquivo no GitHub: {e}")
-            return False
-    except Exception as e:
-        st.error(f"Erro na decodificação ou leitura do arquivo 'pedidos.csv'. Detalhe: {e}")
-        return False
 
-    timestamp = int(datetime.now().timestamp())
+def salvar_pedido(nome_cliente, contato_cliente, valor_total, itens_json, pedido_data, id_pedido=None):
+    """
+    Salva o novo pedido no GitHub anexando-o ao segmento diário de pedidos
+    ('pedidos/AAAA-MM-DD.csv'). O arquivo 'pedidos.csv' não é reescrito: o admin
+    junta os segmentos na leitura e os compacta periodicamente.
+    """
     data_hora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    id_pedido = timestamp
+    if id_pedido is None:
+        id_pedido = novo_id_pedido()
     status = "PENDENTE"
     link_imagem = ""
 
@@ -410,33 +326,15 @@ def salvar_pedido(nome_cliente, contato_cliente, valor_total, itens_json, pedido
     escaped_itens_json = itens_json.replace('"', '""')
 
     novo_registro = (
-        f'\n"{id_pedido}","{data_hora}","{nome_cliente}","{contato_cliente}",'
+        f'"{id_pedido}","{data_hora}","{nome_cliente}","{contato_cliente}",'
         f'"{resumo_itens}","{valor_total:.2f}","{link_imagem}","{status}","{escaped_itens_json}"'
     )
 
-    if current_content.strip() and current_content.strip() != novo_cabecalho:
-        new_content = current_content.strip() + novo_registro
-    else:
-        new_content = novo_cabecalho + novo_registro
-
-    encoded_content = base64.b64encode(new_content.encode('utf-8')).decode('utf-8')
-
-    commit_data = {
-        "message": f"PEDIDO: Novo pedido de {nome_cliente} - PENDENTE",
-        "content": encoded_content,
-        "branch": BRANCH
-    }
-    if current_sha:
-        commit_data["sha"] = current_sha
-
-    headers_put = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.com.v3+json"
-    }
-
     try:
-        response_put = requests.put(api_url, headers=headers_put, data=json.dumps(commit_data))
-        response_put.raise_for_status()
+        log_segmentado.anexar_registro(
+            DATA_REPO_NAME, BRANCH, GITHUB_TOKEN, PASTA_SEGMENTOS_PEDIDOS, CABECALHO_PEDIDOS,
+            novo_registro, f"PEDIDO: Novo pedido de {nome_cliente} - PENDENTE"
+        )
         st.session_state.pedido_confirmado = pedido_data
         return True
     except requests.exceptions.HTTPError as e:
@@ -468,13 +366,13 @@ def adicionar_qtd_ao_carrinho(produto_id, produto_row, quantidade):
     produto_preco = produto_row['PRECO_FINAL']
     produto_imagem = produto_row.get('LINKIMAGEM', '')
     
-    # Busca a quantidade máxima do catálogo indexado no session_state
-    df_catalogo = st.session_state.df_catalogo_indexado
+    # Busca a quantidade máxima no catálogo indexado compartilhado
+    df_catalogo = catalogo.df
     
     quantidade_max = int(df_catalogo.loc[produto_id, 'QUANTIDADE'] if produto_id in df_catalogo.index else 999999)
     
     if quantidade_max <= 0:
-         st.warning(f"⚠️ Produto '{produto_nome}' está esgotado.")
+         st.toast(f"Produto '{produto_nome}' está esgotado.", icon="⚠️")
          return
 
     if produto_id in st.session_state.carrinho:
@@ -482,13 +380,13 @@ def adicionar_qtd_ao_carrinho(produto_id, produto_row, quantidade):
         
         if nova_quantidade > quantidade_max:
             disponivel = quantidade_max - st.session_state.carrinho[produto_id]['quantidade']
-            st.warning(f"⚠️ Você só pode adicionar mais {disponivel} unidades. Total disponível: {quantidade_max}.")
+            st.toast(f"Você só pode adicionar mais {disponivel} unidades. Total disponível: {quantidade_max}.", icon="⚠️")
             return
             
         st.session_state.carrinho[produto_id]['quantidade'] = nova_quantidade
     else:
         if quantidade > quantidade_max:
-             st.warning(f"⚠️ Quantidade solicitada ({quantidade}) excede o estoque ({quantidade_max}) para '{produto_nome}'.")
+             st.toast(f"Quantidade solicitada ({quantidade}) excede o estoque ({quantidade_max}) para '{produto_nome}'.", icon="⚠️")
              return
         st.session_state.carrinho[produto_id] = {
             'nome': produto_nome,
@@ -496,7 +394,7 @@ def adicionar_qtd_ao_carrinho(produto_id, produto_row, quantidade):
             'quantidade': quantidade,
             'imagem': produto_imagem
         }
-    st.toast(f"✅ {quantidade}x {produto_nome} adicionado(s)!", icon="🛍️"); time.sleep(0.1)
+    st.toast(f"✅ {quantidade}x {produto_nome} adicionado(s)!", icon="🛍️")
 
 
 def adicionar_ao_carrinho(produto_id, produto_row):
@@ -509,6 +407,33 @@ def remover_do_carrinho(produto_id):
         del st.session_state.carrinho[produto_id]
         st.toast(f"❌ {nome} removido.", icon="🗑️")
 
+def reexecutar_carrinho_e_card(produto_id):
+    """
+    Depois de alterar o carrinho em um callback, reexecuta só o fragmento do carrinho (selo,
+    totais e itens) e o do card do produto, se ele estiver na página; o resto do catálogo
+    não é montado de novo.
+    """
+    fragmentos = [FRAGMENTO_CARRINHO]
+    if produto_id in st.session_state.cards_renderizados:
+        fragmentos.append(f"{PREFIXO_FRAGMENTO_CARD}{produto_id}")
+    st.rerun(fragmentos)
+
+def ao_adicionar(produto_id, produto_row, chave_quantidade):
+    """Callback do botão 'Adicionar' de um card."""
+    adicionar_qtd_ao_carrinho(produto_id, produto_row, st.session_state[chave_quantidade])
+    reexecutar_carrinho_e_card(produto_id)
+
+def ao_remover(produto_id):
+    """Callback do botão 'X' de um item do carrinho."""
+    remover_do_carrinho(produto_id)
+    reexecutar_carrinho_e_card(produto_id)
+
+def ao_mudar_quantidade(produto_id, chave_quantidade):
+    """Callback do seletor de quantidade de um item do carrinho."""
+    if produto_id in st.session_state.carrinho:
+        st.session_state.carrinho[produto_id]['quantidade'] = st.session_state[chave_quantidade]
+    reexecutar_carrinho_e_card(produto_id)
+
 def render_product_image(link_imagem):
     placeholder_html = """<div class="product-image-container" style="background-color: #f0f0f0; border-radius: 8px;"><span style="color: #a0a0a0; font-size: 1.1rem; font-weight: bold;">Sem Imagem</span></div>"""
     if link_imagem and str(link_imagem).strip().startswith('http'):
@@ -516,6 +441,21 @@ def render_product_image(link_imagem):
     else:
         st.markdown(placeholder_html, unsafe_allow_html=True)
 
+def mudar_pagina(nova_pagina):
+    st.session_state.pagina_catalogo = nova_pagina
+
+def render_paginacao(pagina, total_paginas, total_produtos):
+    """Navegação entre as páginas da grade de produtos."""
+    col_anterior, col_info, col_proxima = st.columns([1, 2, 1])
+    col_anterior.button("⬅️ Anterior", key='pagina_anterior', disabled=pagina <= 1,
+                        on_click=mudar_pagina, args=(pagina - 1,), use_container_width=True)
+    col_info.markdown(
+        f"<div style='text-align: center; padding-top: 0.5rem;'>Página {pagina} de {total_paginas} ({total_produtos} produtos)</div>",
+        unsafe_allow_html=True
+    )
+    col_proxima.button("Próxima ➡️", key='pagina_proxima', disabled=pagina >= total_paginas,
+                       on_click=mudar_pagina, args=(pagina + 1,), use_container_width=True)
+
 def limpar_carrinho():
     st.session_state.carrinho = {}
     st.session_state.cupom_aplicado = None
@@ -535,12 +475,10 @@ def render_product_card(prod_id, row, key_prefix, df_catalogo_indexado):
         # Usa a linha de dados que já veio, evitando re-busca
         estoque_atual = int(row.get('QUANTIDADE', 999999)) 
         esgotado = estoque_atual <= 0
-        estoque_baixo = estoque_atual > 0 and estoque_atual <= ESTOQUE_BAIXO_LIMITE
         
-        if esgotado:
-            st.markdown('<span class="esgotado-badge">🚫 ESGOTADO</span>', unsafe_allow_html=True)
-        elif estoque_baixo:
-            st.markdown(f'<span class="estoque-baixo-badge">⚠️ Últimas {estoque_atual} Unidades!</span>', unsafe_allow_html=True)
+        # Selos, preço e especificações já vêm montados por versão do catálogo (catalogo_preparado)
+        if row['HTML_ESTOQUE']:
+            st.markdown(row['HTML_ESTOQUE'], unsafe_allow_html=True)
 
         youtube_url = row.get('YOUTUBE_URL')
 
@@ -553,28 +491,18 @@ def render_product_card(prod_id, row, key_prefix, df_catalogo_indexado):
         else:
             render_product_image(row.get('LINKIMAGEM'))
 
-        preco_final = row['PRECO_FINAL']
-        preco_original = row['PRECO']
-        is_promotion = pd.notna(row.get('PRECO_PROMOCIONAL'))
-
-        if is_promotion:
-            st.markdown(f"""
-            <div style="margin-bottom: 0.5rem;">
-                <span style="background-color: #D32F2F; color: white; font-weight: bold; padding: 3px 8px; border-radius: 5px; font-size: 0.9rem;">
-                    🔥 PROMOÇÃO
-                </span>
-            </div>
-            """, unsafe_allow_html=True)
+        if row['HTML_PROMOCAO']:
+            st.markdown(row['HTML_PROMOCAO'], unsafe_allow_html=True)
 
         st.markdown(f"**{produto_nome}**")
         st.caption(descricao_curta)
 
         with st.expander("Ver detalhes"):
             descricao_principal = row.get('DESCRICAOLONGA')
-            detalhes_str = row.get('DETALHESGRADE')
+            detalhes_md = row['MD_DETALHES']
             
             tem_descricao = descricao_principal and isinstance(descricao_principal, str) and descricao_principal.strip()
-            tem_detalhes = detalhes_str and isinstance(detalhes_str, str) and detalhes_str.strip()
+            tem_detalhes = bool(detalhes_md)
             
             if not tem_descricao and not tem_detalhes:
                 st.info('Sem informações detalhadas disponíveis para este produto.')
@@ -588,104 +516,269 @@ def render_product_card(prod_id, row, key_prefix, df_catalogo_indexado):
                     
                 if tem_detalhes:
                     st.subheader('Especificações')
-                    if detalhes_str.strip().startswith('{'):
-                        try:
-                            detalhes_dict = ast.literal_eval(detalhes_str)
-                            texto_formatado = ""
-                            for chave, valor in detalhes_dict.items():
-                                texto_formatado += f"* **{chave.strip()}**: {str(valor).strip()}\n"
-                            st.markdown(texto_formatado)
-                        except (ValueError, SyntaxError):
-                            st.markdown(detalhes_str)
-                    else:
-                        st.markdown(detalhes_str)
+                    st.markdown(detalhes_md)
 
 
         col_preco, col_botao = st.columns([2, 2])
 
-        # Obtém a condição de pagamento
-        condicao_pagamento = row.get('CONDICAOPAGAMENTO', 'Preço à vista')
-        
         with col_preco:
-            cashback_percent = pd.to_numeric(row.get('CASHBACKPERCENT'), errors='coerce')
-            cashback_html = ""
-
-            if pd.notna(cashback_percent) and cashback_percent > 0:
-                # O cashback é baseado no PRECO_FINAL (preço à vista/promocional)
-                cashback_valor_calculado = (cashback_percent / 100) * preco_final
-                # Agora, garantimos que a string HTML não tenha quebras de linha indesejadas
-                # e colocamos o texto do cashback dentro da tag span corretamente.
-                cashback_html = f"""
-                <span style='color: #2E7D32; font-size: 0.8rem; font-weight: bold; display: block; margin-top: 5px;'>
-                    Cashback: R$ {cashback_valor_calculado:.2f}
-                </span>
-                """
-                
-            # HTML para exibir a condição de pagamento
-            condicao_html = f"""
-            <span style='color: #757575; font-size: 0.85rem; font-weight: normal; margin-top: 5px; display: block;'>
-                ({condicao_pagamento})
-            </span>
-            """
-
-            if is_promotion:
-                st.markdown(f"""
-                <div style="line-height: 1.2;">
-                    <span style='text-decoration: line-through; color: #757575; font-size: 0.9rem;'>R$ {preco_original:.2f}</span>
-                    <h4 style='color: #D32F2F; margin:0;'>R$ {preco_final:.2f}</h4>
-                    {condicao_html}
-                    {cashback_html}
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                # Corrigido para garantir que todo o HTML do preço, condição e cashback seja injetado de uma vez
-                st.markdown(f"""
-                <div style='display: flex; align-items: flex-end; flex-wrap: wrap; gap: 8px;'>
-                    <h4 style='color: #880E4F; margin:0; line-height:1;'>R$ {preco_final:.2f}</h4>
-                </div>
-                {condicao_html}
-                {cashback_html}
-                """, unsafe_allow_html=True)
+            st.markdown(row['HTML_PRECO'], unsafe_allow_html=True)
 
 
         with col_botao:
-            item_ja_no_carrinho = prod_id in st.session_state.carrinho
-
             if esgotado:
                 st.empty() 
-                
-            elif item_ja_no_carrinho:
-                qtd_atual = st.session_state.carrinho[prod_id]['quantidade']
-                st.button(
-                    f"✅ {qtd_atual}x NO PEDIDO", 
-                    key=f'btn_add_qtd_{key_prefix}', 
-                    use_container_width=True, 
-                    disabled=True 
-                )
             else:
-                qtd_a_adicionar = st.number_input(
-                    label=f'Qtd_Input_{key_prefix}',
-                    min_value=1,
-                    max_value=estoque_atual, 
-                    value=1,
-                    step=1,
-                    key=f'qtd_input_{key_prefix}',
-                    label_visibility="collapsed"
+                # Fragmento próprio de cada card: adicionar ao carrinho reexecuta só este controle e o carrinho
+                st.session_state.cards_renderizados.add(prod_id)
+                st.fragment(render_controle_carrinho, key=f"{PREFIXO_FRAGMENTO_CARD}{prod_id}")(prod_id, row, key_prefix, estoque_atual)
+
+def render_controle_carrinho(prod_id, row, key_prefix, estoque_atual):
+    """Quantidade e botão 'Adicionar' do card (ou a quantidade já no pedido)."""
+    if prod_id in st.session_state.carrinho:
+        qtd_atual = st.session_state.carrinho[prod_id]['quantidade']
+        st.button(
+            f"✅ {qtd_atual}x NO PEDIDO", 
+            key=f'btn_add_qtd_{key_prefix}', 
+            use_container_width=True, 
+            disabled=True 
+        )
+    else:
+        qtd_a_adicionar = st.number_input(
+            label=f'Qtd_Input_{key_prefix}',
+            min_value=1,
+            max_value=estoque_atual, 
+            value=1,
+            step=1,
+            key=f'qtd_input_{key_prefix}',
+            label_visibility="collapsed"
+        )
+        
+        # O callback altera o carrinho e reexecuta só os fragmentos afetados
+        st.button(f"🛒 Adicionar {qtd_a_adicionar} un.", key=f'btn_add_qtd_{key_prefix}', use_container_width=True,
+                  on_click=ao_adicionar, args=(prod_id, row, f'qtd_input_{key_prefix}'))
+
+
+@st.fragment(key=FRAGMENTO_CARRINHO)
+def render_carrinho():
+    """
+    Selo e popover do carrinho. Como fragmento, alterar quantidades, remover itens ou aplicar
+    um cupom reexecuta só o carrinho (e o card afetado), sem montar de novo o catálogo.
+    """
+    total_acumulado = sum(item['preco'] * item['quantidade'] for item in st.session_state.carrinho.values())
+    num_itens = sum(item['quantidade'] for item in st.session_state.carrinho.values())
+    carrinho_vazio = not st.session_state.carrinho
+
+    # Catálogo indexado compartilhado (estoque e cashback dos itens)
+    df_catalogo_completo = catalogo.df
+    cashback_a_ganhar = calcular_cashback_total(st.session_state.carrinho, df_catalogo_completo)
+
+    custom_cart_button = f"""
+        <div class='cart-badge-button' onclick='document.querySelector("[data-testid=\\"stPopover\\"] > div:first-child > button").click();'>
+            🛒 SEU PEDIDO
+            <span class='cart-count'>{num_itens}</span>
+        </div>
+    """
+    st.markdown(custom_cart_button, unsafe_allow_html=True)
+    with st.popover(" ", use_container_width=False, help="Clique para ver os itens e finalizar o pedido"):
+        st.header("🛒 Detalhes do Pedido")
+        if carrinho_vazio:
+            st.info("Seu carrinho está vazio.")
+        else:
+            desconto_cupom = st.session_state.get('desconto_cupom', 0.0)
+            total_com_desconto = total_acumulado - desconto_cupom
+
+            if total_com_desconto < 0:
+                total_com_desconto = 0
+
+            st.markdown(f"Subtotal: `R$ {total_acumulado:.2f}`")
+            if desconto_cupom > 0:
+                st.markdown(f"Desconto (`{st.session_state.cupom_aplicado}`): <span style='color: #D32F2F;'>- R$ {desconto_cupom:.2f}</span>", unsafe_allow_html=True)
+            
+            # NOVO: Exibição do cashback
+            st.markdown(f"<span style='color: #2E7D32; font-weight: bold;'>Cashback a Ganhar: R$ {cashback_a_ganhar:.2f}</span>", unsafe_allow_html=True)
+            
+            st.markdown(f"<h3 style='color: #E91E63; margin-top: 0;'>Total: R$ {total_com_desconto:.2f}</h3>", unsafe_allow_html=True)
+            st.markdown("---")
+            
+            col_h1, col_h2, col_h3, col_h4 = st.columns([3, 1.5, 2.5, 1])
+            col_h2.markdown("**Qtd**")
+            col_h3.markdown("**Subtotal**")
+            col_h4.markdown("")
+            st.markdown('<div style="margin-top: -10px; border-top: 1px solid #ccc;"></div>', unsafe_allow_html=True)
+            
+            # === EXIBIÇÃO DO SUBTOTAL DO ITEM ===
+            for prod_id, item in list(st.session_state.carrinho.items()):
+                c1, c2, c3, c4 = st.columns([3, 1.5, 2.5, 1])
+                c1.write(f"*{item['nome']}*")
+                
+                # Busca rápida de estoque
+                if prod_id in df_catalogo_completo.index:
+                    max_qtd = df_catalogo_completo.loc[prod_id, 'QUANTIDADE']
+                    if isinstance(max_qtd, pd.Series):
+                         max_qtd = max_qtd.iloc[0]
+                else:
+                    max_qtd = 999999
+                max_qtd = int(max_qtd)
+                
+                if item['quantidade'] > max_qtd:
+                    st.session_state.carrinho[prod_id]['quantidade'] = max_qtd
+                    item['quantidade'] = max_qtd
+                    st.session_state.pop(f'qtd_{prod_id}_popover', None)
+                    st.toast(f"Ajustado: {item['nome']} ao estoque máximo de {max_qtd}.", icon="⚠️")
+                    
+                # O callback atualiza o carrinho antes de o fragmento ser reexecutado (totais já corretos)
+                c2.number_input(
+                    label=f'Qtd_{prod_id}', min_value=1, max_value=max_qtd,
+                    value=item['quantidade'], step=1, key=f'qtd_{prod_id}_popover',
+                    label_visibility="collapsed", on_change=ao_mudar_quantidade, args=(prod_id, f'qtd_{prod_id}_popover')
                 )
+
+                subtotal_item = item['preco'] * item['quantidade']
+                preco_unitario = item['preco']
+                html_preco = f"""
+                <div style="text-align: left; white-space: nowrap;">
+                    <strong>R$ {subtotal_item:.2f}</strong>
+                    <br>
+                    <span style='font-size: 0.8rem; color: #757575;'>(R$ {preco_unitario:.2f} un.)</span>
+                </div>
+                """
+                c3.markdown(html_preco, unsafe_allow_html=True)
                 
-                # Botão de adicionar chama a função otimizada
-                if st.button(f"🛒 Adicionar {qtd_a_adicionar} un.", key=f'btn_add_qtd_{key_prefix}', use_container_width=True):
-                    if qtd_a_adicionar >= 1:
-                        adicionar_qtd_ao_carrinho(prod_id, row, qtd_a_adicionar)
-                        st.rerun()
+                c4.button("X", key=f'rem_{prod_id}_popover', on_click=ao_remover, args=(prod_id,))
+            st.markdown("---")
+            
+            # === LÓGICA DO CUPOM DE DESCONTO ===
+            st.subheader("🎟️ Cupom de Desconto")
+            
+            cupom_col1, cupom_col2 = st.columns([3, 1])
+            
+            with cupom_col1:
+                codigo_cupom_input = st.text_input("Código do Cupom", key="cupom_input", label_visibility="collapsed").upper()
+            
+            with cupom_col2:
+                if st.button("Aplicar", key="aplicar_cupom_btn", use_container_width=True):
+                    # OTIMIZAÇÃO: Os cupons vêm compilados (código -> Cupom); validar é uma consulta ao dicionário.
+                    if codigo_cupom_input:
+                        validacao = motor_cupons.validar_e_precificar(
+                            carregar_cupons(), codigo_cupom_input, total_acumulado, usos_registrados=contar_usos_cupons()
+                        )
+
+                        if validacao.valido:
+                            st.session_state.cupom_aplicado = validacao.cupom.codigo
+                            st.session_state.desconto_cupom = validacao.desconto
+                            st.session_state.cupom_mensagem = f"✅ Cupom '{codigo_cupom_input}' aplicado!"
+                        elif validacao.motivo == motor_cupons.VALOR_MINIMO:
+                            st.session_state.cupom_aplicado = None
+                            st.session_state.desconto_cupom = 0.0
+                            st.session_state.cupom_mensagem = f"❌ O valor mínimo para este cupom é de R$ {validacao.cupom.valor_minimo:.2f}."
+                        else:
+                            st.session_state.cupom_aplicado = None
+                            st.session_state.desconto_cupom = 0.0
+                            st.session_state.cupom_mensagem = "❌ Cupom inválido, expirado ou esgotado."
+                    else:
+                        st.session_state.cupom_mensagem = "⚠️ Digite um código de cupom."
+                    # O cupom só muda os totais do carrinho
+                    st.rerun(scope="fragment")
+
+            if st.session_state.cupom_mensagem:
+                if "✅" in st.session_state.cupom_mensagem:
+                    st.success(st.session_state.cupom_mensagem)
+                else:
+                    st.error(st.session_state.cupom_mensagem)
+
+            st.markdown("---")
+            
+            st.button("🗑️ Limpar Pedido", on_click=limpar_carrinho, use_container_width=True)
+            st.markdown("---")
+            
+            # ... O resto do código (Finalizar Pedido) continua o mesmo ...
+            st.subheader("Finalizar Pedido")
+
+            nome_input = st.text_input("Seu Nome Completo:", key='checkout_nome_dynamic')
+            contato_input = st.text_input("Seu Contato (WhatsApp - apenas números, com DDD):", key='checkout_contato_dynamic')
+            
+            nivel_cliente = 'N/A'
+            saldo_cashback = 0.00
+            
+            if nome_input and contato_input:
+                existe, nome_encontrado, saldo_cashback, nivel_cliente = buscar_cliente_cashback(contato_input)
+
+                if existe:
+                    st.success(
+                        f"🎉 **Bem-vindo(a) de volta, {nome_encontrado}!** Seu Nível é: **{nivel_cliente.upper()}**."
+                        f"\n\nSeu saldo atual de Cashback é de **R$ {saldo_cashback:.2f}**."
+                    )
+                elif contato_input.strip():
+                    st.info("👋 **Novo Cliente!** Você começará a acumular cashback após a finalização do seu primeiro pedido no painel de administração.")
+
+            with st.form("form_finalizar_pedido", clear_on_submit=True):
+                st.text_input("Nome (Preenchido)", value=nome_input, disabled=True, label_visibility="collapsed")
+                st.text_input("Contato (Preenchido)", value=contato_input, disabled=True, label_visibility="collapsed")
+
+                if st.form_submit_button("✅ Enviar Pedido", type="primary", use_container_width=True):
+                    if nome_input and contato_input:
+                        
+                        contato_limpo = clientes_cashback.normalizar_contato(contato_input)
+                        
+                        detalhes = {
+                            "subtotal": total_acumulado,
+                            "desconto_cupom": st.session_state.desconto_cupom,
+                            "cupom_aplicado": st.session_state.cupom_aplicado,
+                            "total": total_com_desconto,
+                            "itens": [
+                                {
+                                    "id": int(k),
+                                    "nome": v['nome'],
+                                    "preco": v['preco'],
+                                    "quantidade": v['quantidade'],
+                                    "imagem": v.get('imagem', '')
+                                } for k, v in st.session_state.carrinho.items()
+                            ],
+                            "nome": nome_input,
+                            "contato": contato_limpo,
+                            "cliente_nivel_atual": nivel_cliente, 
+                            "cliente_saldo_cashback": saldo_cashback,
+                            "cashback_a_ganhar": cashback_a_ganhar, # Adiciona o cashback total aos detalhes
+                        }
+                        
+                        # O ID (único por checkout) também identifica a reserva do cupom em usos_cupons
+                        id_pedido = novo_id_pedido()
+                        cupom_aplicado = st.session_state.cupom_aplicado
+
+                        # O uso do cupom é reservado antes do pedido: com vários checkouts ao mesmo tempo, só os
+                        # primeiros dentro do LIMITE_USOS levam o desconto
+                        if cupom_aplicado and not reservar_uso_cupom(cupom_aplicado, id_pedido):
+                            st.session_state.cupom_aplicado = None
+                            st.session_state.desconto_cupom = 0.0
+                            st.session_state.cupom_mensagem = "❌ Cupom inválido, expirado ou esgotado."
+                            st.rerun()
+                        elif salvar_pedido(nome_input, contato_limpo, total_com_desconto, json.dumps(detalhes, ensure_ascii=False), detalhes, id_pedido):
+                            st.session_state.carrinho = {}
+                            st.session_state.cupom_aplicado = None
+                            st.session_state.desconto_cupom = 0.0
+                            st.session_state.cupom_mensagem = ""
+                            st.rerun()
+                        elif cupom_aplicado:
+                            # O pedido não foi salvo: libera o uso reservado do cupom
+                            try:
+                                usos_cupons.estornar_uso(DATA_REPO_NAME, BRANCH, GITHUB_TOKEN, cupom_aplicado, id_pedido)
+                            except Exception:
+                                pass
+                    else:
+                        st.warning("Preencha seu nome e contato.")
 
 
 # --- Layout do Aplicativo (INÍCIO DO SCRIPT PRINCIPAL) ---
 st.set_page_config(page_title="Catálogo Doce&Bella", layout="wide", initial_sidebar_state="collapsed")
 
-# 1. OTIMIZAÇÃO: Carrega o catálogo indexado na session_state APENAS se não estiver lá
-if st.session_state.df_catalogo_indexado is None:
-    st.session_state.df_catalogo_indexado = carregar_catalogo()
+# 1. OTIMIZAÇÃO: Usa o instantâneo compartilhado do catálogo. A cada rerun só se verifica (no máximo a
+# cada poucos segundos) se as planilhas mudaram, para que estoque e preços fiquem sempre atualizados.
+# O intervalo entre verificações aumenta quando a cota da API está baixa.
+st.session_state.versao_catalogo, catalogo = catalogo_preparado.catalogo_compartilhado(
+    assinatura_catalogo, carregar_catalogo, assinatura_catalogo_em_memoria,
+    cliente_github.ttl_adaptativo(catalogo_preparado.INTERVALO_VERIFICACAO)
+)
 
 
 # --- CSS ---
@@ -845,14 +938,6 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-total_acumulado = sum(item['preco'] * item['quantidade'] for item in st.session_state.carrinho.values())
-num_itens = sum(item['quantidade'] for item in st.session_state.carrinho.values())
-carrinho_vazio = not st.session_state.carrinho
-
-# NOVO: Cálculo do cashback total no carrinho
-df_catalogo_completo = st.session_state.df_catalogo_indexado 
-cashback_a_ganhar = calcular_cashback_total(st.session_state.carrinho, df_catalogo_completo)
-
 st.markdown("<div class='pink-bar-container'><div class='pink-bar-content'>", unsafe_allow_html=True)
 
 col_pesquisa, col_carrinho = st.columns([5, 1])
@@ -860,215 +945,17 @@ with col_pesquisa:
     st.text_input("Buscar...", key='termo_pesquisa_barra', label_visibility="collapsed", placeholder="Buscar produtos...")
 
 with col_carrinho:
-    custom_cart_button = f"""
-        <div class='cart-badge-button' onclick='document.querySelector("[data-testid=\\"stPopover\\"] > div:first-child > button").click();'>
-            🛒 SEU PEDIDO
-            <span class='cart-count'>{num_itens}</span>
-        </div>
-    """
-    st.markdown(custom_cart_button, unsafe_allow_html=True)
-    with st.popover(" ", use_container_width=False, help="Clique para ver os itens e finalizar o pedido"):
-        st.header("🛒 Detalhes do Pedido")
-        if carrinho_vazio:
-            st.info("Seu carrinho está vazio.")
-        else:
-            desconto_cupom = st.session_state.get('desconto_cupom', 0.0)
-            total_com_desconto = total_acumulado - desconto_cupom
-
-            if total_com_desconto < 0:
-                total_com_desconto = 0
-
-            st.markdown(f"Subtotal: `R$ {total_acumulado:.2f}`")
-            if desconto_cupom > 0:
-                st.markdown(f"Desconto (`{st.session_state.cupom_aplicado}`): <span style='color: #D32F2F;'>- R$ {desconto_cupom:.2f}</span>", unsafe_allow_html=True)
-            
-            # NOVO: Exibição do cashback
-            st.markdown(f"<span style='color: #2E7D32; font-weight: bold;'>Cashback a Ganhar: R$ {cashback_a_ganhar:.2f}</span>", unsafe_allow_html=True)
-            
-            st.markdown(f"<h3 style='color: #E91E63; margin-top: 0;'>Total: R$ {total_com_desconto:.2f}</h3>", unsafe_allow_html=True)
-            st.markdown("---")
-            
-            col_h1, col_h2, col_h3, col_h4 = st.columns([3, 1.5, 2.5, 1])
-            col_h2.markdown("**Qtd**")
-            col_h3.markdown("**Subtotal**")
-            col_h4.markdown("")
-            st.markdown('<div style="margin-top: -10px; border-top: 1px solid #ccc;"></div>', unsafe_allow_html=True)
-            
-            # Reutiliza o catálogo indexado do session_state
-            df_catalogo_completo = st.session_state.df_catalogo_indexado 
-            
-            # === EXIBIÇÃO DO SUBTOTAL DO ITEM ===
-            for prod_id, item in list(st.session_state.carrinho.items()):
-                c1, c2, c3, c4 = st.columns([3, 1.5, 2.5, 1])
-                c1.write(f"*{item['nome']}*")
-                
-                # Busca rápida de estoque
-                if prod_id in df_catalogo_completo.index:
-                    max_qtd = df_catalogo_completo.loc[prod_id, 'QUANTIDADE']
-                    if isinstance(max_qtd, pd.Series):
-                         max_qtd = max_qtd.iloc[0]
-                else:
-                    max_qtd = 999999
-                max_qtd = int(max_qtd)
-                
-                if item['quantidade'] > max_qtd:
-                    st.session_state.carrinho[prod_id]['quantidade'] = max_qtd
-                    item['quantidade'] = max_qtd
-                    st.toast(f"Ajustado: {item['nome']} ao estoque máximo de {max_qtd}.", icon="⚠️")
-                    st.rerun()
-                    
-                nova_quantidade = c2.number_input(
-                    label=f'Qtd_{prod_id}', min_value=1, max_value=max_qtd,
-                    value=item['quantidade'], step=1, key=f'qtd_{prod_id}_popover',
-                    label_visibility="collapsed"
-                )
-                
-                if nova_quantidade != item['quantidade']:
-                    st.session_state.carrinho[prod_id]['quantidade'] = nova_quantidade
-                    st.rerun()
-
-                subtotal_item = item['preco'] * item['quantidade']
-                preco_unitario = item['preco']
-                html_preco = f"""
-                <div style="text-align: left; white-space: nowrap;">
-                    <strong>R$ {subtotal_item:.2f}</strong>
-                    <br>
-                    <span style='font-size: 0.8rem; color: #757575;'>(R$ {preco_unitario:.2f} un.)</span>
-                </div>
-                """
-                c3.markdown(html_preco, unsafe_allow_html=True)
-                
-                if c4.button("X", key=f'rem_{prod_id}_popover'):
-                    remover_do_carrinho(prod_id)
-                    st.rerun()
-            st.markdown("---")
-            
-            # === LÓGICA DO CUPOM DE DESCONTO ===
-            st.subheader("🎟️ Cupom de Desconto")
-            
-            cupom_col1, cupom_col2 = st.columns([3, 1])
-            
-            with cupom_col1:
-                codigo_cupom_input = st.text_input("Código do Cupom", key="cupom_input", label_visibility="collapsed").upper()
-            
-            with cupom_col2:
-                if st.button("Aplicar", key="aplicar_cupom_btn", use_container_width=True):
-                    # OTIMIZAÇÃO: A função carregar_cupons() é cacheada (ttl=30), o que ajuda na performance aqui.
-                    if codigo_cupom_input:
-                        df_cupons_validos = carregar_cupons()
-                        cupom_encontrado = df_cupons_validos[df_cupons_validos['NOME_CUPOM'] == codigo_cupom_input]
-                        
-                        if not cupom_encontrado.empty:
-                            cupom_info = cupom_encontrado.iloc[0]
-                            valor_minimo = cupom_info['VALOR_MINIMO_PEDIDO']
-
-                            if float(total_acumulado) >= float(valor_minimo):
-                                tipo = cupom_info['TIPO_DESCONTO']
-                                valor = cupom_info['VALOR_DESCONTO']
-                                
-                                desconto = 0.0
-                                if tipo == 'PERCENTUAL':
-                                    desconto = (valor / 100) * total_acumulado
-                                elif tipo == 'FIXO':
-                                    desconto = valor
-                                
-                                st.session_state.cupom_aplicado = codigo_cupom_input
-                                st.session_state.desconto_cupom = desconto
-                                st.session_state.cupom_mensagem = f"✅ Cupom '{codigo_cupom_input}' aplicado!"
-                            else:
-                                st.session_state.cupom_aplicado = None
-                                st.session_state.desconto_cupom = 0.0
-                                st.session_state.cupom_mensagem = f"❌ O valor mínimo para este cupom é de R$ {valor_minimo:.2f}."
-                        else:
-                            st.session_state.cupom_aplicado = None
-                            st.session_state.desconto_cupom = 0.0
-                            st.session_state.cupom_mensagem = "❌ Cupom inválido, expirado ou esgotado."
-                    else:
-                        st.session_state.cupom_mensagem = "⚠️ Digite um código de cupom."
-                    st.rerun()
-
-            if st.session_state.cupom_mensagem:
-                if "✅" in st.session_state.cupom_mensagem:
-                    st.success(st.session_state.cupom_mensagem)
-                else:
-                    st.error(st.session_state.cupom_mensagem)
-
-            st.markdown("---")
-            
-            st.button("🗑️ Limpar Pedido", on_click=limpar_carrinho, use_container_width=True)
-            st.markdown("---")
-            
-            # ... O resto do código (Finalizar Pedido) continua o mesmo ...
-            st.subheader("Finalizar Pedido")
-
-            nome_input = st.text_input("Seu Nome Completo:", key='checkout_nome_dynamic')
-            contato_input = st.text_input("Seu Contato (WhatsApp - apenas números, com DDD):", key='checkout_contato_dynamic')
-            
-            nivel_cliente = 'N/A'
-            saldo_cashback = 0.00
-            
-            if nome_input and contato_input and DF_CLIENTES_CASH is not None and not DF_CLIENTES_CASH.empty:
-                existe, nome_encontrado, saldo_cashback, nivel_cliente = buscar_cliente_cashback(contato_input, DF_CLIENTES_CASH)
-
-                if existe:
-                    st.success(
-                        f"🎉 **Bem-vindo(a) de volta, {nome_encontrado}!** Seu Nível é: **{nivel_cliente.upper()}**."
-                        f"\n\nSeu saldo atual de Cashback é de **R$ {saldo_cashback:.2f}**."
-                    )
-                elif contato_input.strip():
-                    st.info("👋 **Novo Cliente!** Você começará a acumular cashback após a finalização do seu primeiro pedido no painel de administração.")
-
-            with st.form("form_finalizar_pedido", clear_on_submit=True):
-                st.text_input("Nome (Preenchido)", value=nome_input, disabled=True, label_visibility="collapsed")
-                st.text_input("Contato (Preenchido)", value=contato_input, disabled=True, label_visibility="collapsed")
-
-                if st.form_submit_button("✅ Enviar Pedido", type="primary", use_container_width=True):
-                    if nome_input and contato_input:
-                        
-                        contato_limpo = contato_input.replace('(', '').replace(')', '').replace('-', '').replace(' ', '').strip()
-                        
-                        detalhes = {
-                            "subtotal": total_acumulado,
-                            "desconto_cupom": st.session_state.desconto_cupom,
-                            "cupom_aplicado": st.session_state.cupom_aplicado,
-                            "total": total_com_desconto,
-                            "itens": [
-                                {
-                                    "id": int(k),
-                                    "nome": v['nome'],
-                                    "preco": v['preco'],
-                                    "quantidade": v['quantidade'],
-                                    "imagem": v.get('imagem', '')
-                                } for k, v in st.session_state.carrinho.items()
-                            ],
-                            "nome": nome_input,
-                            "contato": contato_limpo,
-                            "cliente_nivel_atual": nivel_cliente, 
-                            "cliente_saldo_cashback": saldo_cashback,
-                            "cashback_a_ganhar": cashback_a_ganhar, # Adiciona o cashback total aos detalhes
-                        }
-                        
-                        if salvar_pedido(nome_input, contato_limpo, total_com_desconto, json.dumps(detalhes, ensure_ascii=False), detalhes):
-                            st.session_state.carrinho = {}
-                            st.session_state.cupom_aplicado = None
-                            st.session_state.desconto_cupom = 0.0
-                            st.session_state.cupom_mensagem = ""
-                            st.rerun()
-                    else:
-                        st.warning("Preencha seu nome e contato.")
+    render_carrinho()
 
 st.markdown("</div></div>", unsafe_allow_html=True)
 
-# 2. OTIMIZAÇÃO: Usa o catálogo em cache no session_state e reseta o índice (cria uma cópia) para filtros/ordenação
-df_catalogo = st.session_state.df_catalogo_indexado.reset_index()
+# 2. OTIMIZAÇÃO: Categorias, ordenações e partições já vêm pré-calculadas no catálogo compartilhado
 
-if 'CATEGORIA' in df_catalogo.columns:
-    categorias = df_catalogo['CATEGORIA'].dropna().astype(str).unique().tolist()
-    categorias.sort()
-    categorias.insert(0, "TODAS AS CATEGORIAS")
+if 'CATEGORIA' in catalogo.df.columns:
+    categorias = ["TODAS AS CATEGORIAS"] + catalogo.categorias
 else:
     categorias = ["TODAS AS CATEGORIAS"]
-    if "Geral" not in df_catalogo.columns:
+    if "Geral" not in catalogo.df.columns:
          st.warning("A coluna 'CATEGORIA' não foi encontrada no seu arquivo de catálogo. O filtro não será exibido.")
 
 col_filtro_cat, col_select_ordem, _ = st.columns([1, 1, 3])
@@ -1084,17 +971,22 @@ with col_filtro_cat:
     if termo:
         st.markdown(f'<div style="font-size: 0.8rem; color: #E91E63;">Busca ativa desabilita filtro.</div>', unsafe_allow_html=True)
 
-df_filtrado = df_catalogo.copy()
+opcoes_ordem = list(catalogo_preparado.ORDENACOES)
+ordem_selecionada = st.session_state.get('ordem_produtos', opcoes_ordem[0])
 
-if not termo and categoria_selecionada != "TODAS AS CATEGORIAS":
-    df_filtrado = df_filtrado[df_filtrado['CATEGORIA'].astype(str) == categoria_selecionada]
-elif termo:
-    df_filtrado = df_filtrado[df_filtrado.apply(
-        lambda row: termo in str(row['NOME']).lower() or termo in str(row['DESCRICAOLONGA']).lower(), 
-        axis=1
-    )]
+# Filtro + ordenação como operações sobre posições (sem copiar nem reordenar o DataFrame)
+if termo:
+    # Busca pelo índice pré-construído (sem acentos, todos os termos, nome pesa mais que descrição)
+    posicoes = catalogo_preparado.posicoes_exibidas(
+        catalogo, ordem_selecionada, resultados_busca=busca_catalogo.buscar(catalogo.indice_busca, termo)
+    )
+elif categoria_selecionada != "TODAS AS CATEGORIAS":
+    posicoes = catalogo_preparado.posicoes_exibidas(catalogo, ordem_selecionada, categoria=categoria_selecionada)
+else:
+    posicoes = catalogo_preparado.posicoes_exibidas(catalogo, ordem_selecionada)
 
-if df_filtrado.empty:
+st.session_state.cards_renderizados = set()
+if len(posicoes) == 0:
     if termo:
         st.info(f"Nenhum produto encontrado com o termo '{termo}' na categoria '{categoria_selecionada}'.")
     else:
@@ -1103,37 +995,35 @@ else:
     st.subheader("✨ Nossos Produtos")
 
     with col_select_ordem:
-        opcoes_ordem = ['Lançamento', 'Promoção', 'Menor Preço', 'Maior Preço', 'Nome do Produto (A-Z)']
-        ordem_selecionada = st.selectbox(
+        st.selectbox(
             "Ordenar por:",
             opcoes_ordem,
             key='ordem_produtos'
         )
 
-    df_filtrado['EM_PROMOCAO'] = df_filtrado['PRECO_PROMOCIONAL'].notna()
-
-    if ordem_selecionada == 'Lançamento':
-        df_ordenado = df_filtrado.sort_values(by=['RECENCIA', 'EM_PROMOCAO'], ascending=[False, False])
-    elif ordem_selecionada == 'Promoção':
-        df_ordenado = df_filtrado.sort_values(by=['EM_PROMOCAO', 'RECENCIA'], ascending=[False, False])
-    elif ordem_selecionada == 'Menor Preço':
-        df_ordenado = df_filtrado.sort_values(by=['EM_PROMOCAO', 'PRECO_FINAL'], ascending=[False, True])
-    elif ordem_selecionada == 'Maior Preço':
-        df_ordenado = df_filtrado.sort_values(by=['EM_PROMOCAO', 'PRECO_FINAL'], ascending=[False, False])
-    elif ordem_selecionada == 'Nome do Produto (A-Z)':
-        df_ordenado = df_filtrado.sort_values(by=['EM_PROMOCAO', 'NOME'], ascending=[False, True])
-    else:
-        df_ordenado = df_filtrado
+    # Paginação: só os produtos da página atual viram widgets. Mudou o filtro/busca/ordem, volta à 1ª página.
+    filtro_atual = (termo, categoria_selecionada, ordem_selecionada, catalogo.df.shape)
+    if st.session_state.filtro_grade != filtro_atual:
+        st.session_state.filtro_grade = filtro_atual
+        st.session_state.pagina_catalogo = 1
+
+    total_paginas = max(1, -(-len(posicoes) // PRODUTOS_POR_PAGINA))
+    pagina = min(st.session_state.pagina_catalogo, total_paginas)
+    inicio = (pagina - 1) * PRODUTOS_POR_PAGINA
 
-    df_filtrado = df_ordenado
+    df_filtrado = catalogo.df.iloc[posicoes[inicio:inicio + PRODUTOS_POR_PAGINA]].reset_index()
 
     cols = st.columns(4)
-    for i, row in df_filtrado.reset_index(drop=True).iterrows():
+    for i, row in df_filtrado.iterrows():
         product_id = row['ID']
-        unique_key = f'prod_{product_id}_{i}'
+        # A posição na lista completa (e não na página) mantém as chaves únicas e estáveis entre páginas
+        unique_key = f'prod_{product_id}_{inicio + i}'
         with cols[i % 4]:
             # 3. OTIMIZAÇÃO: Passa o DF indexado para a função de renderização
-            render_product_card(product_id, row, key_prefix=unique_key, df_catalogo_indexado=st.session_state.df_catalogo_indexado)
+            render_product_card(product_id, row, key_prefix=unique_key, df_catalogo_indexado=catalogo.df)
+
+    if total_paginas > 1:
+        render_paginacao(pagina, total_paginas, len(posicoes))
 
 
 # --- ADICIONA O BOTÃO FLUTUANTE NO FINAL DO SCRIPT ---
@@ -0,0 +1,336 @@
+# catalogo_preparado.py
+"""
+Catálogo pronto para exibição: o DataFrame indexado por ID e as estruturas
+derivadas dele, calculadas uma única vez por versão do catálogo (em
+'carregar_catalogo') em vez de a cada rerun do script.
+
+O catálogo montado é um instantâneo único do processo, compartilhado por todas
+as sessões: cada sessão guarda apenas o número da versão que está exibindo.
+"""
+import ast
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import busca_catalogo
+import conversoes
+
+# Opções de ordenação da grade: (colunas, ascendente) de cada uma
+ORDENACOES = {
+    'Lançamento': (['RECENCIA', 'EM_PROMOCAO'], [False, False]),
+    'Promoção': (['EM_PROMOCAO', 'RECENCIA'], [False, False]),
+    'Menor Preço': (['EM_PROMOCAO', 'PRECO_FINAL'], [False, True]),
+    'Maior Preço': (['EM_PROMOCAO', 'PRECO_FINAL'], [False, False]),
+    'Nome do Produto (A-Z)': (['EM_PROMOCAO', 'NOME'], [False, True]),
+}
+
+
+# Intervalo mínimo (segundos) entre duas verificações de versão das planilhas de origem
+INTERVALO_VERIFICACAO = 2
+
+# Instantâneo do catálogo compartilhado pelas sessões do processo
+# ('atual' é a tupla (versão, catalogo), trocada de uma só vez para que uma leitura nunca misture versões)
+_INSTANTANEO = {"atual": None, "assinatura": None, "verificado_em": 0.0}
+_TRAVA_INSTANTANEO = threading.Lock()
+
+# Nomes aceitos para a coluna de foto, em ordem de preferência (a primeira encontrada vira LINKIMAGEM)
+NOMES_COLUNA_FOTO = ['FOTOURL', 'LINKIMAGEM', 'FOTO_URL', 'IMAGEM', 'URL_FOTO', 'LINK']
+
+
+# Fragmentos fixos dos cards
+HTML_ESGOTADO = '<span class="esgotado-badge">🚫 ESGOTADO</span>'
+HTML_BADGE_PROMOCAO = (
+    '<div style="margin-bottom: 0.5rem;"><span style="background-color: #D32F2F; color: white; font-weight: bold; '
+    'padding: 3px 8px; border-radius: 5px; font-size: 0.9rem;">🔥 PROMOÇÃO</span></div>'
+)
+
+
+@dataclass(frozen=True)
+class CatalogoPreparado:
+    df: pd.DataFrame  # Catálogo com 'ID' como índice
+    indice_busca: dict  # Ver busca_catalogo.construir_indice (posições de linha de 'df')
+    ordens: dict  # Opção de ORDENACOES -> posições de linha de 'df' já ordenadas
+    particoes_categoria: dict  # CATEGORIA -> posições de linha de 'df' (ordem crescente)
+    categorias: list  # Categorias em ordem alfabética
+
+
+def calcular_ordens(df):
+    """Para cada opção de ORDENACOES, as posições das linhas de 'df' na ordem de exibição."""
+    if df.empty:
+        return {nome: np.array([], dtype=np.int64) for nome in ORDENACOES}
+    df_posicional = df.reset_index(drop=True)
+    return {
+        nome: df_posicional.sort_values(by=colunas, ascending=ascendente).index.to_numpy()
+        for nome, (colunas, ascendente) in ORDENACOES.items()
+    }
+
+
+def particionar_categorias(df):
+    """CATEGORIA -> posições de linha (as categorias são comparadas como texto)."""
+    if 'CATEGORIA' not in df.columns:
+        return {}
+    categorias = df['CATEGORIA'].reset_index(drop=True).dropna().astype(str)
+    return {categoria: posicoes.to_numpy() for categoria, posicoes in categorias.groupby(categorias).groups.items()}
+
+
+def _formatar_reais(valores):
+    """Valores numéricos -> texto com 2 casas ('12.50'), formatado de uma vez pelo NumPy."""
+    return pd.Series(np.char.mod('%.2f', valores.to_numpy(dtype=float)), index=valores.index, dtype=object)
+
+
+def formatar_detalhes(detalhes_str):
+    """Texto de DETALHESGRADE pronto para Markdown: dicionário vira lista '* **chave**: valor'."""
+    if not isinstance(detalhes_str, str) or not detalhes_str.strip():
+        return ''
+    if detalhes_str.strip().startswith('{'):
+        try:
+            detalhes_dict = ast.literal_eval(detalhes_str)
+            texto_formatado = ""
+            for chave, valor in detalhes_dict.items():
+                texto_formatado += f"* **{chave.strip()}**: {str(valor).strip()}\n"
+            return texto_formatado
+        except (ValueError, SyntaxError):
+            return detalhes_str
+    return detalhes_str
+
+
+def montar_fragmentos_cards(df, limite_estoque_baixo):
+    """
+    Gera, coluna a coluna, o HTML/Markdown estático de cada card (selo de estoque, selo de
+    promoção, bloco de preço com condição de pagamento e cashback, especificações), para que
+    a renderização só precise emitir essas strings e os widgets interativos.
+    Retorna 'df' com as colunas HTML_ESTOQUE, HTML_PROMOCAO, HTML_PRECO e MD_DETALHES.
+    """
+    quantidade = pd.to_numeric(df['QUANTIDADE'], errors='coerce').fillna(0).astype(int)
+    em_promocao = df['PRECO_PROMOCIONAL'].notna()
+
+    html_baixo = '<span class="estoque-baixo-badge">⚠️ Últimas ' + quantidade.astype(str) + ' Unidades!</span>'
+    html_estoque = pd.Series('', index=df.index, dtype=object)
+    html_estoque = html_estoque.mask((quantidade > 0) & (quantidade <= limite_estoque_baixo), html_baixo)
+    html_estoque = html_estoque.mask(quantidade <= 0, HTML_ESGOTADO)
+
+    html_promocao = pd.Series('', index=df.index, dtype=object).mask(em_promocao, HTML_BADGE_PROMOCAO)
+
+    condicao = df['CONDICAOPAGAMENTO'].fillna('Preço à vista').astype(str) if 'CONDICAOPAGAMENTO' in df.columns \
+        else pd.Series('Preço à vista', index=df.index, dtype=object)
+    condicao_html = (
+        "<span style='color: #757575; font-size: 0.85rem; font-weight: normal; margin-top: 5px; display: block;'>("
+        + condicao + ")</span>"
+    )
+
+    # O cashback é baseado no PRECO_FINAL (preço à vista/promocional)
+    cashback_percent = pd.to_numeric(df['CASHBACKPERCENT'], errors='coerce')
+    cashback_valor = (cashback_percent.fillna(0) / 100) * df['PRECO_FINAL']
+    cashback_html = pd.Series('', index=df.index, dtype=object).mask(
+        cashback_percent > 0,
+        "<span style='color: #2E7D32; font-size: 0.8rem; font-weight: bold; display: block; margin-top: 5px;'>Cashback: R$ "
+        + _formatar_reais(cashback_valor) + "</span>"
+    )
+
+    preco_final = _formatar_reais(df['PRECO_FINAL'])
+    html_preco_promocao = (
+        "<div style=\"line-height: 1.2;\"><span style='text-decoration: line-through; color: #757575; font-size: 0.9rem;'>R$ "
+        + _formatar_reais(df['PRECO']) + "</span><h4 style='color: #D32F2F; margin:0;'>R$ " + preco_final + "</h4>"
+        + condicao_html + cashback_html + "</div>"
+    )
+    html_preco_normal = (
+        "<div style='display: flex; align-items: flex-end; flex-wrap: wrap; gap: 8px;'>"
+        "<h4 style='color: #880E4F; margin:0; line-height:1;'>R$ " + preco_final + "</h4></div>"
+        + condicao_html + cashback_html
+    )
+
+    # Um mesmo texto de especificações (comum entre variações de produto) é interpretado uma única vez
+    if 'DETALHESGRADE' in df.columns:
+        detalhes = df['DETALHESGRADE']
+        formatados = {valor: formatar_detalhes(valor) for valor in detalhes.dropna().unique()}
+        md_detalhes = detalhes.map(formatados).fillna('')
+    else:
+        md_detalhes = pd.Series('', index=df.index, dtype=object)
+
+    return df.assign(
+        HTML_ESTOQUE=html_estoque,
+        HTML_PROMOCAO=html_promocao,
+        HTML_PRECO=html_preco_normal.mask(em_promocao, html_preco_promocao),
+        MD_DETALHES=md_detalhes,
+    )
+
+
+def _extras_por_id(df_promocoes, df_videos, avisos):
+    """
+    Uma tabela indexada por ID com as colunas vindas das outras planilhas
+    (PRECO_PROMOCIONAL, YOUTUBE_URL), para ser juntada ao catálogo de uma só vez.
+    Se um produto aparecer mais de uma vez em uma planilha, vale a primeira linha.
+    """
+    colunas = []
+    if df_promocoes is not None and not df_promocoes.empty:
+        colunas.append(pd.Series(
+            df_promocoes['PRECO_PROMOCIONAL'].to_numpy(),
+            index=pd.Index(df_promocoes['ID_PRODUTO'], dtype='Int64'),
+            name='PRECO_PROMOCIONAL',
+        ))
+    if df_videos is not None and not df_videos.empty:
+        if 'ID_PRODUTO' in df_videos.columns and 'YOUTUBE_URL' in df_videos.columns:
+            colunas.append(pd.Series(
+                df_videos['YOUTUBE_URL'].to_numpy(),
+                index=pd.Index(pd.to_numeric(df_videos['ID_PRODUTO'], errors='coerce').astype('Int64')),
+                name='YOUTUBE_URL',
+            ))
+        else:
+            avisos.append("Arquivo 'video.csv' encontrado, mas as colunas 'ID_PRODUTO' ou 'YOUTUBE_URL' estão faltando.")
+
+    colunas = [c[c.index.notna() & ~c.index.duplicated()] for c in colunas]
+    return pd.concat(colunas, axis=1) if colunas else None
+
+
+def montar_catalogo(df_produtos, df_promocoes=None, df_videos=None, nome_arquivo='produtos.csv'):
+    """
+    Monta o catálogo final (indexado por ID) a partir das planilhas já lidas, coluna a
+    coluna e sem percorrer linhas: conversão dos preços, condição de pagamento, colunas
+    padrão e um único join por ID com promoções e vídeos.
+    Retorna (df, avisos), em que 'avisos' são mensagens para exibir ao usuário.
+    Levanta ValueError se faltar uma coluna essencial.
+    """
+    avisos = []
+    for col in ['PRECOVISTA', 'ID', 'NOME']:
+        if col not in df_produtos.columns:
+            raise ValueError(f"Coluna essencial '{col}' não encontrada no '{nome_arquivo}'. O aplicativo não pode continuar.")
+
+    df = df_produtos.rename(columns={'PRECOVISTA': 'PRECO', 'MARCA': 'DESCRICAOCURTA'})
+
+    coluna_foto = next((nome for nome in NOMES_COLUNA_FOTO if nome in df.columns), None)
+    if coluna_foto:
+        df = df.rename(columns={coluna_foto: 'LINKIMAGEM'})
+    else:
+        avisos.append("Nenhuma coluna de imagem encontrada (Ex: FOTOURL, IMAGEM). Os produtos serão exibidos sem fotos.")
+
+    # Filtra antes de converter: as conversões abaixo só processam os produtos disponíveis
+    if 'DISPONIVEL' in df.columns:
+        df = df[df['DISPONIVEL'].astype(str).str.strip().str.lower() == 'sim']
+
+    ids = pd.to_numeric(df['ID'], errors='coerce')
+    df = df[ids.notna()]
+    ids = ids[ids.notna()]
+
+    preco = conversoes.converter_numerico(df['PRECO'], 0.0)
+    preco_cartao = conversoes.converter_numerico(df['PRECOCARTAO'], preco) if 'PRECOCARTAO' in df.columns else preco
+
+    novas_colunas = {
+        'RECENCIA': ids,
+        'ID': ids.astype('Int64'),
+        'PRECO': preco,
+        'PRECOCARTAO': preco_cartao,
+        'CASHBACKPERCENT': conversoes.converter_numerico(df['CASHBACKPERCENT'], 0.0) if 'CASHBACKPERCENT' in df.columns else 0.0,
+        'QUANTIDADE': pd.to_numeric(df['QUANTIDADE'], errors='coerce').fillna(0) if 'QUANTIDADE' in df.columns else 999999,
+    }
+    if 'CONDICAOPAGAMENTO' not in df.columns:
+        # Simulação de 3x no cartão
+        parcelado = '3x de R$ ' + _formatar_reais(preco_cartao / 3) + ' no cartão'
+        novas_colunas['CONDICAOPAGAMENTO'] = parcelado.where(preco_cartao > 0, 'Preço à vista')
+    if not coluna_foto:
+        novas_colunas['LINKIMAGEM'] = ""
+    if 'DISPONIVEL' not in df.columns:
+        novas_colunas['DISPONIVEL'] = 'SIM'
+    if 'DESCRICAOLONGA' not in df.columns:
+        novas_colunas['DESCRICAOLONGA'] = df['CATEGORIA'] if 'CATEGORIA' in df.columns else ''
+    if 'CATEGORIA' not in df.columns:
+        novas_colunas['CATEGORIA'] = 'Geral'
+
+    df = df.assign(**novas_colunas).set_index('ID')
+
+    extras = _extras_por_id(df_promocoes, df_videos, avisos)
+    if extras is not None:
+        df = df.join(extras)
+    if 'PRECO_PROMOCIONAL' not in df.columns:
+        df['PRECO_PROMOCIONAL'] = np.nan
+    # PRECO_FINAL é o preço à vista ou promocional (o PRECOCARTAO fica só para a condição de pagamento)
+    df['PRECO_FINAL'] = df['PRECO_PROMOCIONAL'].fillna(df['PRECO'])
+
+    return df, avisos
+
+
+def preparar_catalogo(df_indexado, limite_estoque_baixo=5):
+    """Monta o CatalogoPreparado a partir do catálogo final (indexado por ID)."""
+    if not df_indexado.empty:
+        df_indexado = df_indexado.assign(EM_PROMOCAO=df_indexado['PRECO_PROMOCIONAL'].notna())
+        df_indexado = montar_fragmentos_cards(df_indexado, limite_estoque_baixo)
+    particoes = particionar_categorias(df_indexado)
+    return CatalogoPreparado(
+        df=df_indexado,
+        indice_busca=busca_catalogo.construir_indice(df_indexado),
+        ordens=calcular_ordens(df_indexado),
+        particoes_categoria=particoes,
+        categorias=sorted(particoes),
+    )
+
+
+def posicoes_exibidas(catalogo, ordem, categoria=None, resultados_busca=None):
+    """
+    Posições (em catalogo.df) dos produtos a exibir, já na ordem de exibição, sem copiar
+    nem reordenar o DataFrame: a ordenação é a permutação pré-calculada, o filtro de
+    categoria é uma interseção com a partição e, na busca, a relevância vem primeiro e a
+    ordenação escolhida desempata.
+    """
+    ordenadas = catalogo.ordens[ordem]
+
+    if resultados_busca is not None:
+        if not resultados_busca:
+            return np.array([], dtype=np.int64)
+        rank = np.empty(len(ordenadas), dtype=np.int64)
+        rank[ordenadas] = np.arange(len(ordenadas))
+        return np.array(
+            [p for p, _ in sorted(resultados_busca, key=lambda item: (-item[1], rank[item[0]]))],
+            dtype=np.int64,
+        )
+
+    if categoria is not None:
+        particao = catalogo.particoes_categoria.get(categoria)
+        if particao is None:
+            return np.array([], dtype=np.int64)
+        return ordenadas[np.isin(ordenadas, particao, assume_unique=True)]
+
+    return ordenadas
+
+
+def catalogo_compartilhado(assinatura_atual, montar, assinatura_local=None, intervalo=INTERVALO_VERIFICACAO):
+    """
+    Retorna (versão, CatalogoPreparado) do instantâneo compartilhado.
+
+    'assinatura_atual()' deve ser barata e mudar quando alguma planilha de origem
+    mudar (ex.: os SHAs dos arquivos); ela é consultada no máximo a cada
+    'intervalo' segundos. Se mudou, 'montar()' gera o novo catálogo e a
+    versão é incrementada. Enquanto uma sessão monta a versão nova, as demais
+    continuam recebendo a atual em vez de esperar ou montar de novo. Uma assinatura
+    None (não foi possível verificar) mantém o instantâneo atual.
+
+    Na primeira montagem do processo, se 'assinatura_local()' for informada (a assinatura
+    dos dados que 'montar' acabou de usar, sem consultar o GitHub), ela é usada no lugar
+    de 'assinatura_atual()': a primeira página não espera a verificação, que fica para o
+    rerun seguinte.
+    """
+    atual = _INSTANTANEO["atual"]
+    if atual is not None and time.monotonic() - _INSTANTANEO["verificado_em"] < intervalo:
+        return atual
+
+    if not _TRAVA_INSTANTANEO.acquire(blocking=atual is None):
+        return atual
+    try:
+        atual = _INSTANTANEO["atual"]
+        if atual is not None and time.monotonic() - _INSTANTANEO["verificado_em"] < intervalo:
+            return atual
+        if atual is None and assinatura_local is not None:
+            atual = (1, montar())
+            _INSTANTANEO["atual"] = atual
+            _INSTANTANEO["assinatura"] = assinatura_local()
+        else:
+            assinatura = assinatura_atual()
+            if atual is None or (assinatura is not None and assinatura != _INSTANTANEO["assinatura"]):
+                atual = ((atual[0] if atual else 0) + 1, montar())
+                _INSTANTANEO["atual"] = atual
+                _INSTANTANEO["assinatura"] = assinatura
+        _INSTANTANEO["verificado_em"] = time.monotonic()
+        return atual
+    finally:
+        _TRAVA_INSTANTANEO.release()
@@ -0,0 +1,309 @@
+# cliente_github.py
+"""
+Cliente HTTP único para a API do GitHub, usado por todas as leituras e gravações.
+
+- Uma sessão compartilhada pelo processo (keep-alive): as chamadas reaproveitam
+  as conexões TLS em vez de abrir uma nova a cada requisição.
+- Toda chamada tem timeout: uma resposta travada do GitHub não prende mais o
+  worker do Streamlit indefinidamente.
+- Limites secundários de taxa (403/429 com Retry-After ou mensagem de "secondary
+  rate limit") são repetidos com backoff exponencial. Respostas 5xx e timeouts só
+  são repetidos nas leituras (GET/HEAD): uma gravação pode ter sido aplicada pelo
+  GitHub mesmo assim, e reenviá-la a aplicaria duas vezes. Nas gravações, quem
+  chama recebe a resposta (ou a exceção) e confere se a alteração já está lá.
+- Os cabeçalhos X-RateLimit-* de cada resposta são acompanhados: quando restam
+  poucas chamadas na janela, as seguintes são espaçadas até o reinício da cota,
+  em vez de esgotá-la e passar a receber 403. Só as chamadas em segundo plano
+  (em_segundo_plano) esperam o espaçamento inteiro; as feitas durante a execução
+  do script esperam no máximo ESPERA_MAXIMA_INTERATIVA, para não travar a página.
+  Os intervalos de revalidação dos caches (ttl_adaptativo) também aumentam à
+  medida que a cota diminui.
+- Cada chamada é contabilizada por arquivo, por função de origem e por sessão
+  (ver consumo), para mostrar no admin quais caminhos do código gastam a cota.
+"""
+import contextlib
+import contextvars
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Conexões mantidas abertas com a API (também o número de leituras simultâneas de github_dados)
+MAX_CONEXOES = 8
+
+# (conexão, leitura) em segundos
+TIMEOUT = (5, 30)
+
+TENTATIVAS = 4
+ESPERA_BASE = 1.0  # segundos; dobra a cada nova tentativa
+ESPERA_MAXIMA = 30.0  # nenhuma espera (backoff ou espaçamento) passa disto
+ESPERA_MAXIMA_INTERATIVA = 1.0  # espaçamento pela cota de uma chamada fora do segundo plano
+
+# Abaixo de tantas chamadas restantes na janela, as requisições passam a ser espaçadas
+RESERVA_COTA = 100
+
+# Abaixo desta fração da cota, os intervalos de revalidação (ttl_adaptativo) passam a
+# ser multiplicados, até FATOR_TTL_MAXIMO quando a cota está quase no fim
+FRACAO_COTA_ECONOMIA = 0.5
+FATOR_TTL_MAXIMO = 10.0
+
+# Módulos da camada de dados: a "função de origem" de uma chamada é a primeira fora deles
+MODULOS_DA_CAMADA = {
+    __name__, "github_dados", "fila_commits", "log_segmentado", "mesclagem_csv",
+    "usos_cupons", "cache_disco", "formato_colunar", "contextlib", "threading", "concurrent.futures.thread",
+}
+MAX_SESSOES_CONTABILIZADAS = 200
+
+STATUS_REPETIVEIS = {500, 502, 503, 504}
+METODOS_REPETIVEIS = {"GET", "HEAD"}  # os únicos repetidos em 5xx e timeouts
+
+_SESSAO = requests.Session()
+_SESSAO.mount("https://", HTTPAdapter(pool_connections=MAX_CONEXOES, pool_maxsize=MAX_CONEXOES))
+
+# Último X-RateLimit-Limit / X-RateLimit-Remaining / X-RateLimit-Reset visto
+_COTA = {"limite": None, "restantes": None, "reinicia_em": 0.0}
+_TRAVA_COTA = threading.Lock()
+
+# Contabilidade: agrupamento -> nome -> {'chamadas', 'nao_modificadas', 'erros'}
+_CONSUMO = {"arquivo": {}, "funcao": {}, "sessao": OrderedDict()}
+_INICIO_CONSUMO = [time.time()]
+_TRAVA_CONSUMO = threading.Lock()
+
+_SESSAO_ATUAL = contextvars.ContextVar("cliente_github_sessao", default=None)
+_FUNCAO_ATUAL = contextvars.ContextVar("cliente_github_funcao", default=None)
+_SEGUNDO_PLANO = contextvars.ContextVar("cliente_github_segundo_plano", default=False)
+
+
+def _atualizar_cota(response):
+    restantes = response.headers.get("X-RateLimit-Remaining")
+    reinicia_em = response.headers.get("X-RateLimit-Reset")
+    if restantes is None or reinicia_em is None:
+        return
+    try:
+        with _TRAVA_COTA:
+            _COTA["restantes"] = int(restantes)
+            _COTA["reinicia_em"] = float(reinicia_em)
+            _COTA["limite"] = int(response.headers.get("X-RateLimit-Limit", _COTA["limite"] or 0)) or None
+    except ValueError:
+        pass
+
+
+def cota():
+    """{'limite', 'restantes', 'reinicia_em'} segundo a última resposta da API (None se ainda não se sabe)."""
+    with _TRAVA_COTA:
+        return dict(_COTA)
+
+
+def fator_ttl():
+    """
+    Quanto os intervalos de revalidação devem ser multiplicados: 1 enquanto resta pelo menos
+    FRACAO_COTA_ECONOMIA da cota; depois cresce até FATOR_TTL_MAXIMO conforme ela se esgota.
+    """
+    with _TRAVA_COTA:
+        limite, restantes, reinicia_em = _COTA["limite"], _COTA["restantes"], _COTA["reinicia_em"]
+    if not limite or restantes is None or time.time() >= reinicia_em:
+        return 1.0
+    fracao = restantes / limite
+    if fracao >= FRACAO_COTA_ECONOMIA:
+        return 1.0
+    return min(FRACAO_COTA_ECONOMIA / max(fracao, FRACAO_COTA_ECONOMIA / FATOR_TTL_MAXIMO), FATOR_TTL_MAXIMO)
+
+
+def ttl_adaptativo(segundos):
+    """Intervalo de revalidação 'segundos' ajustado à cota restante (ver fator_ttl)."""
+    return segundos * fator_ttl()
+
+
+@contextlib.contextmanager
+def em_segundo_plano():
+    """
+    Marca as chamadas feitas dentro do bloco como de segundo plano (ninguém espera por
+    elas): com a cota baixa, são espaçadas até ESPERA_MAXIMA, e não só ESPERA_MAXIMA_INTERATIVA.
+    """
+    marca = _SEGUNDO_PLANO.set(True)
+    try:
+        yield
+    finally:
+        _SEGUNDO_PLANO.reset(marca)
+
+
+# --- Contabilidade das chamadas ---
+def definir_sessao(sessao):
+    """Identifica a sessão (ex.: 'admin:1a2b3c4d') à qual as chamadas seguintes desta execução são atribuídas."""
+    _SESSAO_ATUAL.set(sessao)
+
+
+@contextlib.contextmanager
+def contabilizar_como(funcao):
+    """Atribui as chamadas feitas dentro do bloco a 'funcao', em vez da função detectada pela pilha."""
+    marca = _FUNCAO_ATUAL.set(funcao)
+    try:
+        yield
+    finally:
+        _FUNCAO_ATUAL.reset(marca)
+
+
+def _funcao_chamadora():
+    """Nome da primeira função na pilha fora da camada de dados (ex.: 'fetch_github_data_v2')."""
+    quadro = sys._getframe(1)
+    while quadro is not None:
+        nome = quadro.f_code.co_name
+        if quadro.f_globals.get("__name__") not in MODULOS_DA_CAMADA and not nome.startswith("<"):
+            return nome
+        quadro = quadro.f_back
+    return None
+
+
+def contexto_da_chamada():
+    """
+    Cópia do contexto atual (sessão e função de origem) para executar uma tarefa em outra
+    thread: contexto_da_chamada().run(tarefa). Sem ela, as chamadas feitas pela thread
+    não seriam atribuídas a ninguém.
+    """
+    contexto = contextvars.copy_context()
+    if contexto.get(_FUNCAO_ATUAL) is None:
+        contexto.run(_FUNCAO_ATUAL.set, _funcao_chamadora())
+    return contexto
+
+
+def _arquivo_da_url(url):
+    """'.../repos/dono/repo/contents/pedidos.csv?ref=main' -> 'pedidos.csv'; Git Data API -> 'git/<recurso>'."""
+    partes = url.split("?", 1)[0].split("/repos/", 1)[-1].split("/")[2:]
+    if partes[:1] == ["contents"]:
+        return "/".join(partes[1:]) or "/"
+    return "/".join(partes[:2]) or url
+
+
+def _contabilizar(url, status):
+    nomes = {
+        "arquivo": _arquivo_da_url(url),
+        "funcao": _FUNCAO_ATUAL.get() or _funcao_chamadora() or "(desconhecida)",
+        "sessao": _SESSAO_ATUAL.get() or "(fora de sessão)",
+    }
+    with _TRAVA_CONSUMO:
+        for agrupamento, nome in nomes.items():
+            contagem = _CONSUMO[agrupamento].setdefault(nome, {"chamadas": 0, "nao_modificadas": 0, "erros": 0})
+            contagem["chamadas"] += 1
+            contagem["nao_modificadas"] += status == 304
+            contagem["erros"] += status is None or (status >= 400 and status != 404)
+        sessoes = _CONSUMO["sessao"]
+        sessoes.move_to_end(nomes["sessao"])
+        while len(sessoes) > MAX_SESSOES_CONTABILIZADAS:
+            sessoes.popitem(last=False)
+
+
+def consumo():
+    """
+    Cópia da contabilidade: {'desde': instante do início, 'arquivo'|'funcao'|'sessao': {nome:
+    {'chamadas', 'nao_modificadas', 'erros'}}}. Respostas 304 (nao_modificadas) não gastam cota.
+    """
+    with _TRAVA_CONSUMO:
+        copia = {agrupamento: {nome: dict(c) for nome, c in nomes.items()} for agrupamento, nomes in _CONSUMO.items()}
+    copia["desde"] = _INICIO_CONSUMO[0]
+    return copia
+
+
+def zerar_consumo():
+    with _TRAVA_CONSUMO:
+        for nomes in _CONSUMO.values():
+            nomes.clear()
+        _INICIO_CONSUMO[0] = time.time()
+
+
+def _espaco_pela_cota():
+    """
+    Espera antes da próxima chamada: a janela restante dividida pelas chamadas que ainda
+    cabem nela, limitada a ESPERA_MAXIMA_INTERATIVA fora do segundo plano.
+    """
+    with _TRAVA_COTA:
+        restantes, reinicia_em = _COTA["restantes"], _COTA["reinicia_em"]
+    if restantes is None or restantes >= RESERVA_COTA:
+        return 0.0
+    janela = reinicia_em - time.time()
+    if janela <= 0:
+        return 0.0
+    return min(janela / max(restantes, 1), ESPERA_MAXIMA if _SEGUNDO_PLANO.get() else ESPERA_MAXIMA_INTERATIVA)
+
+
+def _limite_secundario(response):
+    """Segundos a esperar se a resposta for um limite de taxa temporário, ou None."""
+    if response.status_code not in (403, 429):
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            return ESPERA_BASE
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return max(float(response.headers.get("X-RateLimit-Reset", 0)) - time.time(), ESPERA_BASE)
+    if "secondary rate limit" in response.text.lower():
+        return ESPERA_BASE
+    return None
+
+
+def _backoff(tentativa):
+    return min(ESPERA_BASE * 2 ** tentativa, ESPERA_MAXIMA) * random.uniform(0.5, 1.0)
+
+
+def requisitar(metodo, url, **kwargs):
+    """
+    Executa a requisição pela sessão compartilhada, com timeout, espaçamento pela cota
+    e novas tentativas em erros temporários. Retorna a última resposta (o chamador decide
+    o que fazer com 4xx); falhas de conexão que persistem são propagadas. Gravações só são
+    repetidas quando com certeza não chegaram a ser aplicadas (limite de taxa, conexão
+    não estabelecida): um 5xx é devolvido e um timeout é propagado na primeira vez.
+    """
+    kwargs.setdefault("timeout", TIMEOUT)
+    repetivel = metodo.upper() in METODOS_REPETIVEIS
+    for tentativa in range(TENTATIVAS):
+        espera = _espaco_pela_cota()
+        if espera:
+            time.sleep(espera)
+
+        try:
+            response = _SESSAO.request(metodo, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as erro:
+            _contabilizar(url, None)
+            if tentativa == TENTATIVAS - 1 or not (repetivel or isinstance(erro, requests.exceptions.ConnectTimeout)):
+                raise
+            time.sleep(_backoff(tentativa))
+            continue
+
+        _atualizar_cota(response)
+        _contabilizar(url, response.status_code)
+        if tentativa == TENTATIVAS - 1:
+            return response
+        if response.status_code in STATUS_REPETIVEIS and repetivel:
+            time.sleep(_backoff(tentativa))
+            continue
+        espera = _limite_secundario(response)
+        if espera is not None and espera <= ESPERA_MAXIMA:
+            time.sleep(max(espera, _backoff(tentativa)))
+            continue
+        return response
+    return response
+
+
+def get(url, **kwargs):
+    return requisitar("GET", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return requisitar("PUT", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return requisitar("POST", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return requisitar("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return requisitar("DELETE", url, **kwargs)
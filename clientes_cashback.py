@@ -0,0 +1,78 @@
+# clientes_cashback.py
+"""
+Busca de clientes do cashback pelo contato (telefone), compartilhada pelos dois apps.
+
+O telefone é normalizado sempre da mesma forma (só os dígitos) e o índice
+contato -> linha é montado uma única vez por versão do 'clientes_cash.csv',
+de modo que cada busca é uma consulta a um dicionário, e não uma varredura
+da planilha inteira.
+"""
+import re
+import threading
+
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+# Quantas versões de índice manter em memória (o admin e o catálogo podem estar em versões diferentes)
+MAX_INDICES = 4
+
+_INDICES = {}  # (versão, linhas) -> {contato normalizado: posição da linha}
+_TRAVA_INDICES = threading.Lock()
+
+
+def normalizar_contato(contato):
+    """Telefone só com dígitos ('(11) 98765-4321' -> '11987654321'); vazio se não houver contato."""
+    if contato is None or (not isinstance(contato, str) and pd.isna(contato)):
+        return ""
+    if isinstance(contato, float) and contato.is_integer():
+        contato = int(contato)  # coluna lida como número: evita o '.0' virar dígito
+    return re.sub(r"\D", "", str(contato))
+
+
+def normalizar_contatos(contatos):
+    """normalizar_contato aplicado a uma coluna inteira de uma vez."""
+    if is_numeric_dtype(contatos):
+        contatos = contatos.astype("Int64")
+    return contatos.astype(str).str.replace(r"\D", "", regex=True).fillna("")
+
+
+def _montar_indice(df):
+    if df is None or df.empty or "CONTATO" not in df.columns:
+        return {}
+    contatos = normalizar_contatos(df["CONTATO"]).reset_index(drop=True)
+    # Contato repetido: vale a primeira linha
+    contatos = contatos[(contatos != "") & ~contatos.duplicated(keep="first")]
+    return dict(zip(contatos.to_numpy(), contatos.index.to_numpy()))
+
+
+def indice_contatos(df, versao=None):
+    """
+    {contato normalizado: posição da linha em 'df'}. Com 'versao' (ex.: o SHA do
+    arquivo lido), o índice é montado uma vez e reaproveitado enquanto a versão
+    não mudar; sem ela (ex.: planilha com alterações locais), é montado na hora.
+    """
+    if versao is None:
+        return _montar_indice(df)
+    chave = (versao, len(df))
+    indice = _INDICES.get(chave)
+    if indice is None:
+        indice = _montar_indice(df)
+        with _TRAVA_INDICES:
+            _INDICES[chave] = indice
+            while len(_INDICES) > MAX_INDICES:
+                _INDICES.pop(next(iter(_INDICES)))
+    return indice
+
+
+def posicao_do_cliente(df, contato, versao=None):
+    """Posição (para df.iloc) da linha do cliente com este contato, ou None."""
+    contato_limpo = normalizar_contato(contato)
+    if not contato_limpo:
+        return None
+    return indice_contatos(df, versao).get(contato_limpo)
+
+
+def buscar_cliente(df, contato, versao=None):
+    """Registro (dicionário coluna -> valor) do cliente com este contato, ou None."""
+    posicao = posicao_do_cliente(df, contato, versao)
+    return None if posicao is None else df.iloc[posicao].to_dict()
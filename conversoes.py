@@ -0,0 +1,19 @@
+# conversoes.py
+"""
+Conversões de valores das planilhas, compartilhadas pelos dois apps.
+"""
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+
+def converter_numerico(serie, padrao=None):
+    """
+    Coluna da planilha -> números, aceitando vírgula como separador decimal ('12,50').
+    Valores vazios ou inválidos viram NaN, ou 'padrao' (um valor ou uma Series
+    alinhada) se informado. Colunas que o leitor do CSV já entregou como números
+    não passam pela conversão para texto.
+    """
+    if not is_numeric_dtype(serie):
+        serie = serie.astype(str).str.replace(',', '.', regex=False)
+    valores = pd.to_numeric(serie, errors='coerce')
+    return valores if padrao is None else valores.fillna(padrao)
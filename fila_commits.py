@@ -0,0 +1,206 @@
+# fila_commits.py
+"""
+Fila de gravações agrupadas em um único commit (Git Data API).
+
+Cada alteração do admin (ex.: finalizar um pedido) gravava o CSV inteiro com um
+GET (para obter o SHA) e um PUT por arquivo. Aqui as alterações são acumuladas
+por repositório/branch e enviadas juntas: um tree novo com todos os arquivos,
+um commit e a atualização da referência da branch. Se a branch avançar no meio
+do caminho (outro commit chegou antes), o processo é refeito sobre o novo HEAD;
+arquivos alterados por esse outro commit passam pelo 'rebase' (mesclagem).
+"""
+import base64
+import hashlib
+
+import requests
+
+import cliente_github
+import github_dados
+import mesclagem_csv
+
+GITHUB_API = github_dados.GITHUB_API
+TENTATIVAS_COMMIT = 4
+
+
+class ConflitoDeVersao(Exception):
+    """Um arquivo da fila foi alterado por outro commit depois de ser lido."""
+
+    def __init__(self, caminhos):
+        super().__init__(f"Arquivo(s) alterado(s) por outro commit: {', '.join(caminhos)}")
+        self.caminhos = caminhos
+
+
+def sha_blob(conteudo):
+    """SHA que o Git atribui ao blob com este conteúdo (permite atualizar o armazém sem novo GET)."""
+    dados = conteudo if isinstance(conteudo, bytes) else conteudo.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(dados) + dados).hexdigest()
+
+
+def nova_fila():
+    """Fila vazia: (repo, branch) -> {caminho: {'conteudo', 'mensagem', 'sha_base'}}."""
+    return {}
+
+
+def enfileirar(fila, repo, branch, caminho, conteudo, mensagem, sha_base=None, dados=None, derivar=None):
+    """
+    Agenda a gravação de 'conteudo' em 'caminho' (None remove o arquivo; bytes grava um
+    arquivo binário). Uma nova alteração do mesmo arquivo substitui a anterior, mas o
+    'sha_base' original (a versão sobre a qual a primeira alteração foi feita) é preservado.
+    'dados' (ex.: o DataFrame que gerou o conteúdo) fica disponível para o 'rebase' em caso
+    de conflito. 'derivar(conteudo)' devolve {caminho: conteúdo} de arquivos gerados a partir
+    deste (ex.: a cópia colunar), gravados no mesmo commit com base no conteúdo final, já
+    depois de um eventual rebase.
+    """
+    arquivos = fila.setdefault((repo, branch), {})
+    anterior = arquivos.get(caminho)
+    mensagens = (anterior["mensagens"] if anterior else []) + [mensagem]
+    arquivos[caminho] = {
+        "conteudo": conteudo,
+        "mensagens": mensagens,
+        "sha_base": anterior["sha_base"] if anterior else sha_base,
+        "dados": dados,
+        "derivar": derivar,
+    }
+
+
+def tamanho(fila):
+    """Quantidade de arquivos pendentes na fila."""
+    return sum(len(arquivos) for arquivos in fila.values())
+
+
+def _headers(token):
+    return {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3+json"}
+
+
+def _item_da_tree(repo, token, caminho, conteudo):
+    """
+    Item da nova tree para o arquivo. Texto pequeno vai embutido; arquivos binários ou
+    acima de github_dados.LIMITE_CONTEUDO_EMBUTIDO são antes enviados pela API de blobs.
+    """
+    item = {"path": caminho, "mode": "100644", "type": "blob"}
+    if conteudo is None:
+        item["sha"] = None
+    elif isinstance(conteudo, bytes) or len(conteudo) > github_dados.LIMITE_CONTEUDO_EMBUTIDO:
+        dados = conteudo if isinstance(conteudo, bytes) else conteudo.encode("utf-8")
+        blob = cliente_github.post(f"{GITHUB_API}/repos/{repo}/git/blobs", headers=_headers(token),
+                                   json={"content": base64.b64encode(dados).decode("ascii"), "encoding": "base64"})
+        blob.raise_for_status()
+        item["sha"] = blob.json()["sha"]
+    else:
+        item["content"] = conteudo
+    return item
+
+
+def _conteudos_finais(arquivos):
+    """{caminho: conteúdo} dos arquivos da fila e dos derivados deles."""
+    conteudos = {}
+    for caminho, arquivo in arquivos.items():
+        conteudos[caminho] = arquivo["conteudo"]
+        if arquivo.get("derivar") and arquivo["conteudo"] is not None:
+            # Uma nova tentativa de commit sem rebase não precisa gerar os derivados de novo
+            if arquivo.get("derivados", (None,))[0] is not arquivo["conteudo"]:
+                arquivo["derivados"] = (arquivo["conteudo"], arquivo["derivar"](arquivo["conteudo"]))
+            conteudos.update(arquivo["derivados"][1])
+    return conteudos
+
+
+def _shas_da_tree(repo, tree_sha, token):
+    """{caminho: sha do blob} de todos os arquivos da tree (uma única chamada, recursiva)."""
+    response = cliente_github.get(f"{GITHUB_API}/repos/{repo}/git/trees/{tree_sha}?recursive=1", headers=_headers(token))
+    response.raise_for_status()
+    return {item["path"]: item["sha"] for item in response.json().get("tree", []) if item.get("type") == "blob"}
+
+
+def commit_arquivos(repo, branch, token, arquivos, mensagem, rebase=None):
+    """
+    Grava vários arquivos em um único commit. 'arquivos' é {caminho: {'conteudo', 'sha_base', ...}}
+    ('conteudo' None remove o arquivo). Antes de gravar, confere se os arquivos com 'sha_base'
+    ainda estão nessa versão no HEAD da branch. Se algum tiver sido alterado por outro commit,
+    chama 'rebase(repo, branch, caminho, arquivo)', que deve devolver (novo_conteudo, novo_sha_base)
+    com a alteração reaplicada sobre a versão atual; sem 'rebase', levanta ConflitoDeVersao em vez
+    de sobrescrever a alteração alheia. Se a branch avançar durante a operação, refaz sobre o novo
+    HEAD com backoff. Retorna o SHA do novo commit.
+    """
+    headers = _headers(token)
+    base_repo = f"{GITHUB_API}/repos/{repo}/git"
+
+    for tentativa in range(TENTATIVAS_COMMIT):
+        ref = cliente_github.get(f"{base_repo}/ref/heads/{branch}", headers=headers)
+        ref.raise_for_status()
+        head_sha = ref.json()["object"]["sha"]
+
+        commit_head = cliente_github.get(f"{base_repo}/commits/{head_sha}", headers=headers)
+        commit_head.raise_for_status()
+        tree_head_sha = commit_head.json()["tree"]["sha"]
+
+        if any(arquivo.get("sha_base") for arquivo in arquivos.values()):
+            shas_head = _shas_da_tree(repo, tree_head_sha, token)
+            alterados = [
+                caminho for caminho, arquivo in arquivos.items()
+                if arquivo.get("sha_base") and shas_head.get(caminho) != arquivo["sha_base"]
+            ]
+            if alterados and rebase is None:
+                raise ConflitoDeVersao(alterados)
+            for caminho in alterados:
+                arquivo = arquivos[caminho]
+                arquivo["conteudo"], arquivo["sha_base"] = rebase(repo, branch, caminho, arquivo)
+
+        conteudos = _conteudos_finais(arquivos)
+        itens_tree = [_item_da_tree(repo, token, caminho, conteudo) for caminho, conteudo in conteudos.items()]
+
+        tree = cliente_github.post(f"{base_repo}/trees", headers=headers,
+                                   json={"base_tree": tree_head_sha, "tree": itens_tree})
+        tree.raise_for_status()
+
+        novo_commit = cliente_github.post(f"{base_repo}/commits", headers=headers,
+                                          json={"message": mensagem, "tree": tree.json()["sha"], "parents": [head_sha]})
+        novo_commit.raise_for_status()
+        novo_commit_sha = novo_commit.json()["sha"]
+
+        try:
+            atualizacao = cliente_github.patch(f"{base_repo}/refs/heads/{branch}", headers=headers,
+                                               json={"sha": novo_commit_sha, "force": False})
+            aplicada = atualizacao.status_code == 200
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            atualizacao, aplicada = None, False
+        if atualizacao is None or atualizacao.status_code >= 500:
+            # Sem resposta conclusiva: a branch pode ter avançado mesmo assim, e refazer o commit
+            # sobre ela reaplicaria o rebase (ex.: somaria de novo um cashback)
+            ref = cliente_github.get(f"{base_repo}/ref/heads/{branch}", headers=headers)
+            ref.raise_for_status()
+            aplicada = ref.json()["object"]["sha"] == novo_commit_sha
+        if aplicada:
+            for caminho, conteudo in conteudos.items():
+                if conteudo is None:
+                    github_dados.esquecer(repo, branch, caminho)
+                elif isinstance(conteudo, bytes):
+                    github_dados.registrar_blob(sha_blob(conteudo), conteudo)
+                else:
+                    github_dados.registrar_conteudo(repo, branch, caminho, conteudo, sha_blob(conteudo))
+            return novo_commit_sha
+        if atualizacao is not None and atualizacao.status_code < 500 and atualizacao.status_code != 422:
+            atualizacao.raise_for_status()
+        # 422 (ou 5xx sem a branch ter avançado): a branch não avança "fast-forward" (outro commit
+        # chegou antes). Espera e refaz.
+        mesclagem_csv.esperar_nova_tentativa(tentativa)
+
+    raise ConflitoDeVersao(list(arquivos))
+
+
+def descarregar(fila, token, rebase=None):
+    """
+    Envia a fila: um commit por repositório/branch, com as mensagens de todas as
+    alterações no corpo ('rebase' como em commit_arquivos). Os grupos enviados com
+    sucesso saem da fila. Retorna a quantidade de arquivos gravados.
+    """
+    gravados = 0
+    for (repo, branch), arquivos in list(fila.items()):
+        mensagens = [m for arquivo in arquivos.values() for m in arquivo["mensagens"]]
+        if len(mensagens) == 1:
+            mensagem = mensagens[0]
+        else:
+            mensagem = f"Lote: {len(mensagens)} alterações\n\n" + "\n".join(f"- {m}" for m in mensagens)
+        commit_arquivos(repo, branch, token, arquivos, mensagem, rebase)
+        gravados += len(arquivos)
+        del fila[(repo, branch)]
+    return gravados
@@ -0,0 +1,111 @@
+# formato_colunar.py
+"""
+Cópia colunar (Parquet) das planilhas, gravada ao lado do CSV.
+
+O CSV continua sendo o formato de referência (editável à mão, lido pelos dois
+apps), mas ler um CSV grande custa o download do texto inteiro e um parse a cada
+nova versão. Quando o admin grava uma planilha pela fila de commits (modo lote,
+compactação, arquivamento ou CSV acima do limite da Contents API), uma cópia
+'planilha.parquet' do DataFrame já processado (compactada com zstd) vai no mesmo
+commit; a cópia leva o SHA do CSV do qual foi gerada e o 'formato' de leitura. As
+gravações simples pela Contents API continuam sendo uma única chamada e não
+atualizam a cópia. Na leitura, se a cópia corresponde ao CSV atual, ela é usada no
+lugar dele: o download é menor e não há parse. Se não corresponde (o CSV foi
+alterado por outro caminho, ou a leitura mudou), o CSV é lido como antes.
+
+Desativado com FORMATO_COLUNAR=0, ou se o pyarrow não estiver instalado.
+"""
+import os
+import posixpath
+import threading
+from io import BytesIO
+
+import pandas as pd
+
+import fila_commits
+import github_dados
+import leitura_csv
+
+ATIVO = os.environ.get("FORMATO_COLUNAR", "1") != "0" and leitura_csv.PYARROW_DISPONIVEL
+COMPRESSAO = "zstd"
+
+# Quantos DataFrames lidos das cópias colunares manter em memória
+MAX_DATAFRAMES = 8
+
+_DATAFRAMES = {}  # (sha do parquet, formato) -> DataFrame
+_TRAVA_DATAFRAMES = threading.Lock()
+
+
+def caminho_colunar(caminho_csv):
+    """'pedidos.csv' -> 'pedidos.parquet'."""
+    return posixpath.splitext(caminho_csv)[0] + ".parquet"
+
+
+def serializar(df, sha_csv, formato):
+    """
+    Parquet (bytes) do DataFrame lido do CSV de SHA 'sha_csv' com 'formato'; None se as
+    colunas não puderem ser gravadas em Parquet (ex.: tipos misturados em uma coluna).
+    """
+    copia = df.copy()
+    copia.attrs = {**df.attrs, "colunar": {"sha_csv": sha_csv, "formato": formato}}
+    copia.attrs.pop("sha", None)
+    saida = BytesIO()
+    try:
+        copia.to_parquet(saida, index=False, compression=COMPRESSAO)
+    except Exception:
+        return None
+    return saida.getvalue()
+
+
+def derivador(caminho_csv, formato, parser):
+    """
+    Função para fila_commits.enfileirar(derivar=...): recebe o CSV que será gravado e
+    devolve {caminho do parquet: bytes}. None se o formato colunar estiver desativado.
+    """
+    if not ATIVO:
+        return None
+
+    def derivar(conteudo):
+        dados = serializar(parser(conteudo), fila_commits.sha_blob(conteudo), formato)
+        return {caminho_colunar(caminho_csv): dados} if dados is not None else {}
+    return derivar
+
+
+def _ler_copia(repo, token, sha_parquet, sha_csv, formato):
+    """DataFrame da cópia colunar, ou None se ela não foi gerada desse CSV com esse formato."""
+    df = _DATAFRAMES.get((sha_parquet, formato))
+    if df is None:
+        try:
+            df = pd.read_parquet(BytesIO(github_dados.obter_blob(repo, sha_parquet, token)))
+        except (OSError, ValueError):
+            return None
+        with _TRAVA_DATAFRAMES:
+            _DATAFRAMES[(sha_parquet, formato)] = df
+            while len(_DATAFRAMES) > MAX_DATAFRAMES:
+                _DATAFRAMES.pop(next(iter(_DATAFRAMES)))
+    if df.attrs.get("colunar") != {"sha_csv": sha_csv, "formato": formato}:
+        return None
+    copia = df.copy()
+    copia.attrs.pop("colunar")
+    copia.attrs["sha"] = sha_csv
+    return copia
+
+
+def obter_dataframe(repo, branch, caminho_csv, token, formato, parser):
+    """
+    Como github_dados.obter_dataframe, mas lendo a cópia colunar quando ela corresponde
+    ao CSV atual. O CSV é lido normalmente se já estiver em memória (sem custo) ou se não
+    houver cópia válida. df.attrs['sha'] é sempre o SHA do CSV.
+    """
+    if not ATIVO:
+        return github_dados.obter_dataframe(repo, branch, caminho_csv, token, formato, parser)
+    shas = {item["path"]: item["sha"] for item in github_dados.listar_diretorio(repo, branch, posixpath.dirname(caminho_csv), token)}
+    sha_csv = shas.get(caminho_csv)
+    if sha_csv is None:
+        return None
+    sha_parquet = shas.get(caminho_colunar(caminho_csv))
+    if sha_parquet and github_dados.sha_local(repo, branch, caminho_csv) != sha_csv:
+        df = _ler_copia(repo, token, sha_parquet, sha_csv, formato)
+        if df is not None:
+            return df
+    return github_dados.obter_dataframe(repo, branch, caminho_csv, token, formato, parser, sha_esperado=sha_csv)
@@ -0,0 +1,374 @@
+# github_dados.py
+"""
+Camada compartilhada de leitura dos CSVs guardados no GitHub (Contents API).
+
+Os dois aplicativos (catálogo e admin) leem os mesmos arquivos. Em vez de baixar
+e decodificar o CSV inteiro a cada expiração de cache, este módulo mantém um
+armazém por processo (compartilhado por todas as sessões do Streamlit) com o
+ETag, o SHA do blob e os DataFrames já processados de cada arquivo. As leituras
+seguintes enviam 'If-None-Match'; quando o GitHub responde 304 o DataFrame em
+memória é reaproveitado sem novo download nem novo parse (e a chamada não
+consome a cota da API).
+
+O armazém também é copiado para o disco (ver cache_disco): um processo novo
+serve as planilhas da cópia local na primeira leitura e as revalida em segundo
+plano, em vez de esperar os downloads antes da primeira página.
+
+Acima de 1 MB a Contents API não devolve mais o conteúdo do arquivo; nesses
+casos ele é baixado pela API de blobs do Git (até 100 MB), pelo SHA.
+"""
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_disco
+import cliente_github
+
+GITHUB_API = "https://api.github.com"
+
+# Armazém por processo: (repo, branch, caminho) -> entrada com etag/sha/conteúdo/DataFrames
+_ARMAZEM = {}
+_TRAVA_ARMAZEM = threading.Lock()
+_TRAVAS_ARQUIVO = {}
+_EM_REVALIDACAO = set()
+
+# Uma leitura feita há menos que isto (segundos) não é revalidada de novo: leituras do mesmo
+# arquivo logo em seguida (ex.: depois de pre_carregar, ou por várias sessões) não repetem a requisição
+JANELA_REVALIDACAO = 1.0
+
+# Acima deste tamanho (bytes) a Contents API não traz o conteúdo embutido: leitura e gravação vão pela API de blobs
+LIMITE_CONTEUDO_EMBUTIDO = 1_000_000
+
+# Blobs baixados pelo SHA (imutáveis): sha -> bytes, os mais recentes por último
+MAX_BLOBS = 16
+_BLOBS = {}
+
+# Threads para leituras em paralelo (uma por conexão do cliente HTTP)
+_EXECUTOR = ThreadPoolExecutor(max_workers=cliente_github.MAX_CONEXOES, thread_name_prefix="github_dados")
+
+
+def _chave(repo, branch, caminho):
+    return (repo, branch, caminho)
+
+
+def _trava_do_arquivo(chave):
+    """Uma trava por arquivo: sessões simultâneas esperam a mesma requisição em vez de repeti-la."""
+    with _TRAVA_ARMAZEM:
+        if chave not in _TRAVAS_ARQUIVO:
+            _TRAVAS_ARQUIVO[chave] = threading.Lock()
+        return _TRAVAS_ARQUIVO[chave]
+
+
+def _headers(token, etag=None):
+    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3+json"}
+    if etag:
+        headers["If-None-Match"] = etag
+    return headers
+
+
+def _revalidar(repo, branch, caminho, token):
+    """
+    Faz o GET condicional do arquivo e atualiza o armazém.
+    Retorna a entrada atual ou None se o arquivo não existir (404).
+    """
+    chave = _chave(repo, branch, caminho)
+    entrada = _ARMAZEM.get(chave)
+    api_url = f"{GITHUB_API}/repos/{repo}/contents/{caminho}?ref={branch}"
+
+    response = cliente_github.get(api_url, headers=_headers(token, entrada["etag"] if entrada else None))
+
+    if response.status_code == 304 and entrada is not None:
+        entrada["verificado_em"] = time.monotonic()
+        return entrada
+
+    if response.status_code == 404:
+        with _TRAVA_ARMAZEM:
+            _ARMAZEM.pop(chave, None)
+        cache_disco.remover_entrada(chave)
+        return None
+
+    response.raise_for_status()
+    data = response.json()
+
+    if "content" not in data:
+        raise ValueError(f"O campo 'content' não foi encontrado na resposta da API para '{caminho}' (branch '{branch}').")
+    if data.get("encoding") == "none" or (not data["content"] and data.get("size")):
+        # Arquivo acima de 1 MB: a Contents API só informa o SHA
+        data["content"] = _baixar_blob(repo, data["sha"], token)
+
+    if entrada is not None and entrada["sha"] == data.get("sha"):
+        # Mesmo blob servido com outro ETag: mantém os DataFrames já processados.
+        entrada["etag"] = response.headers.get("ETag")
+        entrada["verificado_em"] = time.monotonic()
+        cache_disco.salvar_entrada(chave, entrada)
+        return entrada
+
+    nova_entrada = {
+        "etag": response.headers.get("ETag"),
+        "sha": data.get("sha"),
+        "conteudo": base64.b64decode(data["content"]).decode("utf-8"),
+        "dfs": {},
+        "verificado_em": time.monotonic(),
+    }
+    with _TRAVA_ARMAZEM:
+        _ARMAZEM[chave] = nova_entrada
+    cache_disco.salvar_entrada(chave, nova_entrada)
+    return nova_entrada
+
+
+def _revalidar_em_segundo_plano(repo, branch, caminho, token):
+    """Revalida o arquivo em uma thread (uma por arquivo); erros ficam para a próxima leitura."""
+    chave = _chave(repo, branch, caminho)
+    with _TRAVA_ARMAZEM:
+        if chave in _EM_REVALIDACAO:
+            return
+        _EM_REVALIDACAO.add(chave)
+
+    def tarefa():
+        try:
+            with _trava_do_arquivo(chave), cliente_github.em_segundo_plano():
+                _revalidar(repo, branch, caminho, token)
+        except Exception:
+            pass
+        finally:
+            with _TRAVA_ARMAZEM:
+                _EM_REVALIDACAO.discard(chave)
+
+    threading.Thread(target=cliente_github.contexto_da_chamada().run, args=(tarefa,), daemon=True).start()
+
+
+def _restaurar_do_disco(chave):
+    """Coloca no armazém a cópia em disco do arquivo (partida a frio). Retorna a entrada ou None."""
+    guardada = cache_disco.carregar_entrada(chave)
+    if guardada is None:
+        return None
+    entrada = dict(guardada, dfs={}, verificado_em=0.0)
+    with _TRAVA_ARMAZEM:
+        _ARMAZEM[chave] = entrada
+    return entrada
+
+
+def _entrada_atual(repo, branch, caminho, token, sha_esperado=None):
+    """
+    Entrada do armazém para o arquivo, revalidada se preciso (chamar com a trava do arquivo).
+    Sem entrada em memória, usa a cópia em disco e revalida em segundo plano; com 'sha_esperado'
+    igual ao guardado, ou com uma revalidação recente (JANELA_REVALIDACAO, aumentada quando a
+    cota da API está baixa), não consulta a API.
+    """
+    chave = _chave(repo, branch, caminho)
+    entrada = _ARMAZEM.get(chave)
+    if entrada is None:
+        entrada = _restaurar_do_disco(chave)
+        if entrada is not None and (sha_esperado is None or entrada["sha"] == sha_esperado):
+            _revalidar_em_segundo_plano(repo, branch, caminho, token)
+            return entrada
+        return _revalidar(repo, branch, caminho, token)
+    if sha_esperado is not None:
+        return entrada if entrada["sha"] == sha_esperado else _revalidar(repo, branch, caminho, token)
+    if time.monotonic() - entrada.get("verificado_em", 0.0) < cliente_github.ttl_adaptativo(JANELA_REVALIDACAO):
+        return entrada
+    return _revalidar(repo, branch, caminho, token)
+
+
+def em_paralelo(tarefas):
+    """
+    Executa as funções (sem argumentos) de 'tarefas' ao mesmo tempo. Retorna, na mesma
+    ordem, (resultado, None) ou (None, exceção) de cada uma.
+    """
+    futuros = [_EXECUTOR.submit(cliente_github.contexto_da_chamada().run, tarefa) for tarefa in tarefas]
+    resultados = []
+    for futuro in futuros:
+        try:
+            resultados.append((futuro.result(), None))
+        except Exception as e:
+            resultados.append((None, e))
+    return resultados
+
+
+def pre_carregar(arquivos, token):
+    """
+    Revalida ao mesmo tempo vários arquivos [(repo, branch, caminho)], para que as leituras
+    seguintes (obter_dataframe, obter_sha) sejam atendidas da memória: o tempo total passa a
+    ser o da requisição mais lenta, e não a soma de todas. Erros são ignorados aqui e
+    aparecem na leitura do arquivo.
+    """
+    def revalidar(repo, branch, caminho):
+        with _trava_do_arquivo(_chave(repo, branch, caminho)):
+            _entrada_atual(repo, branch, caminho, token)
+
+    em_paralelo([lambda arquivo=arquivo: revalidar(*arquivo) for arquivo in arquivos])
+
+
+def _processar(chave, entrada, formato, parser):
+    """DataFrame de 'entrada' no 'formato': da memória, do disco ou processando o conteúdo."""
+    df = entrada["dfs"].get(formato)
+    if df is None:
+        df = cache_disco.carregar_df(chave, entrada["sha"], formato)
+        if df is None:
+            df = parser(entrada["conteudo"])
+            threading.Thread(
+                target=cache_disco.salvar_df, args=(chave, entrada["sha"], formato, df), daemon=True
+            ).start()
+        entrada["dfs"][formato] = df
+    return df
+
+
+def obter_dataframe(repo, branch, caminho, token, formato, parser, sha_esperado=None):
+    """
+    Retorna uma cópia do DataFrame do arquivo, ou None se ele não existir.
+
+    'parser' recebe o conteúdo do CSV (str) e devolve o DataFrame; o resultado fica
+    guardado sob a chave 'formato' enquanto o blob não mudar. Use um 'formato'
+    diferente para cada forma de leitura (ex.: 'catalogo', 'admin:pedidos'), pois
+    a função em si é recriada a cada rerun do script.
+
+    Se 'sha_esperado' (ex.: vindo de uma listagem de diretório) for igual ao SHA
+    em memória, a versão guardada é usada sem nenhuma chamada à API; o mesmo vale
+    para uma versão revalidada há menos de JANELA_REVALIDACAO segundos.
+
+    Na primeira leitura do processo, se houver cópia em disco (cache_disco), ela é
+    devolvida na hora e a revalidação com o GitHub acontece em segundo plano.
+
+    A cópia devolvida traz o SHA do blob em df.attrs['sha'] (a versão sobre a qual
+    uma alteração posterior estará sendo feita).
+
+    Erros HTTP (exceto 404) são propagados como requests.exceptions.HTTPError.
+    """
+    chave = _chave(repo, branch, caminho)
+    with _trava_do_arquivo(chave):
+        entrada = _entrada_atual(repo, branch, caminho, token, sha_esperado)
+        if entrada is None:
+            return None
+        df = _processar(chave, entrada, formato, parser)
+        sha = entrada["sha"]
+    copia = df.copy()
+    copia.attrs["sha"] = sha
+    return copia
+
+
+def obter_sha(repo, branch, caminho):
+    """SHA do blob da última versão lida (sem chamada à API); None se ainda não foi lido."""
+    entrada = _ARMAZEM.get(_chave(repo, branch, caminho))
+    return entrada["sha"] if entrada else None
+
+
+def sha_local(repo, branch, caminho):
+    """Como obter_sha, mas considerando também a cópia em disco (que passa para a memória)."""
+    chave = _chave(repo, branch, caminho)
+    with _trava_do_arquivo(chave):
+        entrada = _ARMAZEM.get(chave) or _restaurar_do_disco(chave)
+    return entrada["sha"] if entrada else None
+
+
+def _baixar_blob(repo, sha, token):
+    """Conteúdo em base64 do blob 'sha' pela API de blobs do Git, que atende arquivos de até 100 MB."""
+    response = cliente_github.get(f"{GITHUB_API}/repos/{repo}/git/blobs/{sha}", headers=_headers(token))
+    response.raise_for_status()
+    return response.json()["content"]
+
+
+def obter_blob(repo, sha, token):
+    """Conteúdo (bytes) do blob 'sha'. Um blob nunca muda, então os baixados ficam guardados pelo SHA."""
+    dados = _BLOBS.get(sha)
+    if dados is None:
+        dados = base64.b64decode(_baixar_blob(repo, sha, token))
+        registrar_blob(sha, dados)
+    return dados
+
+
+def registrar_blob(sha, dados):
+    """Guarda um blob recém-gravado ou baixado (ver obter_blob)."""
+    with _TRAVA_ARMAZEM:
+        _BLOBS.pop(sha, None)
+        _BLOBS[sha] = dados
+        while len(_BLOBS) > MAX_BLOBS:
+            _BLOBS.pop(next(iter(_BLOBS)))
+
+
+def registrar_conteudo(repo, branch, caminho, conteudo, sha):
+    """Guarda no armazém um conteúdo que acabou de ser gravado (write-through)."""
+    chave = _chave(repo, branch, caminho)
+    entrada = {"etag": None, "sha": sha, "conteudo": conteudo, "dfs": {}, "verificado_em": time.monotonic()}
+    with _TRAVA_ARMAZEM:
+        _ARMAZEM[chave] = entrada
+    cache_disco.salvar_entrada(chave, entrada)
+
+
+def esquecer(repo, branch, caminho):
+    """Remove um arquivo do armazém (ex.: depois de excluído do repositório)."""
+    with _TRAVA_ARMAZEM:
+        _ARMAZEM.pop(_chave(repo, branch, caminho), None)
+    cache_disco.remover_entrada(_chave(repo, branch, caminho))
+
+
+def obter_conteudo(repo, branch, caminho, token):
+    """Retorna (conteúdo, sha) da versão atual do arquivo, ou (None, None) se ele não existir."""
+    with _trava_do_arquivo(_chave(repo, branch, caminho)):
+        entrada = _revalidar(repo, branch, caminho, token)
+    if entrada is None:
+        return None, None
+    return entrada["conteudo"], entrada["sha"]
+
+
+def listar_diretorio(repo, branch, caminho, token):
+    """
+    Lista os arquivos de um diretório do repositório (também com requisição condicional).
+    Retorna uma lista de dicts com 'name', 'path' e 'sha'; lista vazia se o diretório não existir.
+    """
+    chave = _chave(repo, branch, caminho + "/")
+    api_url = f"{GITHUB_API}/repos/{repo}/contents/{caminho}?ref={branch}"
+    with _trava_do_arquivo(chave):
+        entrada = _ARMAZEM.get(chave)
+        response = cliente_github.get(api_url, headers=_headers(token, entrada["etag"] if entrada else None))
+        if response.status_code == 304 and entrada is not None:
+            return list(entrada["itens"])
+        if response.status_code == 404:
+            with _TRAVA_ARMAZEM:
+                _ARMAZEM.pop(chave, None)
+            return []
+        response.raise_for_status()
+        itens = [
+            {"name": item["name"], "path": item["path"], "sha": item["sha"]}
+            for item in response.json() if item.get("type") == "file"
+        ]
+        with _TRAVA_ARMAZEM:
+            _ARMAZEM[chave] = {"etag": response.headers.get("ETag"), "itens": itens}
+    return list(itens)
+
+
+def salvar_arquivo(repo, branch, caminho, token, conteudo, mensagem, sha=None):
+    """
+    Cria/atualiza um arquivo pela Contents API (PUT) e retorna a resposta.
+    Em caso de sucesso, o armazém passa a guardar o conteúdo gravado (write-through),
+    evitando um novo download na próxima leitura.
+    """
+    api_url = f"{GITHUB_API}/repos/{repo}/contents/{caminho}"
+    payload = {
+        "message": mensagem,
+        "content": base64.b64encode(conteudo.encode("utf-8")).decode("utf-8"),
+        "branch": branch,
+    }
+    if sha:
+        payload["sha"] = sha
+    response = cliente_github.put(api_url, headers=_headers(token), json=payload)
+    if response.status_code in [200, 201]:
+        registrar_conteudo(repo, branch, caminho, conteudo, response.json().get("content", {}).get("sha"))
+    return response
+
+
+def gravacao_aplicada(repo, branch, caminho, token, conteudo):
+    """
+    Depois de um PUT sem resposta conclusiva (5xx ou timeout), relê o arquivo e diz se ele
+    já tem exatamente o 'conteudo' enviado, isto é, se o GitHub aplicou a gravação mesmo assim.
+    """
+    return obter_conteudo(repo, branch, caminho, token)[0] == conteudo
+
+
+def excluir_arquivo(repo, branch, caminho, token, mensagem, sha):
+    """Remove um arquivo pela Contents API (DELETE) e retorna a resposta."""
+    api_url = f"{GITHUB_API}/repos/{repo}/contents/{caminho}"
+    response = cliente_github.delete(api_url, headers=_headers(token), json={"message": mensagem, "sha": sha, "branch": branch})
+    if response.status_code == 200:
+        esquecer(repo, branch, caminho)
+    return response
@@ -0,0 +1,206 @@
+# leitura_csv.py
+"""
+Leitura dos CSVs das planilhas com um esquema explícito por planilha.
+
+Os apps liam os CSVs com o leitor em Python do pandas (engine="python"), que é
+muitas vezes mais lento que o leitor em C, e corrigiam linhas do formato antigo
+do 'pedidos.csv' com um 'replace' no conteúdo inteiro. Aqui cada planilha
+declara um Esquema (tipos, renomeações, colunas decimais aceitando vírgula,
+correção de linhas antigas) e o arquivo é lido pelo leitor em C, ou pelo do
+pyarrow (multithread) nas planilhas grandes que o pedem. Só as linhas que ele
+rejeita (campos a mais) são corrigidas e relidas pelo leitor em Python; as que ainda assim falham são descartadas e informadas em
+df.attrs['linhas_rejeitadas'].
+"""
+import csv
+import importlib.util
+import re
+import warnings
+from dataclasses import dataclass, field
+from io import BytesIO, StringIO
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from pandas.errors import ParserWarning
+
+import conversoes
+
+# Faz parte do 'formato' dos DataFrames guardados (github_dados/cache_disco): mudar a
+# leitura invalida os DataFrames processados por versões anteriores
+VERSAO = 3
+
+# O leitor do pyarrow é opcional: sem ele, as planilhas que o pedem são lidas pelo leitor em C
+PYARROW_DISPONIVEL = importlib.util.find_spec("pyarrow") is not None
+
+# Avisos de linha ignorada: o leitor em C informa o número do registro (ver _registros); o do pyarrow, o texto
+_LINHA_IGNORADA = re.compile(r"Skipping line (\d+)")
+_LINHA_IGNORADA_PYARROW = re.compile(r"\AExpected \d+ columns, but found \d+: (.*)\Z", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class Esquema:
+    tipos: dict = field(default_factory=dict)  # coluna -> tipo na leitura (ex.: {'CONTATO': str})
+    renomear: dict = field(default_factory=dict)  # coluna -> nome usado pelos apps
+    decimais: dict = field(default_factory=dict)  # coluna -> valor para vazios/inválidos; aceita vírgula decimal
+    inteiros: dict = field(default_factory=dict)  # coluna -> valor para vazios/inválidos
+    padroes: dict = field(default_factory=dict)  # coluna -> valor, se a coluna não existir no arquivo
+    opcoes: dict = field(default_factory=dict)  # opções extras do read_csv (quotechar, escapechar...)
+    reparar_linha: Callable = None  # corrige uma linha rejeitada antes de relê-la (ex.: formato antigo)
+    # 'c' ou 'pyarrow'. O pyarrow também converte datas sozinho: as colunas de data devem vir em 'tipos' como str
+    motor: str = "c"
+
+
+def padronizar_coluna(nome):
+    """Nome de coluna como os apps usam: sem espaços nas pontas, maiúsculo e com '_' no lugar de espaços."""
+    return str(nome).strip().upper().replace(' ', '_')
+
+
+def _tipos_na_leitura(cabecalho, esquema):
+    """Os tipos do esquema são por nome padronizado; o read_csv precisa do nome como está no arquivo."""
+    return {bruto: esquema.tipos[padronizar_coluna(bruto)] for bruto in cabecalho if padronizar_coluna(bruto) in esquema.tipos}
+
+
+def _reler_linhas(cabecalho_bruto, linhas, esquema, tipos):
+    """
+    Relê os registros [(número, texto)] rejeitados pelo leitor em C, depois de passarem por
+    esquema.reparar_linha: os que ficaram com o número de campos do cabeçalho são lidos
+    juntos pelo leitor em Python. Retorna (DataFrame, números dos lidos, rejeitadas).
+    """
+    opcoes_csv = {chave: valor for chave, valor in esquema.opcoes.items() if chave in ("quotechar", "escapechar", "doublequote")}
+    campos = len(next(csv.reader([cabecalho_bruto], **opcoes_csv)))
+    validas, rejeitadas = [], []
+    for numero, linha in linhas:
+        reparada = esquema.reparar_linha(linha) if esquema.reparar_linha else linha
+        if len(next(csv.reader([reparada], **opcoes_csv), [])) == campos:
+            validas.append((numero, reparada))
+        else:
+            rejeitadas.append({"linha": numero, "conteudo": linha})
+    if not validas:
+        return None, [], rejeitadas
+    df = pd.read_csv(StringIO("\n".join([cabecalho_bruto] + [linha for _, linha in validas])), sep=",",
+                     engine="python", dtype=tipos, **esquema.opcoes)
+    return df, [numero for numero, _ in validas], rejeitadas
+
+
+def _reinserir(df, df_relidas, numeros_relidas, ignoradas, registros):
+    """
+    Junta os registros relidos ao DataFrame. Se o arquivo não tem registros em branco,
+    cada um volta para a sua posição; senão, vão para o final.
+    """
+    while registros and not registros[-1][1].strip():
+        registros = registros[:-1]
+    total = len(df) + len(ignoradas)
+    if len(registros) - 1 == total:
+        # Registro N do arquivo = linha N - 2 do DataFrame (o registro 1 é o cabeçalho)
+        df.index = np.delete(np.arange(total), np.asarray(ignoradas) - 2)
+        df_relidas.index = np.asarray(numeros_relidas) - 2
+        resultado = pd.concat([df, df_relidas]).sort_index().reset_index(drop=True)
+    else:
+        resultado = pd.concat([df, df_relidas], ignore_index=True)
+    # Numa leitura de poucas linhas, uma coluna vazia vem como número: mantém o tipo da leitura principal
+    for col in resultado.columns.intersection(df.columns):
+        if resultado[col].dtype != df[col].dtype and resultado[col].dtype == object:
+            resultado[col] = resultado[col].astype(df[col].dtype)
+    return resultado
+
+
+def _registros(linhas, opcoes_csv, lidos):
+    """
+    [(linha inicial, texto)] de cada registro do arquivo, na numeração do leitor em C (o
+    registro 1 é o cabeçalho): um campo entre aspas com quebras de linha ocupa várias
+    linhas do arquivo, e uma linha em branco conta como um registro vazio. 'lidos' é o
+    número de registros com dados que o leitor encontrou (aceitos e ignorados); se o
+    arquivo tem uma linha para cada um deles, cada linha é um registro e o módulo csv nem
+    é usado. Se ele não conseguir separar os registros, cada linha também é um registro.
+    """
+    preenchidas = len(linhas)
+    while preenchidas and not linhas[preenchidas - 1].strip():
+        preenchidas -= 1
+    if preenchidas - 1 == lidos:
+        return list(enumerate(linhas, start=1))
+    leitor = csv.reader(linhas, **opcoes_csv)
+    registros, inicio = [], 1
+    try:
+        for _ in leitor:
+            registros.append((inicio, "\n".join(linhas[inicio - 1:leitor.line_num])))
+            inicio = leitor.line_num + 1
+    except csv.Error:
+        return list(enumerate(linhas, start=1))
+    return registros
+
+
+def _aplicar_esquema(df, esquema):
+    df.columns = [padronizar_coluna(col) for col in df.columns]
+    if esquema.renomear:
+        df = df.rename(columns=esquema.renomear)
+    for col, padrao in esquema.decimais.items():
+        if col in df.columns:
+            df[col] = conversoes.converter_numerico(df[col], padrao)
+    for col, padrao in esquema.inteiros.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(padrao).astype(int)
+    for col, valor in esquema.padroes.items():
+        if col not in df.columns:
+            df[col] = valor
+    return df
+
+
+def ler_csv(conteudo, esquema=None):
+    """
+    DataFrame do CSV 'conteudo' segundo 'esquema' (padrão: sem tipos nem conversões).
+    Linhas descartadas ficam em df.attrs['linhas_rejeitadas'] ([{'linha', 'conteudo'}],
+    numeradas como no arquivo) e também são avisadas com um ParserWarning.
+    """
+    esquema = esquema or Esquema()
+    if not conteudo.strip():
+        return pd.DataFrame()
+
+    fim_cabecalho = conteudo.find("\n")
+    cabecalho_bruto = (conteudo if fim_cabecalho < 0 else conteudo[:fim_cabecalho]).lstrip("\ufeff").rstrip("\r")
+    cabecalho = next(csv.reader([cabecalho_bruto], quotechar=esquema.opcoes.get("quotechar", '"')))
+    tipos = _tipos_na_leitura(cabecalho, esquema)
+
+    pyarrow = esquema.motor == "pyarrow" and PYARROW_DISPONIVEL
+    with warnings.catch_warnings(record=True) as avisos:
+        warnings.simplefilter("always", ParserWarning)
+        if pyarrow:
+            df = pd.read_csv(BytesIO(conteudo.encode("utf-8")), sep=",", engine="pyarrow", on_bad_lines="warn",
+                             dtype=tipos, **esquema.opcoes)
+        else:
+            df = pd.read_csv(StringIO(conteudo), sep=",", engine="c", on_bad_lines="warn", dtype=tipos, **esquema.opcoes)
+    ignoradas, textos_ignorados = [], []
+    for aviso in avisos:
+        mensagem = str(aviso.message)
+        numeros = _LINHA_IGNORADA.findall(mensagem) if issubclass(aviso.category, ParserWarning) else []
+        texto = _LINHA_IGNORADA_PYARROW.match(mensagem) if issubclass(aviso.category, ParserWarning) else None
+        if numeros:
+            ignoradas.extend(int(numero) for numero in numeros)
+        elif texto:
+            textos_ignorados.append(texto.group(1).rstrip("\r\n"))
+        else:
+            warnings.warn(aviso.message, aviso.category, stacklevel=2)
+
+    rejeitadas = []
+    if ignoradas or textos_ignorados:
+        opcoes_csv = {chave: valor for chave, valor in esquema.opcoes.items() if chave in ("quotechar", "escapechar", "doublequote")}
+        registros = _registros(conteudo.splitlines(), opcoes_csv, len(df) + len(ignoradas) + len(textos_ignorados))
+        if textos_ignorados:
+            textos_ignorados = set(textos_ignorados)
+            ignoradas += [numero for numero, (_, texto) in enumerate(registros, start=1) if texto in textos_ignorados]
+        ignoradas = sorted(n for n in ignoradas if 0 < n <= len(registros))
+        df_relidas, numeros_relidas, rejeitadas = _reler_linhas(
+            cabecalho_bruto, [(n, registros[n - 1][1]) for n in ignoradas], esquema, tipos
+        )
+        # Os rejeitados são informados pela linha do arquivo em que começam
+        rejeitadas = [dict(r, linha=registros[r["linha"] - 1][0]) for r in rejeitadas]
+        if df_relidas is not None:
+            df = _reinserir(df, df_relidas, numeros_relidas, ignoradas, registros)
+
+    df = _aplicar_esquema(df, esquema)
+    if rejeitadas:
+        warnings.warn(
+            f"{len(rejeitadas)} linha(s) do CSV ignorada(s): " + ", ".join(str(r["linha"]) for r in rejeitadas),
+            ParserWarning, stacklevel=2,
+        )
+        df.attrs["linhas_rejeitadas"] = rejeitadas
+    return df
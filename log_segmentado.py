@@ -0,0 +1,118 @@
+# log_segmentado.py
+"""
+Log de registros "somente anexação" guardado em segmentos diários no GitHub.
+
+Em vez de reescrever um CSV inteiro (ex.: 'pedidos.csv') a cada novo registro,
+cada registro é anexado ao segmento do dia ('<pasta>/AAAA-MM-DD.csv'). O custo
+de uma gravação passa a depender só dos registros do dia, e não de todo o
+histórico. A leitura junta o arquivo base com os segmentos e a compactação
+incorpora os segmentos de dias já encerrados ao arquivo base.
+"""
+from datetime import datetime
+
+import pandas as pd
+import requests
+
+import github_dados
+import mesclagem_csv
+
+
+def caminho_segmento(pasta, quando=None):
+    """Caminho do segmento diário de 'pasta' para a data 'quando' (padrão: hoje)."""
+    quando = quando or datetime.now()
+    return f"{pasta}/{quando.strftime('%Y-%m-%d')}.csv"
+
+
+def anexar_registro(repo, branch, token, pasta, cabecalho, linha_csv, mensagem, quando=None):
+    """
+    Anexa uma linha CSV (já formatada, sem quebra de linha) ao segmento do dia.
+    Cria o segmento com o cabeçalho se ele ainda não existir. Se outro registro for
+    gravado no mesmo segmento entre a leitura e a gravação (409/422: SHA desatualizado),
+    relê o segmento e anexa de novo sobre a versão atual, com backoff. Um PUT sem resposta
+    conclusiva (5xx ou timeout) pode ter sido aplicado: antes de anexar de novo, confere se
+    a linha já está no segmento. Levanta requests.HTTPError (ou o erro de conexão) se a
+    linha não puder ser gravada.
+    """
+    caminho = caminho_segmento(pasta, quando)
+    for tentativa in range(mesclagem_csv.TENTATIVAS_ESCRITA):
+        conteudo_atual, sha = github_dados.obter_conteudo(repo, branch, caminho, token)
+        if tentativa and conteudo_atual and linha_csv in conteudo_atual:
+            return  # uma tentativa anterior foi aplicada, apesar do erro
+
+        if conteudo_atual and conteudo_atual.strip():
+            novo_conteudo = conteudo_atual.rstrip("\r\n") + "\n" + linha_csv
+        else:
+            novo_conteudo = cabecalho + "\n" + linha_csv
+
+        try:
+            response = github_dados.salvar_arquivo(repo, branch, caminho, token, novo_conteudo, mensagem, sha)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if tentativa == mesclagem_csv.TENTATIVAS_ESCRITA - 1:
+                raise
+            mesclagem_csv.esperar_nova_tentativa(tentativa)
+            continue
+        if response.status_code in [200, 201]:
+            return
+        if response.status_code not in [409, 422] and response.status_code < 500:
+            break
+        mesclagem_csv.esperar_nova_tentativa(tentativa)
+    response.raise_for_status()
+
+
+def listar_segmentos(repo, branch, token, pasta):
+    """Segmentos existentes em 'pasta', em ordem cronológica."""
+    itens = github_dados.listar_diretorio(repo, branch, pasta, token)
+    return sorted((i for i in itens if i["name"].endswith(".csv")), key=lambda i: i["name"])
+
+
+def ler_segmentos(repo, branch, token, pasta, formato, parser):
+    """
+    Lê e concatena todos os segmentos de 'pasta'. Segmentos que não mudaram desde a
+    última leitura são servidos da memória (o SHA da listagem confere com o guardado);
+    os que mudaram são baixados ao mesmo tempo. As linhas que o 'parser' descartou
+    (attrs['linhas_rejeitadas'], ver leitura_csv) são reunidas, com o segmento de origem.
+    """
+    segmentos = listar_segmentos(repo, branch, token, pasta)
+    leituras = github_dados.em_paralelo([
+        lambda segmento=segmento: github_dados.obter_dataframe(
+            repo, branch, segmento["path"], token, formato, parser, sha_esperado=segmento["sha"]
+        )
+        for segmento in segmentos
+    ])
+    dfs, rejeitadas = [], []
+    for (df, erro), segmento in zip(leituras, segmentos):
+        if erro is not None:
+            raise erro
+        if df is not None:
+            rejeitadas += [dict(r, arquivo=segmento["path"]) for r in df.attrs.get("linhas_rejeitadas", [])]
+        if df is not None and not df.empty:
+            dfs.append(df)
+    if not dfs:
+        return pd.DataFrame()
+    resultado = pd.concat(dfs, ignore_index=True)
+    if rejeitadas:
+        resultado.attrs["linhas_rejeitadas"] = rejeitadas
+    return resultado
+
+
+def mesclar_com_base(df_base, df_segmentos, chave):
+    """
+    Junta o arquivo base com os registros dos segmentos. Se o mesmo registro (pela
+    coluna 'chave') existir nos dois, vale a versão do arquivo base, que é onde as
+    alterações posteriores (ex.: mudança de status) são gravadas.
+    """
+    if df_segmentos is None or df_segmentos.empty:
+        return df_base
+    if df_base is None or df_base.empty:
+        return df_segmentos.drop_duplicates(subset=[chave], keep="last").reset_index(drop=True)
+
+    chaves_base = set(df_base[chave].astype(str))
+    novos = df_segmentos[~df_segmentos[chave].astype(str).isin(chaves_base)]
+    novos = novos.drop_duplicates(subset=[chave], keep="last")
+    return pd.concat([df_base, novos], ignore_index=True)
+
+
+def segmentos_encerrados(segmentos, hoje=None):
+    """Segmentos de dias anteriores a hoje (o segmento do dia continua recebendo registros)."""
+    atual = caminho_segmento("", hoje).lstrip("/")
+    return [s for s in segmentos if s["name"] < atual]
@@ -0,0 +1,132 @@
+# mesclagem_csv.py
+"""
+Mesclagem de três vias (base / local / remoto) para as planilhas CSV.
+
+Quando o arquivo muda no GitHub entre a leitura e a gravação (outro checkout,
+outro admin), em vez de falhar ou sobrescrever a versão nova, as alterações
+feitas localmente (diferença entre a versão lida, 'base', e a versão editada,
+'local') são reaplicadas linha a linha sobre a versão atual do GitHub ('remoto'),
+usando a coluna-chave da planilha (ID, ID_PEDIDO, CONTATO...).
+"""
+import random
+import time
+
+import pandas as pd
+
+TENTATIVAS_ESCRITA = 4
+ESPERA_BASE = 0.5  # segundos; dobra a cada nova tentativa
+
+
+def esperar_nova_tentativa(tentativa):
+    """Backoff exponencial com variação aleatória, para que gravações concorrentes não colidam de novo."""
+    time.sleep(ESPERA_BASE * (2 ** tentativa) + random.uniform(0, ESPERA_BASE))
+
+
+def _normalizar(valor):
+    """Valor comparável: vazios viram '', números viram float (evita '10' != '10.0')."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return ""
+    texto = str(valor).strip()
+    try:
+        return float(texto.replace(",", "."))
+    except ValueError:
+        return texto
+
+
+class ConflitoDeMesclagem(Exception):
+    """As alterações locais tocam linhas cuja chave se repete: não há como saber a qual linha do remoto correspondem."""
+
+    def __init__(self, chaves):
+        super().__init__("Chave(s) repetida(s) na planilha: " + ", ".join(repr(chave) for chave in chaves))
+        self.chaves = chaves
+
+
+def _texto_da_chave(valor):
+    """
+    Chave comparável: o texto sem espaços nas pontas (e não um número: '041999...' e
+    '41999...' são clientes diferentes). Um número inteiro lido como float (7.0) vira '7'.
+    """
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def _linhas(df, colunas):
+    """Linhas de 'df' como valores comparáveis, em ordem (para comparar conjuntos de linhas)."""
+    return sorted(tuple(str(_normalizar(valor)) for valor in linha) for linha in df.reindex(columns=colunas).itertuples(index=False))
+
+
+def _indexar(df, chaves, ambiguas):
+    """'df' indexado pela chave, sem as linhas de chaves ambíguas (repetidas)."""
+    unicas = ~chaves.isin(ambiguas)
+    return df[unicas].set_axis(chaves[unicas].to_numpy())
+
+
+def mesclar_tres_vias(df_base, df_local, df_remoto, chave, colunas_acumulativas=()):
+    """
+    Reaplica em 'df_remoto' as alterações de 'df_local' em relação a 'df_base':
+    - linhas novas no local são inseridas (se a chave ainda não existir no remoto);
+    - linhas removidas no local são removidas do remoto;
+    - células alteradas no local sobrescrevem o remoto, exceto as 'colunas_acumulativas'
+      (ex.: saldo de cashback), nas quais a diferença local é somada ao valor remoto,
+      para não perder um crédito concorrente.
+    Linhas e células que o local não alterou ficam como estão no remoto. Linhas cuja chave
+    se repete (em qualquer das três versões, ex.: clientes sem CONTATO) nunca são mescladas:
+    ficam como estão no remoto, e se o local alterou alguma delas levanta ConflitoDeMesclagem.
+    """
+    if df_remoto is None or df_remoto.empty:
+        return df_local
+    if df_base is None or df_base.empty:
+        df_base = df_local.iloc[0:0]
+
+    df_remoto = df_remoto.reset_index(drop=True)
+    chaves_base, chaves_local, chaves_remoto = (df[chave].map(_texto_da_chave) for df in (df_base, df_local, df_remoto))
+    ambiguas = set()
+    for chaves in (chaves_base, chaves_local, chaves_remoto):
+        ambiguas.update(chaves[chaves.duplicated()])
+    alteradas = sorted(
+        k for k in ambiguas
+        if _linhas(df_base[chaves_base == k], df_local.columns) != _linhas(df_local[chaves_local == k], df_local.columns)
+    )
+    if alteradas:
+        raise ConflitoDeMesclagem(alteradas)
+
+    base = _indexar(df_base, chaves_base, ambiguas)
+    local = _indexar(df_local, chaves_local, ambiguas)
+    remoto = df_remoto.copy()
+    posicoes = {k: i for i, k in enumerate(chaves_remoto) if k not in ambiguas}
+
+    for coluna in local.columns:
+        if coluna not in remoto.columns:
+            remoto[coluna] = pd.NA
+
+    removidas = [posicoes[k] for k in base.index.difference(local.index) if k in posicoes]
+    inseridas = [k for k in local.index.difference(base.index) if k not in posicoes and k not in ambiguas]
+
+    for k in local.index.intersection(base.index):
+        if k not in posicoes:
+            continue
+        i = posicoes[k]
+        linha_local, linha_base = local.loc[k], base.loc[k]
+        for coluna in local.columns:
+            valor_local = linha_local[coluna]
+            valor_base = linha_base[coluna] if coluna in base.columns else None
+            if _normalizar(valor_local) == _normalizar(valor_base):
+                continue
+            if coluna in colunas_acumulativas:
+                delta = pd.to_numeric(valor_local, errors="coerce") - pd.to_numeric(valor_base, errors="coerce")
+                atual = pd.to_numeric(remoto.at[i, coluna], errors="coerce")
+                if pd.notna(delta):
+                    remoto[coluna] = remoto[coluna].astype(object)
+                    remoto.at[i, coluna] = (0 if pd.isna(atual) else atual) + delta
+                    continue
+            if remoto[coluna].dtype != object:
+                remoto[coluna] = remoto[coluna].astype(object)
+            remoto.at[i, coluna] = valor_local
+
+    remoto = remoto.drop(index=removidas)
+    resultado = pd.concat([remoto, local.loc[inseridas]]) if inseridas else remoto
+    colunas = list(df_remoto.columns) + [c for c in df_local.columns if c not in df_remoto.columns]
+    return resultado.reset_index(drop=True)[colunas]
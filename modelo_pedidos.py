@@ -0,0 +1,128 @@
+# modelo_pedidos.py
+"""
+Pedidos do 'pedidos.csv' como registros imutáveis, interpretados uma única vez.
+
+A coluna ITENS_JSON guarda os detalhes do pedido (itens, desconto do cupom,
+saldo de cashback do cliente) em JSON, às vezes com aspas duplicadas ou
+escapadas a mais por gravações antigas. O painel do admin interpretava esse
+texto várias vezes por pedido a cada rerun (no card, no saldo, no cálculo do
+cashback e na lista de itens). Aqui cada pedido é convertido uma vez em um
+Pedido e guardado pelo ID_PEDIDO; enquanto o texto do pedido não mudar, as
+leituras seguintes são uma consulta ao dicionário.
+"""
+import ast
+import json
+import threading
+from dataclasses import dataclass
+
+import pandas as pd
+
+# Quantos pedidos interpretados manter em memória
+MAX_PEDIDOS = 5000
+
+_PEDIDOS = {}  # ID_PEDIDO -> (ITENS_JSON, VALOR_DESCONTO, Pedido)
+_TRAVA_PEDIDOS = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ItemPedido:
+    id: int  # ID do produto no catálogo; -1 se ausente
+    nome: str
+    preco: float
+    quantidade: int
+    imagem: str = ''
+
+    @property
+    def subtotal(self):
+        return self.preco * self.quantidade
+
+
+@dataclass(frozen=True)
+class Pedido:
+    id_pedido: str
+    itens: tuple  # de ItemPedido
+    desconto: float  # desconto do cupom
+    cupom: str = None
+    saldo_cashback: float = 0.0  # saldo do cliente no momento do pedido
+
+    @property
+    def subtotal(self):
+        return sum(item.subtotal for item in self.itens)
+
+
+def ler_itens_json(texto):
+    """Dicionário do ITENS_JSON, tolerando as aspas a mais de gravações antigas; {} se não for legível."""
+    if not isinstance(texto, str) or not texto.strip():
+        return {}
+    s = texto.strip().replace('\\"', '"').replace('""', '"')
+    if s.startswith('"') and s.endswith('"'):
+        s = s[1:-1].strip()
+    try:
+        data = json.loads(s)
+        # JSON gravado como string (serializado duas vezes)
+        data = ast.literal_eval(data) if isinstance(data, str) else data
+    except (ValueError, SyntaxError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _numero(valor, padrao=0.0):
+    numero = pd.to_numeric(valor, errors='coerce')
+    return padrao if pd.isna(numero) else float(numero)
+
+
+def _inteiro(valor, padrao=0):
+    return int(_numero(valor, padrao))
+
+
+def _montar(id_pedido, texto_json, valor_desconto):
+    data = ler_itens_json(texto_json)
+    itens = tuple(
+        ItemPedido(_inteiro(item.get('id'), -1), str(item.get('nome', 'N/A')), _numero(item.get('preco')),
+                   _inteiro(item.get('quantidade')), item.get('imagem') or '')
+        for item in data.get('itens', []) if isinstance(item, dict)
+    )
+    return Pedido(
+        id_pedido=id_pedido,
+        itens=itens,
+        desconto=_numero(data.get('desconto_cupom', valor_desconto)),
+        cupom=data.get('cupom_aplicado') or None,
+        saldo_cashback=_numero(data.get('cliente_saldo_cashback')),
+    )
+
+
+def _pedido(id_pedido, texto_json, valor_desconto):
+    id_pedido = str(id_pedido)
+    texto_json = texto_json if isinstance(texto_json, str) else ''
+    valor_desconto = _numero(valor_desconto)
+    guardado = _PEDIDOS.get(id_pedido)
+    if guardado is not None and guardado[0] == texto_json and guardado[1] == valor_desconto:
+        return guardado[2]
+    pedido = _montar(id_pedido, texto_json, valor_desconto)
+    with _TRAVA_PEDIDOS:
+        _PEDIDOS.pop(id_pedido, None)
+        _PEDIDOS[id_pedido] = (texto_json, valor_desconto, pedido)
+        while len(_PEDIDOS) > MAX_PEDIDOS:
+            _PEDIDOS.pop(next(iter(_PEDIDOS)))
+    return pedido
+
+
+def pedido_da_linha(linha):
+    """Pedido de uma linha do 'pedidos.csv' (Series); reaproveitado enquanto ITENS_JSON e VALOR_DESCONTO não mudarem."""
+    return _pedido(linha.get('ID_PEDIDO'), linha.get('ITENS_JSON'), linha.get('VALOR_DESCONTO', 0.0))
+
+
+def pedidos_por_id(df):
+    """{ID_PEDIDO (str): Pedido} de todas as linhas de 'df' (ID repetido: vale a primeira linha)."""
+    if df is None or df.empty or 'ID_PEDIDO' not in df.columns:
+        return {}
+    colunas = zip(
+        df['ID_PEDIDO'],
+        df['ITENS_JSON'] if 'ITENS_JSON' in df.columns else [''] * len(df),
+        df['VALOR_DESCONTO'] if 'VALOR_DESCONTO' in df.columns else [0.0] * len(df),
+    )
+    pedidos = {}
+    for id_pedido, texto_json, valor_desconto in colunas:
+        pedido = _pedido(id_pedido, texto_json, valor_desconto)
+        pedidos.setdefault(pedido.id_pedido, pedido)
+    return pedidos
@@ -0,0 +1,173 @@
+# motor_cupons.py
+"""
+Motor de cupons de desconto, compartilhado pelo catálogo e pelo admin.
+
+A planilha 'cupons.csv' é compilada uma única vez por versão em um dicionário
+código -> Cupom (registro imutável), com os valores já convertidos e o instante
+de expiração já calculado no fuso horário da loja. Validar um cupom e calcular
+o desconto passa a ser uma consulta ao dicionário e algumas comparações, sem
+filtrar DataFrames nem converter datas a cada aplicação.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+import conversoes
+
+FUSO_HORARIO = 'America/Sao_Paulo'
+COLUNAS_ESSENCIAIS = ['CODIGO', 'TIPO_DESCONTO', 'VALOR', 'DATA_VALIDADE',
+                      'VALOR_MINIMO_PEDIDO', 'LIMITE_USOS', 'USOS_ATUAIS', 'STATUS']
+
+# Motivos de recusa devolvidos por validar_e_precificar
+INEXISTENTE = 'INEXISTENTE'
+INATIVO = 'INATIVO'
+EXPIRADO = 'EXPIRADO'
+ESGOTADO = 'ESGOTADO'
+VALOR_MINIMO = 'VALOR_MINIMO'
+
+# Quantas versões compiladas manter em memória
+MAX_VERSOES = 4
+
+_COMPILADOS = {}  # versão -> {código: Cupom}
+_TRAVA_COMPILADOS = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Cupom:
+    codigo: str
+    tipo: str  # 'PERCENTUAL' ou 'FIXO'
+    valor: float
+    valor_minimo: float
+    limite_usos: int  # 0 = uso ilimitado
+    usos: int
+    expira_em: float  # instante (segundos desde a época) em que deixa de valer; math.inf = sem validade
+    ativo: bool
+
+
+@dataclass(frozen=True)
+class Validacao:
+    valido: bool
+    desconto: float
+    motivo: str = ''  # vazio quando válido; senão um dos motivos de recusa
+    cupom: Cupom = None
+
+
+def normalizar_codigo(codigo):
+    """Código comparável: sem espaços nas pontas e em maiúsculas."""
+    return str(codigo).strip().upper() if codigo is not None else ''
+
+
+def _instantes_de_expiracao(validades):
+    """
+    DATA_VALIDADE -> instante em que o cupom expira: o fim do dia da validade no fuso da
+    loja (o cupom vale durante todo o último dia). Vazio = sem validade (math.inf);
+    data inválida = já expirado (-math.inf).
+    """
+    vazias = validades.isna() | (validades.astype(str).str.strip() == '')
+    datas = pd.to_datetime(validades.where(~vazias), errors='coerce')
+    fim_do_dia = (datas.dt.normalize() + pd.Timedelta(days=1)).dt.tz_localize(
+        FUSO_HORARIO, ambiguous='NaT', nonexistent='shift_forward'
+    )
+    segundos = (fim_do_dia - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)
+    return segundos.astype(float).where(~vazias, math.inf).fillna(-math.inf)
+
+
+def _compilar(df):
+    if df is None or df.empty:
+        return {}
+    for col in COLUNAS_ESSENCIAIS:
+        if col not in df.columns:
+            raise ValueError(f"A planilha de cupons existe, mas a coluna essencial '{col}' não foi encontrada.")
+
+    codigos = df['CODIGO'].astype(str).str.strip().str.upper()
+    valores = conversoes.converter_numerico(df['VALOR'])
+    # Cupom sem valor de desconto válido continua cadastrado (o código não pode ser repetido), mas não se aplica
+    ativos = (df['STATUS'].astype(str).str.strip().str.upper() == 'ATIVO') & valores.notna()
+    validos = df['CODIGO'].notna() & (codigos != '')
+
+    colunas = zip(
+        codigos,
+        df['TIPO_DESCONTO'].astype(str).str.strip().str.upper(),
+        valores.fillna(0.0),
+        conversoes.converter_numerico(df['VALOR_MINIMO_PEDIDO'], 0.0),
+        pd.to_numeric(df['LIMITE_USOS'], errors='coerce').fillna(0).astype(int),
+        pd.to_numeric(df['USOS_ATUAIS'], errors='coerce').fillna(0).astype(int),
+        _instantes_de_expiracao(df['DATA_VALIDADE']),
+        ativos,
+        validos,
+    )
+    cupons = {}
+    for codigo, tipo, valor, minimo, limite, usos, expira_em, ativo, valido in colunas:
+        if valido and codigo not in cupons:  # código repetido: vale a primeira linha
+            cupons[codigo] = Cupom(codigo, tipo, float(valor), float(minimo), int(limite), int(usos), float(expira_em), bool(ativo))
+    return cupons
+
+
+def compilar_cupons(df, versao=None):
+    """
+    {código: Cupom} com todos os cupons da planilha (ativos ou não). Com 'versao'
+    (ex.: o SHA do arquivo), a compilação é feita uma vez e reaproveitada enquanto a
+    versão não mudar. Levanta ValueError se faltar uma coluna essencial.
+    """
+    if versao is None:
+        return _compilar(df)
+    cupons = _COMPILADOS.get(versao)
+    if cupons is None:
+        cupons = _compilar(df)
+        with _TRAVA_COMPILADOS:
+            _COMPILADOS[versao] = cupons
+            while len(_COMPILADOS) > MAX_VERSOES:
+                _COMPILADOS.pop(next(iter(_COMPILADOS)))
+    return cupons
+
+
+def validar_e_precificar(cupons, codigo, subtotal, agora=None, usos_registrados=None):
+    """
+    Valida o cupom 'codigo' para um carrinho de valor 'subtotal' no instante 'agora'
+    (datetime com fuso ou segundos desde a época; padrão: agora) e calcula o desconto,
+    que nunca passa do subtotal. 'usos_registrados' ({código: usos}, ver usos_cupons)
+    soma ao USOS_ATUAIS da planilha os usos ainda não incorporados a ela.
+    Retorna uma Validacao.
+    """
+    cupom = cupons.get(normalizar_codigo(codigo))
+    if cupom is None:
+        return Validacao(False, 0.0, INEXISTENTE)
+    if not cupom.ativo:
+        return Validacao(False, 0.0, INATIVO, cupom)
+
+    if agora is None:
+        agora = time.time()
+    elif hasattr(agora, 'timestamp'):
+        agora = agora.timestamp()
+    if agora >= cupom.expira_em:
+        return Validacao(False, 0.0, EXPIRADO, cupom)
+    usos = cupom.usos + (usos_registrados.get(cupom.codigo, 0) if usos_registrados else 0)
+    if cupom.limite_usos > 0 and usos >= cupom.limite_usos:
+        return Validacao(False, 0.0, ESGOTADO, cupom)
+
+    subtotal = float(subtotal)
+    if subtotal < cupom.valor_minimo:
+        return Validacao(False, 0.0, VALOR_MINIMO, cupom)
+
+    if cupom.tipo == 'PERCENTUAL':
+        desconto = (cupom.valor / 100) * subtotal
+    elif cupom.tipo == 'FIXO':
+        desconto = cupom.valor
+    else:
+        desconto = 0.0
+    return Validacao(True, min(desconto, subtotal), '', cupom)
+
+
+def validar_lote(cupons, carrinhos, agora=None, usos_registrados=None):
+    """
+    validar_e_precificar para vários carrinhos [(código, subtotal)] no mesmo instante
+    (ex.: reprocessar pedidos ou medir o desempenho com muitos carrinhos simultâneos).
+    """
+    if agora is None:
+        agora = time.time()
+    elif hasattr(agora, 'timestamp'):
+        agora = agora.timestamp()
+    return [validar_e_precificar(cupons, codigo, subtotal, agora, usos_registrados) for codigo, subtotal in carrinhos]
@@ -0,0 +1,36 @@
+# test_leitura_csv.py
+"""Registros rejeitados pela leitura_csv quando o arquivo tem campos com quebra de linha."""
+import warnings
+
+import pytest
+from pandas.errors import ParserWarning
+
+import leitura_csv
+
+# A descrição do produto 1 ocupa duas linhas do arquivo; o registro do produto 2 tem um campo a mais
+CONTEUDO = 'ID,NOME,DESC\n1,a,"linha1\nlinha2"\n2,b,x,EXTRA\n3,c,y\n'
+
+
+def _sem_campo_extra(linha):
+    return linha.replace(",EXTRA", "")
+
+
+@pytest.mark.parametrize("motor", ["c", "pyarrow"])
+def test_registro_rejeitado_depois_de_campo_multilinha(motor):
+    if motor == "pyarrow" and not leitura_csv.PYARROW_DISPONIVEL:
+        pytest.skip("pyarrow não instalado")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ParserWarning)
+        df = leitura_csv.ler_csv(CONTEUDO, leitura_csv.Esquema(motor=motor))
+    assert df["ID"].tolist() == [1, 3]
+    assert df.attrs["linhas_rejeitadas"] == [{"linha": 4, "conteudo": "2,b,x,EXTRA"}]
+
+
+@pytest.mark.parametrize("motor", ["c", "pyarrow"])
+def test_registro_reparado_volta_para_a_sua_posicao(motor):
+    if motor == "pyarrow" and not leitura_csv.PYARROW_DISPONIVEL:
+        pytest.skip("pyarrow não instalado")
+    df = leitura_csv.ler_csv(CONTEUDO, leitura_csv.Esquema(motor=motor, reparar_linha=_sem_campo_extra))
+    assert df["ID"].tolist() == [1, 2, 3]
+    assert df["DESC"].tolist() == ["linha1\nlinha2", "x", "y"]
+    assert "linhas_rejeitadas" not in df.attrs
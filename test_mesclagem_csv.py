@@ -0,0 +1,30 @@
+# test_mesclagem_csv.py
+"""Mesclagem de três vias com chaves repetidas ou que parecem números."""
+import pandas as pd
+import pytest
+
+import mesclagem_csv
+
+# Dois clientes sem CONTATO e dois contatos que só diferem pelo zero à esquerda
+BASE = pd.DataFrame({
+    "CONTATO": ["", "", "041999", "41999"],
+    "NOME": ["a", "b", "c", "d"],
+    "CASHBACK": [1.0, 2.0, 3.0, 4.0],
+})
+
+
+def test_linhas_de_chave_repetida_ficam_como_no_remoto():
+    local = BASE.copy()
+    local.loc[2, "CASHBACK"] = 10.0
+    remoto = BASE.copy()
+    remoto.loc[2, "CASHBACK"] = 4.0
+    resultado = mesclagem_csv.mesclar_tres_vias(BASE, local, remoto, "CONTATO", ("CASHBACK",))
+    assert resultado["NOME"].tolist() == ["a", "b", "c", "d"]
+    assert resultado["CASHBACK"].tolist() == [1.0, 2.0, 11.0, 4.0]
+
+
+def test_alteracao_em_linha_de_chave_repetida_e_conflito():
+    local = BASE.copy()
+    local.loc[0, "NOME"] = "A"
+    with pytest.raises(mesclagem_csv.ConflitoDeMesclagem):
+        mesclagem_csv.mesclar_tres_vias(BASE, local, BASE.copy(), "CONTATO")
@@ -0,0 +1,164 @@
+# usos_cupons.py
+"""
+Contagem de usos dos cupons sem reescrever o 'cupons.csv'.
+
+Cada resgate de cupom no checkout é anexado como um evento ao log segmentado
+'cupons_usos/AAAA-MM-DD.csv' (ver log_segmentado), em vez de incrementar
+USOS_ATUAIS no arquivo de cupons. A contagem dos segmentos é calculada uma
+única vez por versão (os SHAs listados): esse é o contador que a validação do
+cupom consulta. O admin incorpora periodicamente os segmentos encerrados ao
+USOS_ATUAIS do 'cupons.csv' e os remove.
+
+Para respeitar o LIMITE_USOS com checkouts simultâneos, o uso é primeiro
+reservado (evento USO) e só vale se ficou entre os primeiros dentro do limite
+na ordem do log; caso contrário (ou se o pedido não for salvo), é anulado com
+um evento ESTORNO. USO e ESTORNO são casados pelo (CODIGO, ID_PEDIDO) em todos
+os segmentos, e não só no mesmo dia: o estorno de uma reserva feita às
+23:59:59 pode cair no segmento seguinte. Um ESTORNO cujo USO já foi
+incorporado ao 'cupons.csv' (estorno "órfão") desconta um uso.
+"""
+import threading
+from datetime import datetime
+from io import StringIO
+
+import pandas as pd
+
+import github_dados
+import log_segmentado
+import motor_cupons
+
+PASTA_USOS = "cupons_usos"
+CABECALHO_USOS = "CODIGO,ID_PEDIDO,TIPO,DATA_HORA"
+USO = "USO"
+ESTORNO = "ESTORNO"
+
+# Quantas contagens (versões do log) manter em memória: cada evento anexado cria uma nova
+MAX_CONTAGENS = 4
+
+_CONTAGENS = {}  # SHAs dos segmentos listados -> {código: usos válidos menos estornos órfãos}
+_TRAVA_CONTAGENS = threading.Lock()
+
+
+def _ler_eventos(content):
+    df = pd.read_csv(StringIO(content), dtype=str, keep_default_na=False)
+    df.columns = [col.strip().upper() for col in df.columns]
+    return df
+
+
+def _eventos(dfs_eventos):
+    """Eventos de vários segmentos, na ordem do log, com CODIGO e ID_PEDIDO normalizados."""
+    dfs = [df for df in dfs_eventos if df is not None and not df.empty]
+    if not dfs:
+        return pd.DataFrame(columns=["CODIGO", "ID_PEDIDO", "TIPO"])
+    eventos = pd.concat(dfs, ignore_index=True)
+    return eventos.assign(
+        CODIGO=eventos["CODIGO"].map(motor_cupons.normalizar_codigo),
+        ID_PEDIDO=eventos["ID_PEDIDO"].astype(str).str.strip(),
+    )
+
+
+def _usos_validos(eventos):
+    """
+    (usos, estornos órfãos) de 'eventos': os USO que não foram estornados, na ordem em que
+    foram registrados, e os ESTORNO sem USO correspondente entre os eventos (o uso já foi
+    incorporado ao 'cupons.csv').
+    """
+    chaves = pd.MultiIndex.from_arrays([eventos["CODIGO"], eventos["ID_PEDIDO"]])
+    eh_uso = (eventos["TIPO"] == USO).to_numpy()
+    eh_estorno = (eventos["TIPO"] == ESTORNO).to_numpy()
+    usos = eventos[eh_uso & ~chaves.isin(chaves[eh_estorno])]
+    orfaos = eventos[eh_estorno & ~chaves.isin(chaves[eh_uso])].drop_duplicates(subset=["CODIGO", "ID_PEDIDO"])
+    return usos.reset_index(drop=True), orfaos
+
+
+def _contagem(eventos):
+    """{código: usos válidos menos estornos órfãos} de 'eventos'."""
+    usos, orfaos = _usos_validos(eventos)
+    return usos["CODIGO"].value_counts().sub(orfaos["CODIGO"].value_counts(), fill_value=0).astype(int)
+
+
+def _ler_segmento(repo, branch, token, segmento):
+    return github_dados.obter_dataframe(
+        repo, branch, segmento["path"], token, "usos_cupons", _ler_eventos, sha_esperado=segmento["sha"]
+    )
+
+
+def _ler_eventos_dos_segmentos(repo, branch, token, segmentos):
+    return _eventos([_ler_segmento(repo, branch, token, segmento) for segmento in segmentos])
+
+
+def contar_usos(repo, branch, token):
+    """
+    {código: usos registrados e ainda não incorporados ao 'cupons.csv'} (negativo se houver
+    estornos de usos já incorporados). Enquanto os segmentos não mudarem, a contagem não é
+    refeita; os segmentos que não mudaram não são relidos.
+    """
+    segmentos = log_segmentado.listar_segmentos(repo, branch, token, PASTA_USOS)
+    chave = tuple(segmento["sha"] for segmento in segmentos)
+    contagem = _CONTAGENS.get(chave)
+    if contagem is None:
+        contagem = _contagem(_ler_eventos_dos_segmentos(repo, branch, token, segmentos)).to_dict()
+        with _TRAVA_CONTAGENS:
+            _CONTAGENS[chave] = contagem
+            while len(_CONTAGENS) > MAX_CONTAGENS:
+                _CONTAGENS.pop(next(iter(_CONTAGENS)))
+    return dict(contagem)
+
+
+def _registrar_evento(repo, branch, token, codigo, id_pedido, tipo):
+    linha = f'"{codigo}","{id_pedido}","{tipo}","{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}"'
+    log_segmentado.anexar_registro(
+        repo, branch, token, PASTA_USOS, CABECALHO_USOS, linha, f"CUPOM: {tipo} {codigo} (pedido {id_pedido})"
+    )
+
+
+def estornar_uso(repo, branch, token, codigo, id_pedido):
+    """Anula um uso reservado (ex.: o pedido não chegou a ser salvo)."""
+    _registrar_evento(repo, branch, token, motor_cupons.normalizar_codigo(codigo), id_pedido, ESTORNO)
+
+
+def reservar_uso(repo, branch, token, cupom, id_pedido):
+    """
+    Registra o uso de 'cupom' (motor_cupons.Cupom) pelo pedido 'id_pedido', que deve ser
+    único por checkout: USO e ESTORNO são casados pelo (CODIGO, ID_PEDIDO). Cupons sem
+    limite de usos são apenas registrados. Nos limitados, o uso só vale se, na ordem do
+    log, ficou dentro do limite (usos já incorporados + usos válidos anteriores a ele);
+    se não ficou, é estornado. Retorna True se o uso foi aceito.
+    """
+    _registrar_evento(repo, branch, token, cupom.codigo, id_pedido, USO)
+    if cupom.limite_usos <= 0:
+        return True
+
+    # O segmento acabou de ser gravado (e guardado em memória), então a releitura não custa novas leituras de arquivos
+    usos, orfaos = _usos_validos(_ler_eventos_dos_segmentos(
+        repo, branch, token, log_segmentado.listar_segmentos(repo, branch, token, PASTA_USOS)
+    ))
+    usos = usos[usos["CODIGO"] == cupom.codigo].reset_index(drop=True)
+    posicoes = usos.index[usos["ID_PEDIDO"] == str(id_pedido)]
+    # Estornos de usos já incorporados liberam vagas contadas no USOS_ATUAIS
+    liberados = int((orfaos["CODIGO"] == cupom.codigo).sum())
+    if len(posicoes) and cupom.usos - liberados + posicoes[0] < cupom.limite_usos:
+        return True
+    estornar_uso(repo, branch, token, cupom.codigo, id_pedido)
+    return False
+
+
+def consolidar(df_cupons, segmentos, repo, branch, token):
+    """
+    'df_cupons' (planilha do admin) com os usos dos 'segmentos' somados ao USOS_ATUAIS.
+    Retorna (df, total de usos incorporados).
+
+    Os 'segmentos' devem ser os mais antigos do log (os encerrados, em ordem): USO e ESTORNO
+    são casados entre eles. Um USO estornado em um segmento que ainda não está sendo
+    incorporado é somado agora, e o seu ESTORNO, órfão quando chegar a vez dele, o
+    desconta; um ESTORNO órfão destes segmentos desconta um uso incorporado antes.
+    """
+    contagem = _contagem(_ler_eventos_dos_segmentos(repo, branch, token, segmentos))
+    contagem = contagem[contagem != 0]
+    if contagem.empty or df_cupons.empty:
+        return df_cupons, 0
+    codigos = df_cupons["CODIGO"].map(motor_cupons.normalizar_codigo)
+    # Código repetido na planilha: os usos vão para a primeira linha, a mesma que o motor de cupons considera
+    incrementos = codigos.map(contagem).where(~codigos.duplicated(keep="first")).fillna(0).astype(int)
+    atuais = pd.to_numeric(df_cupons["USOS_ATUAIS"], errors="coerce").fillna(0).astype(int)
+    return df_cupons.assign(USOS_ATUAIS=atuais + incrementos), int(incrementos.sum())